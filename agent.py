@@ -4,14 +4,34 @@ Returns different response types based on input keywords for comprehensive testi
 """
 
 import asyncio
+import os
 import random
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
+from program_catalog import open_catalog
+
 class TrendAgent:
     """Mock agent that returns different response types for testing"""
     
-    def __init__(self):
+    def __init__(self, seed: Optional[int] = None, latency: Optional[float] = None):
+        """
+        Args:
+            seed: Seed for the agent's random generator so unmatched keywords resolve
+                reproducibly. Falls back to the TREND_AGENT_SEED env var; unseeded if neither is set.
+            latency: Fixed delay in seconds for each simulated processing step (0 disables
+                sleeping entirely). Falls back to the TREND_AGENT_LATENCY env var; when neither
+                is set each step sleeps a random 0.5-1.0 seconds.
+        """
+        if seed is None and os.getenv("TREND_AGENT_SEED"):
+            seed = int(os.environ["TREND_AGENT_SEED"])
+        if latency is None and os.getenv("TREND_AGENT_LATENCY"):
+            latency = float(os.environ["TREND_AGENT_LATENCY"])
+        
+        self.rng = random.Random(seed)
+        self.latency = latency
+        # Shared memory-mapped catalog from PROGRAM_CATALOG (None when not configured)
+        self.catalog = open_catalog()
         self.mock_data = {
             # Success cases - Trending programs
             "dune": {
@@ -92,6 +112,27 @@ class TrendAgent:
             }
         }
     
+    def lookup_program(self, trend_list: List[str]) -> Optional[Dict[str, Any]]:
+        """Newest catalog program whose title matches one of the keyword phrases"""
+        if self.catalog is None:
+            return None
+        for keywords in trend_list:
+            for phrase in [keywords] + keywords.split(","):
+                matches = self.catalog.by_title(phrase) if phrase.strip() else []
+                if matches:
+                    program = matches[0]
+                    if not program["explanation_of_trend"]:
+                        program["explanation_of_trend"] = f"Catalog title matched trending keywords: {phrase.strip()}"
+                    return program
+        return None
+    
+    async def _simulate_step(self):
+        """Sleep for one processing step according to the configured latency mode"""
+        if self.latency is None:
+            await asyncio.sleep(self.rng.uniform(0.5, 1.0))
+        elif self.latency > 0:
+            await asyncio.sleep(self.latency)
+    
     async def run(self, trend_list: List[str], client_id: str = None, manager = None) -> Tuple[Optional[Dict[str, Any]], Optional[str], bool]:
         """
         Mock agent run method that returns different response types based on keywords
@@ -131,10 +172,11 @@ class TrendAgent:
                     "message": message,
                     "data": {"step": step}
                 })
-            await asyncio.sleep(random.uniform(0.5, 1.0))
+            await self._simulate_step()
         
         # Combine all keywords for matching
         combined_keywords = " ".join(trend_list).lower()
+        catalog_program = self.lookup_program(trend_list)
         
         # Check for specific test cases
         if "dune" in combined_keywords:
@@ -225,6 +267,17 @@ class TrendAgent:
                 })
             return None, self.mock_data["invalid"]["error"], False
             
+        elif catalog_program:
+            if client_id and manager:
+                await manager.send_log(client_id, {
+                    "timestamp": datetime.now().isoformat(),
+                    "level": "INFO",
+                    "category": "MATCH",
+                    "message": f"Found program in catalog: {catalog_program['title']}",
+                    "data": {"program": catalog_program["title"], "imdb_id": catalog_program["imdb_id"]}
+                })
+            return catalog_program, None, True
+            
         elif "random" in combined_keywords or "gibberish" in combined_keywords:
             if client_id and manager:
                 await manager.send_log(client_id, {
@@ -251,14 +304,14 @@ class TrendAgent:
             
         else:
             # Default: randomly return a trending program or no result
-            rand = random.random()
+            rand = self.rng.random()
             if rand < 0.4:  # 40% chance of trending program
                 trending_programs = ["dune", "oppenheimer", "wednesday"]
-                selected = random.choice(trending_programs)
+                selected = self.rng.choice(trending_programs)
                 return self.mock_data[selected], None, True
             elif rand < 0.7:  # 30% chance of not trending program
                 not_trending_programs = ["game of thrones", "breaking bad"]
-                selected = random.choice(not_trending_programs)
+                selected = self.rng.choice(not_trending_programs)
                 return self.mock_data[selected], None, True
             else:  # 30% chance of no program found
                 return None, None, True
@@ -0,0 +1,188 @@
+"""
+Structured, non-blocking logging for the backend
+Callers only put records on an in-memory queue; a background listener thread
+formats them (text or JSON) and writes to stdout. Records carry the request and
+client correlation ids of the code that logged them, and records logged with a
+`category` extra are mirrored to that client's live WebSocket log stream.
+
+    logger = get_logger("api")
+    logger.info("Starting analysis", extra={"category": "ANALYSIS", "data": {...}})
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Logging configuration
+LOGGING_CONFIG = {
+    "level": os.getenv("LOG_LEVEL", "INFO").upper(),
+    "format": os.getenv("LOG_FORMAT", "text"),
+    "queue_size": int(os.getenv("LOG_WRITER_QUEUE_SIZE", "10000")),
+}
+
+ROOT_LOGGER = "trend_portal"
+
+# WebSocket viewers expect the short level names the agent uses
+WS_LEVELS = {"WARNING": "WARN", "CRITICAL": "ERROR"}
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+client_id_var: ContextVar[Optional[str]] = ContextVar("client_id", default=None)
+
+_listener: Optional[QueueListener] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def set_correlation(request_id: str = None, client_id: str = None):
+    """Tag everything logged from the current context with these ids"""
+    if request_id is not None:
+        request_id_var.set(request_id)
+    if client_id is not None:
+        client_id_var.set(client_id)
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp records with the logging context's request/client ids; runs in the caller's thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        if not hasattr(record, "client_id"):
+            record.client_id = client_id_var.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the writer falls behind"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now, on a copy: later handlers still need the original record
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "client_id": getattr(record, "client_id", None),
+        }
+        for field in ("category", "data"):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        return super().format(record)
+
+
+class WebSocketLogHandler(logging.Handler):
+    """Mirror records that carry a `category` extra into the current client's live log stream"""
+
+    def __init__(self, manager):
+        super().__init__()
+        self.manager = manager
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def emit(self, record: logging.LogRecord):
+        category = getattr(record, "category", None)
+        client_id = getattr(record, "client_id", None)
+        if not category or not client_id:
+            return
+        event = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(),
+            "level": WS_LEVELS.get(record.levelname, record.levelname),
+            "category": category,
+            "message": record.getMessage(),
+            "data": getattr(record, "data", None),
+        }
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None:
+            # On the event loop: append now so the event keeps its place relative to awaited sends
+            self.loop = running
+            self.manager.append_log(client_id, event)
+        elif self.loop is not None and not self.loop.is_closed():
+            # Worker thread (asyncio.to_thread): hand the event to the loop
+            self.loop.call_soon_threadsafe(self.manager.append_log, client_id, event)
+
+
+def setup_logging(manager=None, level: str = None, fmt: str = None) -> logging.Logger:
+    """Route the backend's loggers through the queue and start the writer thread; safe to call twice"""
+    global _listener
+    logger = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        return logger
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if (fmt or LOGGING_CONFIG["format"]) == "json" else TextFormatter())
+    log_queue: queue.Queue = queue.Queue(maxsize=LOGGING_CONFIG["queue_size"])
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+    logger.addHandler(queue_handler)
+    if manager is not None:
+        ws_handler = WebSocketLogHandler(manager)
+        ws_handler.addFilter(CorrelationFilter())
+        logger.addHandler(ws_handler)
+    logger.setLevel(level or LOGGING_CONFIG["level"])
+    logger.propagate = False
+
+    _listener.start()
+    return logger
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logger = logging.getLogger(ROOT_LOGGER)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
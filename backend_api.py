@@ -4,28 +4,38 @@ Connects the React frontend to the agent backend
 """
 
 import asyncio
-import traceback
 import json
 import uuid
 import time
-import pandas as pd
+import importlib
+import functools
+from datetime import date, datetime, timezone
 from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Query
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import sys
 import os
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import requests
+from merger_client import MergerClient, UpsertBatcher, MERGER_CONFIG, gather_limited
+from topic_cache import TopicCache, TOPIC_CACHE_CONFIG, ensure_topic_cache_table, topic_cache_key
+from tmdb_enrichment import TMDB_CONFIG, TmdbEnricher, ensure_tmdb_cache_table
+from log_stream import ConnectionManager
+from event_bus import create_event_bus
+from fast_json import FastJSONResponse, add_compression, dumps_bytes
+from app_logging import get_logger, set_correlation, setup_logging, stop_logging
+from metrics import current_breakdown, render_metrics, stage, start_breakdown, timed
+from profiler import Profiler, StackSampler
+from trend_listing import TREND_LISTING_CONFIG, decode_cursor, ensure_listing_index, fetch_page, stream_ndjson
+from trend_clustering import CLUSTERING_CONFIG, cluster_keywords, cluster_trends
+from trend_archive import TREND_ARCHIVE_CONFIG, archive_snapshot, list_snapshots, read_snapshot
+from ingest_watermark import WATERMARK_CONFIG, advance_watermark, ensure_watermark_table, get_watermark, list_watermarks, new_rows
+from trend_history import GROWTH_SORTS, ensure_history_table, growth_ranking, rebuild_growth, record_snapshot, trend_series
+from trend_scheduler import SCHEDULER_CONFIG, AnalysisScheduler, priority_sql
+from trend_partitions import PARTITION_CONFIG, is_partitioned, list_partitions, maintain_partitions, pending_window_sql
+from trend_search import TREND_SEARCH_CONFIG, ensure_search_indexes, search_trends
+from trend_snapshot import SnapshotVersion, ensure_snapshot_sequence, etag_for, etag_matches
+from outbox import OutboxDispatcher, OUTBOX_CONFIG, enqueue_event, ensure_outbox_table, make_idempotency_key
 
 # Database configuration
 DB_CONFIG = {
@@ -37,19 +47,34 @@ DB_CONFIG = {
     "schema": "bingeplus_internal"
 }
 
+# Region scraped from Google Trends; also the geo partition of archived snapshots
+GOOGLE_TRENDS_GEO = os.getenv("GOOGLE_TRENDS_GEO", "US")
+# Chrome saves exports here; nothing else should write to it since downloaded CSVs may be deleted after import
+GOOGLE_TRENDS_DOWNLOAD_DIR = os.getenv("GOOGLE_TRENDS_DOWNLOAD_DIR",
+                                       os.path.join(os.path.expanduser("~"), "Downloads", "google-trends"))
+# Header columns a Google Trends export must have to be imported
+GOOGLE_TRENDS_EXPORT_COLUMNS = ("Trends", "Search volume", "Started")
+
 def get_db_connection():
     """Get PostgreSQL database connection"""
     try:
+        import psycopg2
+
         # Create connection config without schema (schema is not a connection parameter)
         conn_config = {k: v for k, v in DB_CONFIG.items() if k != 'schema'}
         conn = psycopg2.connect(**conn_config)
         return conn
     except Exception as e:
-        print(f"❌ Database connection error: {e}")
+        logger.error(f"❌ Database connection error: {e}")
         return None
 
 def insert_trend_data(conn, cursor, trend_name, category, search_volume, started, ended, trends_breakdown, explore_links):
     """Insert or update trend data in the database"""
+    params = (trend_name, category, search_volume, started, ended, trends_breakdown, explore_links)
+    if PARTITION_CONFIG['partitioned']:
+        trend_id = _upsert_partitioned_trend(cursor, params)
+        conn.commit()
+        return trend_id
     query = f"""
     INSERT INTO {DB_CONFIG['schema']}.google_trends 
     (trends, category, search_volume, trend_started, trend_ended, trend_breakdown, explore_link)
@@ -60,15 +85,44 @@ def insert_trend_data(conn, cursor, trend_name, category, search_volume, started
         trend_started = EXCLUDED.trend_started,
         trend_breakdown = EXCLUDED.trend_breakdown,
         explore_link = EXCLUDED.explore_link
+    RETURNING id
     """
-    cursor.execute(query, (trend_name, category, search_volume, started, ended, trends_breakdown, explore_links))
+    cursor.execute(query, params)
+    row = cursor.fetchone()
     conn.commit()
+    return row['id'] if row else None
+
+def _upsert_partitioned_trend(cursor, params):
+    """Upsert keyed on (trends, category) without a unique constraint, which a partitioned table can't have
+
+    A transaction-level advisory lock on the key serializes concurrent imports of the same trend;
+    an update that changes trend_started moves the row to its new partition.
+    """
+    trend_name, category = params[0], params[1]
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s), hashtext(%s))", (category, trend_name))
+    cursor.execute(f"""
+    UPDATE {DB_CONFIG['schema']}.google_trends SET
+        search_volume = %s, trend_started = %s, trend_ended = %s, trend_breakdown = %s, explore_link = %s
+    WHERE trends = %s AND category = %s
+    RETURNING id
+    """, params[2:] + (trend_name, category))
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(f"""
+        INSERT INTO {DB_CONFIG['schema']}.google_trends
+        (trends, category, search_volume, trend_started, trend_ended, trend_breakdown, explore_link)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+        """, params)
+        row = cursor.fetchone()
+    return row['id'] if row else None
 
 
 def categories_clause(trend_categories):
     """Format categories for SQL IN clause"""
     return ",".join([f"'{cat}'" for cat in trend_categories])
 
+@timed("pending_trends_query")
 def get_new_trends(trend_categories, count):
     """Get new trends from database that haven't been processed yet"""
     conn = get_db_connection()
@@ -80,84 +134,147 @@ def get_new_trends(trend_categories, count):
         query = f"""
         select gt.* from {DB_CONFIG['schema']}.google_trends gt
         left join {DB_CONFIG['schema']}.trends_to_topics tt on gt.id = tt.google_trend_id
+            and {pending_window_sql('tt.date', slack_days=1)}
         where tt.id is null and gt.category in ({categories})
-        ORDER by trend_ended desc,gt.trend_started desc limit {count}
+            and {pending_window_sql('gt.trend_started')}
+        ORDER by {priority_sql('gt')} desc, gt.id desc limit {count}
         """
         
+        from psycopg2.extras import RealDictCursor
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(query)
             return cur.fetchall()
     
     except Exception as e:
-        print(f"❌ Error getting new trends: {e}")
+        logger.error(f"❌ Error getting new trends: {e}")
         return []
     finally:
         conn.close()
 
 # API functions for ingest and upsert
-def call_ingest_topic_api(name, topic_type, source_id, source_name, source_id_type, **kwargs):
+merger_client = MergerClient()
+upsert_batcher = UpsertBatcher(merger_client)
+topic_cache = TopicCache(
+    connect=(lambda: get_db_connection()) if TOPIC_CACHE_CONFIG['persist'] else None,
+    schema=DB_CONFIG['schema']
+)
+
+# Poster and details lookups for identified programs, cached across requests and workers
+tmdb_enricher = TmdbEnricher(
+    connect=(lambda: get_db_connection()) if TMDB_CONFIG['persist'] else None,
+    schema=DB_CONFIG['schema']
+)
+
+async def enrich_program(program):
+    """TMDB details for an agent program, or None if unavailable within TMDB_RESPONSE_TIMEOUT"""
+    if not tmdb_enricher.available or not program.get('imdb_id'):
+        return None
+    with stage("enrichment"):
+        try:
+            # Shielded so a lookup that outlives the wait still completes and fills the cache
+            return await asyncio.wait_for(
+                asyncio.shield(tmdb_enricher.lookup(program['imdb_id'], program.get('program_type', 'movie'))),
+                timeout=TMDB_CONFIG['response_timeout']
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ TMDB details for {program['imdb_id']} not ready in time, answering without them")
+            return None
+
+# Version of the trend data, served as the ETag of trend read endpoints
+trends_snapshot = SnapshotVersion(connect=lambda: get_db_connection(), schema=DB_CONFIG['schema'])
+
+async def call_ingest_topic_api(name, topic_type, source_id, source_name, source_id_type, **kwargs):
     """Call the ingest topic API endpoint"""
+    with stage("ingest_topic"):
+        return await merger_client.ingest_topic(name, topic_type, source_id, source_name, source_id_type, **kwargs)
+
+async def call_upsert_trend_api(topic_id, source, trend_info, source_detail=None, idempotency_key=None):
+    """Call the upsert trend API endpoint, batched into bulk requests when MERGER_BULK_UPSERT is on"""
+    with stage("upsert_trend"):
+        if MERGER_CONFIG['bulk_upsert']:
+            return await upsert_batcher.submit(topic_id, source, trend_info, source_detail, idempotency_key)
+        return await merger_client.upsert_trend(topic_id, source, trend_info, source_detail, idempotency_key)
+
+async def sync_trend_with_merger(selected_program, trend, idempotency_key=None):
+    """Ingest the program as a topic for one trend, then upsert the trend against it
     
-    # API endpoint URL - adjust this to match your actual API endpoint
-    api_url = "http://localhost:8000/merger/ingest_topic"  # Update this URL as needed
-    
-    payload = {
-        "name": name,
-        "topic_type": topic_type,
-        "source_id": source_id,
-        "source_name": source_name,
-        "source_id_type": source_id_type
-    }
-    
-    # Add optional fields if provided
-    if 'umd_program_id' in kwargs:
-        payload['umd_program_id'] = kwargs['umd_program_id']
-    if 'description' in kwargs:
-        payload['description'] = kwargs['description']
-    if 'date' in kwargs:
-        payload['date'] = kwargs['date']
-    
+    Returns:
+        Tuple of (topic_id, upserted)
+    """
     try:
-        response = requests.post(api_url, json=payload)
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('topic_id')
+        # Repeat matches of the same program reuse the cached topic_id and skip ingest_topic
+        topic_id = await topic_cache.resolve(topic_cache_key(selected_program), lambda: call_ingest_topic_api(
+            name=selected_program.get('title', ''),
+            topic_type=selected_program.get('program_type', 'movie'),
+            source_id=trend.get('id', ''),
+            source_name=f"{DB_CONFIG['schema']}.google_trends",
+            source_id_type='id',
+            description=selected_program.get('descriptions', [''])[0] if selected_program.get('descriptions') else '',
+            date=trend.get('trend_started'),
+            idempotency_key=idempotency_key
+        ))
+        
+        if not topic_id:
+            logger.warning(f"⚠️ Failed to ingest topic for trend {trend.get('id', 'unknown')}")
+            return None, False
+        
+        # Call upsert trend API after successful ingest
+        trend_info = {
+            'search_volume': trend.get('search_volume', 0),
+            'trend_breakdown': trend.get('trend_breakdown', []),
+            'trend_started': trend.get('trend_started'),
+            'trend_ended': trend.get('trend_ended')
+        }
+        
+        upsert_success = await call_upsert_trend_api(
+            topic_id=topic_id,
+            source='google',
+            trend_info=trend_info,
+            source_detail=trend.get('explore_link'),
+            idempotency_key=f"{idempotency_key}:upsert" if idempotency_key else None
+        )
+        
+        if upsert_success:
+            logger.info(f"✅ Successfully upserted trend for topic {topic_id}")
         else:
-            print(f"❌ Ingest topic API error: {response.status_code} - {response.text}")
-            return None
+            logger.warning(f"⚠️ Failed to upsert trend for topic {topic_id}")
+        return topic_id, bool(upsert_success)
+    
     except Exception as e:
-        print(f"❌ Error calling ingest topic API: {e}")
-        return None
+        logger.error(f"❌ Error in API calls for trend {trend.get('id', 'unknown')}: {e}")
+        return None, False
 
-def call_upsert_trend_api(topic_id, source, trend_info, source_detail=None):
-    """Call the upsert trend API endpoint"""
-    
-    # API endpoint URL - adjust this to match your actual API endpoint
-    api_url = "http://localhost:8000/merger/upsert_trend"  # Update this URL as needed
-    
-    payload = {
-        "topic_id": topic_id,
-        "source": source,
-        "trend_info": trend_info
+async def sync_trends_with_merger(selected_program, trend_data):
+    """Run the merger calls for every trend concurrently, bounded by MERGER_CONFIG['concurrency']"""
+    results = await gather_limited(
+        (sync_trend_with_merger(selected_program, trend) for trend in trend_data),
+        MERGER_CONFIG['concurrency']
+    )
+    # Keep the last successfully ingested topic_id, matching the old sequential behaviour
+    return next((topic_id for topic_id, _ in reversed(results) if topic_id), None)
+
+def merger_sync_event(selected_program, trend):
+    """Build the outbox event that replays sync_trend_with_merger for one trend"""
+    program = {
+        'title': selected_program.get('title', ''),
+        'program_type': selected_program.get('program_type', 'movie'),
+        'descriptions': selected_program.get('descriptions', [])[:1],
+        'imdb_id': selected_program.get('imdb_id', ''),
     }
-    
-    if source_detail:
-        payload['source_detail'] = source_detail
-    
-    try:
-        response = requests.post(api_url, json=payload)
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('success', False)
-        else:
-            print(f"❌ Upsert trend API error: {response.status_code} - {response.text}")
-            return False
-    except Exception as e:
-        print(f"❌ Error calling upsert trend API: {e}")
-        return False
+    return {
+        'event_type': 'merger_sync',
+        'payload': {'program': program, 'trend': trend},
+        'idempotency_key': make_idempotency_key(trend.get('id', ''), program['title'], program['program_type']),
+    }
+
+async def deliver_merger_event(event):
+    """Outbox delivery callback: returns True once both merger calls succeeded"""
+    payload = event['payload']
+    _, upserted = await sync_trend_with_merger(payload['program'], payload['trend'], event['idempotency_key'])
+    return upserted
 
-def insert_trend_to_topic(trend_id, topic, topic_category, llm_output, date):
-    """Insert trend to topic in database"""
+def insert_trend_to_topic(trend_id, topic, topic_category, llm_output, date, merger_event=None):
+    """Insert trend to topic in database, queueing merger_event in the outbox within the same transaction"""
     
     conn = get_db_connection()
     if not conn:
@@ -172,144 +289,303 @@ def insert_trend_to_topic(trend_id, topic, topic_category, llm_output, date):
         
         with conn.cursor() as cur:
             cur.execute(insert_query, (trend_id, topic, topic_category, llm_output, date))
+            if merger_event:
+                enqueue_event(cur, DB_CONFIG['schema'], **merger_event)
             conn.commit()
-            return True
+        trends_snapshot.bump(conn)
+        return True
     
     except Exception as e:
-        print(f"❌ Error inserting trend to topic: {e}")
+        logger.error(f"❌ Error inserting trend to topic: {e}")
         conn.rollback()
         return False
     finally:
         conn.close()
 
-def save_csv_to_database(csv_path: str) -> bool:
-    """Save CSV data to PostgreSQL database"""
+outbox_dispatcher = OutboxDispatcher(
+    connect=lambda: get_db_connection(),
+    deliver=deliver_merger_event,
+    schema=DB_CONFIG['schema']
+)
+
+def record_trends_to_topics(keywords, trend_data, selected_program, error_message):
+    """Insert a trends_to_topics row per trend; when the outbox is enabled, queue its merger sync alongside
+
+    Returns the trends whose merger sync was not queued (all of them when the outbox
+    is disabled) so the caller can run those merger calls inline.
+    """
+    unqueued = []
+    for trend in trend_data:
+        try:
+            # Determine topic and category based on agent result
+            if selected_program:
+                topic = selected_program.get('title', '')
+                topic_category = selected_program.get('program_type', 'movie')
+                llm_output = selected_program.get('explanation_of_trend', '')
+            else:
+                # Fallback when agent fails or no program found
+                topic = ', '.join(keywords[:3])  # Use first 3 keywords
+                topic_category = 'unknown'
+                llm_output = error_message or 'No program identified'
+            
+            merger_event = None
+            if selected_program and OUTBOX_CONFIG['enabled']:
+                merger_event = merger_sync_event(selected_program, trend)
+            
+            # Insert trend to topic
+            insert_success = insert_trend_to_topic(
+                trend_id=trend.get('id', ''),
+                topic=topic,
+                topic_category=topic_category,
+                llm_output=llm_output,
+                date=trend.get('trend_started'),
+                merger_event=merger_event
+            )
+            
+            if insert_success:
+                logger.info(f"✅ Successfully inserted trend {trend.get('id', 'unknown')} to topic")
+            else:
+                logger.warning(f"⚠️ Failed to insert trend {trend.get('id', 'unknown')} to topic")
+            if selected_program and not (merger_event and insert_success):
+                unqueued.append(trend)
+                
+        except Exception as e:
+            logger.error(f"❌ Error inserting trend to topic for trend {trend.get('id', 'unknown')}: {e}")
+            if selected_program:
+                unqueued.append(trend)
+    return unqueued
+
+def save_csv_to_database(csv_path: str, full_resync: bool = False) -> bool:
+    """Save CSV data to PostgreSQL database, then move the snapshot into the columnar archive"""
+    import pandas as pd
+    try:
+        logger.info(f"📊 Loading CSV data from: {csv_path}")
+        with stage("csv_parse"):
+            df = pd.read_csv(csv_path)
+    except Exception as e:
+        logger.exception(f"❌ Error reading CSV: {e}")
+        return False
+    
+    # Never import (or archive and delete) a CSV that is not a Google Trends export
+    missing = [column for column in GOOGLE_TRENDS_EXPORT_COLUMNS if column not in df.columns]
+    if missing:
+        logger.error(f"❌ {csv_path} is not a Google Trends export (missing columns {missing}), leaving it alone")
+        return False
+    
+    captured_at = datetime.now(timezone.utc)
+    saved = save_trends_dataframe(df, captured_at, full_resync=full_resync)
+    if saved is not None and TREND_ARCHIVE_CONFIG['enabled']:
+        try:
+            with stage("archive"):
+                path = archive_snapshot(df, captured_at, GOOGLE_TRENDS_GEO)
+            logger.info(f"🗄️ Archived snapshot to {path}")
+            if saved and not TREND_ARCHIVE_CONFIG['keep_csv']:
+                os.remove(csv_path)
+        except Exception as e:
+            logger.error(f"❌ Error archiving snapshot: {e}")
+    return saved is not None
+
+def save_trends_dataframe(df, captured_at: Optional[datetime] = None, full_resync: bool = False,
+                          geo: str = GOOGLE_TRENDS_GEO) -> Optional[int]:
+    """Upsert one Google Trends export (CSV columns) and record it as a history snapshot taken at captured_at
+
+    Rows already saved by an earlier import are skipped unless full_resync is set (see ingest_watermark).
+    Returns the number of rows saved, or None if the export could not be saved.
+    """
+    import pandas as pd
+    from psycopg2.extras import RealDictCursor
+    conn = None
     try:
-        print(f"📊 Loading CSV data from: {csv_path}")
-        df = pd.read_csv(csv_path)
-        print(f"📊 CSV columns: {df.columns.tolist()}")
-        print(f"📊 Total rows: {len(df)}")
+        logger.debug(f"📊 CSV columns: {df.columns.tolist()}")
+        logger.info(f"📊 Total rows: {len(df)}")
         
         conn = get_db_connection()
         if not conn:
-            print("❌ Failed to connect to database")
-            return False
+            logger.error("❌ Failed to connect to database")
+            return None
             
         cursor = conn.cursor(cursor_factory=RealDictCursor)
+        category = 'Entertainment'
+        captured_at = captured_at or datetime.now(timezone.utc)
+        
+        # Drop trends that had already ended when the last import ran, before normalizing any row
+        rows_read, watermark = len(df), None
+        if WATERMARK_CONFIG['enabled'] and not full_resync:
+            try:
+                watermark = get_watermark(cursor, DB_CONFIG['schema'], geo, category)
+                df = new_rows(df, watermark)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not apply ingestion watermark, saving every row: {e}")
+                conn.rollback()
+            if len(df) < rows_read:
+                logger.info(f"⏭️ Skipping {rows_read - len(df)} of {rows_read} rows already ingested before {watermark}")
         
         # Insert new data with individual transaction handling
         inserted_count = 0
+        failed_count = 0
         import re
         
-        for index, row in df.iterrows():
-            try:
-                # Map CSV columns to database schema
-                trends = str(row.get('Trends', '')).strip()
+        # Every saved row becomes one point of its trend's search-volume history
+        history_points = []
+        
+        with stage("db_upsert"):
+            for index, row in df.iterrows():
+                try:
+                    # Map CSV columns to database schema
+                    trends = str(row.get('Trends', '')).strip()
                 
-                # Parse search volume - extract only the number part, ignore everything after
-                search_volume_raw = str(row.get('Search volume', '0')).strip()
-                search_volume = 0
-                if search_volume_raw and search_volume_raw != 'nan':
-                    try:
-                        # Extract only the numeric part from the beginning
-                        match = re.match(r'^(\d+)', search_volume_raw)
-                        if match:
-                            search_volume = int(match.group(1))
-                        else:
+                    # Parse search volume - extract only the number part, ignore everything after
+                    search_volume_raw = str(row.get('Search volume', '0')).strip()
+                    search_volume = 0
+                    if search_volume_raw and search_volume_raw != 'nan':
+                        try:
+                            # Extract only the numeric part from the beginning
+                            match = re.match(r'^(\d+)', search_volume_raw)
+                            if match:
+                                search_volume = int(match.group(1))
+                            else:
+                                search_volume = 0
+                        except:
                             search_volume = 0
-                    except:
-                        search_volume = 0
                 
-                trend_started = pd.to_datetime(row.get('Started'), errors='coerce')
-                trend_ended = pd.to_datetime(row.get('Ended'), errors='coerce') if pd.notna(row.get('Ended')) else None
-                trend_breakdown = str(row.get('Trend breakdown', '')).strip()
-                explore_link = str(row.get('Explore link', '')).strip()
+                    trend_started = pd.to_datetime(row.get('Started'), errors='coerce')
+                    trend_ended = pd.to_datetime(row.get('Ended'), errors='coerce') if pd.notna(row.get('Ended')) else None
+                    trend_breakdown = str(row.get('Trend breakdown', '')).strip()
+                    explore_link = str(row.get('Explore link', '')).strip()
                 
-                # Skip rows with missing required data
-                if not trends or pd.isna(trend_started):
-                    print(f"⚠️ Skipping row {index}: missing required data")
-                    continue
+                    # Skip rows with missing required data
+                    if not trends or pd.isna(trend_started):
+                        logger.debug(f"⚠️ Skipping row {index}: missing required data")
+                        continue
                 
-                # Convert trend_breakdown to array (comma-separated values)
-                trend_breakdown_array = []
-                if trend_breakdown and trend_breakdown != 'nan':
-                    trend_breakdown_array = [item.strip() for item in trend_breakdown.split(',') if item.strip()]
+                    # Convert trend_breakdown to array (comma-separated values)
+                    trend_breakdown_array = []
+                    if trend_breakdown and trend_breakdown != 'nan':
+                        trend_breakdown_array = [item.strip() for item in trend_breakdown.split(',') if item.strip()]
                 
-                # Insert using the new function
-                insert_trend_data(conn, cursor, trends, 'Entertainment', search_volume, trend_started, trend_ended, trend_breakdown_array, explore_link if explore_link != 'nan' else None)
-                inserted_count += 1
+                    # Insert using the new function
+                    trend_id = insert_trend_data(conn, cursor, trends, category, search_volume, trend_started, trend_ended, trend_breakdown_array, explore_link if explore_link != 'nan' else None)
+                    inserted_count += 1
+                    if trend_id is not None:
+                        history_points.append((trend_id, search_volume, None if pd.isna(trend_ended) else trend_ended))
                 
+                except Exception as e:
+                    logger.error(f"❌ Error inserting row {index}: {e}")
+                    failed_count += 1
+                    # Rollback the failed transaction
+                    conn.rollback()
+                    continue
+        
+        
+        logger.info(f"✅ Successfully inserted {inserted_count} records into database")
+        
+        try:
+            record_snapshot(cursor, DB_CONFIG['schema'], history_points, captured_at)
+            conn.commit()
+        except Exception as e:
+            logger.error(f"❌ Error recording search volume history: {e}")
+            conn.rollback()
+        
+        # Failed rows keep the watermark in place so the next import retries them
+        if WATERMARK_CONFIG['enabled'] and not failed_count:
+            try:
+                advance_watermark(cursor, DB_CONFIG['schema'], geo, category, captured_at, rows_read, rows_read - len(df))
+                conn.commit()
             except Exception as e:
-                print(f"❌ Error inserting row {index}: {e}")
-                # Rollback the failed transaction
+                logger.error(f"❌ Error advancing ingestion watermark: {e}")
                 conn.rollback()
-                continue
         
-        print(f"✅ Successfully inserted {inserted_count} records into database")
+        if inserted_count:
+            trends_snapshot.bump(conn)
         
         cursor.close()
         conn.close()
         
-        return True
+        return inserted_count
         
     except Exception as e:
-        print(f"❌ Database save error: {e}")
-        traceback.print_exc()
+        logger.exception(f"❌ Database save error: {e}")
         if conn:
             conn.rollback()
             conn.close()
-        return False
+        return None
 
-# Import agent from current directory
-try:
-    from agent import TrendAgent
-    print("✅ Mock Agent loaded successfully")
-except ImportError as e:
-    print(f"Warning: Could not import TrendAgent: {e}")
-    print("Make sure the agent.py file is in the same directory as backend_api.py")
-    TrendAgent = None
+# Heavy modules are imported on first use; list groups in BACKEND_WARMUP to load them at startup instead
+STARTUP_CONFIG = {
+    "warmup": [name.strip() for name in os.getenv("BACKEND_WARMUP", "").split(",") if name.strip()],
+}
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-    
-    async def connect(self, websocket: WebSocket, client_id: str):
-        await websocket.accept()
-        self.active_connections[client_id] = websocket
-    
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-    
-    async def send_log(self, client_id: str, log_data: dict):
-        if client_id in self.active_connections:
-            try:
-                await self.active_connections[client_id].send_text(json.dumps(log_data))
-            except:
-                self.disconnect(client_id)
+WARMUP_MODULES = {
+    "agent": ["agent"],
+    "pandas": ["pandas"],
+    "psycopg2": ["psycopg2", "psycopg2.extras"],
+    "selenium": ["selenium.webdriver", "selenium.webdriver.support.ui", "webdriver_manager.chrome"],
+}
 
+@functools.lru_cache(maxsize=None)
+def load_trend_agent():
+    """Import the agent from the current directory on first use; None if it can't be imported"""
+    try:
+        from agent import TrendAgent
+        logger.info("✅ Mock Agent loaded successfully")
+        return TrendAgent
+    except ImportError as e:
+        logger.warning(f"Warning: Could not import TrendAgent: {e}")
+        logger.warning("Make sure the agent.py file is in the same directory as backend_api.py")
+        return None
+
+def warm_up(groups: List[str]):
+    """Import the named module groups ahead of the first request that needs them"""
+    for group in groups:
+        if group == "agent":
+            load_trend_agent()
+            continue
+        modules = WARMUP_MODULES.get(group)
+        if modules is None:
+            logger.warning(f"⚠️ Unknown warm-up group: {group}")
+            continue
+        started = time.perf_counter()
+        try:
+            for module in modules:
+                importlib.import_module(module)
+            logger.info(f"🔥 Warmed up {group} in {time.perf_counter() - started:.2f}s")
+        except ImportError as e:
+            logger.warning(f"⚠️ Could not warm up {group}: {e}")
+
+# WebSocket connection manager
 manager = ConnectionManager()
 
+# Logs go through a queue to a writer thread; records with a category also reach the client's log stream
+setup_logging(manager)
+logger = get_logger("api")
+
 # Google Trends Helper Functions
 def get_downloads_dir() -> str:
-    """Return the user's Downloads directory in a cross-platform way."""
-    home = os.path.expanduser("~")
-    downloads = os.path.join(home, "Downloads")
-    # Fallback to home if Downloads doesn't exist for some reason
-    return downloads if os.path.isdir(downloads) else home
+    """Return the directory Google Trends exports are downloaded into, creating it if needed."""
+    os.makedirs(GOOGLE_TRENDS_DOWNLOAD_DIR, exist_ok=True)
+    return GOOGLE_TRENDS_DOWNLOAD_DIR
 
 
+@timed("scrape")
 def download_google_trends_csv() -> Optional[str]:
-    """Open Google Trends, click Export → Download CSV, and save to Downloads.
+    """Open Google Trends, click Export → Download CSV, and save to GOOGLE_TRENDS_DOWNLOAD_DIR.
 
     Returns the absolute path of the downloaded CSV if found, otherwise None.
     """
-    print("🔧 Preparing Chrome for Google Trends CSV download…")
+    # Selenium and webdriver_manager are only needed here; keep them out of worker startup
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    logger.info("🔧 Preparing Chrome for Google Trends CSV download…")
 
-    # Configure Chrome to download into the user's Downloads folder
+    # Configure Chrome to download into the dedicated export folder
     downloads_dir = get_downloads_dir()
-    print(f"📁 Download directory: {downloads_dir}")
+    logger.debug(f"📁 Download directory: {downloads_dir}")
 
     chrome_options = Options()
     chrome_options.add_argument("--no-sandbox")
@@ -330,13 +606,13 @@ def download_google_trends_csv() -> Optional[str]:
     driver = webdriver.Chrome(service=service, options=chrome_options)
 
     try:
-        print("🌐 Navigating to Google Trends…")
-        driver.get("https://trends.google.com/trending?geo=US")
+        logger.info("🌐 Navigating to Google Trends…")
+        driver.get(f"https://trends.google.com/trending?geo={GOOGLE_TRENDS_GEO}")
 
         WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
         time.sleep(5)  # extra time for dynamic content
 
-        print(f"🔍 Page: {driver.title}")
+        logger.debug(f"🔍 Page: {driver.title}")
 
         # Try to find Export button
         export_button = None
@@ -357,13 +633,13 @@ def download_google_trends_csv() -> Optional[str]:
                 export_button = WebDriverWait(driver, 3).until(
                     EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
                 )
-                print(f"✅ Export button via selector: {selector}")
+                logger.debug(f"✅ Export button via selector: {selector}")
                 break
             except Exception:
                 continue
 
         if not export_button:
-            print("🔎 Scanning buttons for 'Export' text…")
+            logger.debug("🔎 Scanning buttons for 'Export' text…")
             for button in driver.find_elements(By.TAG_NAME, "button"):
                 try:
                     text = (button.text or "").lower()
@@ -371,20 +647,20 @@ def download_google_trends_csv() -> Optional[str]:
                     title = (button.get_attribute("title") or "").lower()
                     if "export" in text or "export" in aria or "export" in title:
                         export_button = button
-                        print("✅ Export button found by text")
+                        logger.debug("✅ Export button found by text")
                         break
                 except Exception:
                     continue
 
         if not export_button:
-            print("❌ Could not find Export button")
+            logger.error("❌ Could not find Export button")
             return None
 
         try:
             export_button.click()
         except Exception:
             driver.execute_script("arguments[0].click();", export_button)
-            print("ℹ️ Used JS click for Export")
+            logger.debug("ℹ️ Used JS click for Export")
 
         time.sleep(3)  # wait for dropdown to show
 
@@ -411,13 +687,13 @@ def download_google_trends_csv() -> Optional[str]:
                 csv_button = WebDriverWait(driver, 3).until(
                     EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
                 )
-                print(f"✅ 'Download CSV' via selector: {selector}")
+                logger.debug(f"✅ 'Download CSV' via selector: {selector}")
                 break
             except Exception:
                 continue
 
         if not csv_button:
-            print("🔎 Scanning dropdown elements for 'Download CSV'…")
+            logger.debug("🔎 Scanning dropdown elements for 'Download CSV'…")
             dropdown_elements = driver.find_elements(
                 By.CSS_SELECTOR, "[role='menuitem'], .menu-item, .dropdown-item, a, button"
             )
@@ -428,31 +704,32 @@ def download_google_trends_csv() -> Optional[str]:
                     title = (element.get_attribute("title") or "").lower()
                     if "download csv" in text or "download csv" in aria or "download csv" in title:
                         csv_button = element
-                        print("✅ 'Download CSV' found by text")
+                        logger.debug("✅ 'Download CSV' found by text")
                         break
                 except Exception:
                     continue
 
         if not csv_button:
-            print("❌ Could not find 'Download CSV' option")
+            logger.error("❌ Could not find 'Download CSV' option")
             return None
 
+        download_started = time.time()
         try:
             csv_button.click()
         except Exception:
             driver.execute_script("arguments[0].click();", csv_button)
-            print("ℹ️ Used JS click for 'Download CSV'")
+            logger.debug("ℹ️ Used JS click for 'Download CSV'")
 
         # Wait for download to complete
         time.sleep(8)
 
-        # Find newest CSV in Downloads
+        # Find the newest CSV written by this download
         csv_files = [
             f for f in os.listdir(downloads_dir)
-            if f.lower().endswith(".csv")
+            if f.lower().endswith(".csv") and os.path.getmtime(os.path.join(downloads_dir, f)) >= download_started - 1
         ]
         if not csv_files:
-            print("❌ No CSV file detected in Downloads")
+            logger.error(f"❌ No new CSV file detected in {downloads_dir}")
             return None
 
         csv_files.sort(
@@ -460,7 +737,7 @@ def download_google_trends_csv() -> Optional[str]:
             reverse=True,
         )
         csv_path = os.path.join(downloads_dir, csv_files[0])
-        print(f"✅ CSV downloaded: {csv_path}")
+        logger.info(f"✅ CSV downloaded: {csv_path}")
         return csv_path
 
     finally:
@@ -472,23 +749,22 @@ def parse_google_trends_from_db(top_n: int = 10) -> List[dict]:
         # Define trend categories to look for
         trend_categories = ['Entertainment']
         
-        print(f"Fetching top {top_n} trends from database...")
-        print(f"Looking for categories: {trend_categories}")
+        logger.info(f"Fetching top {top_n} trends from database...")
+        logger.debug(f"Looking for categories: {trend_categories}")
         
         # Get new trends from database
         trend_results = get_new_trends(trend_categories, top_n)
         
         if not trend_results:
-            print("No new trends found in database")
+            logger.info("No new trends found in database")
             return []
         
-        print(f"Found {len(trend_results)} trends from database")
+        logger.info(f"Found {len(trend_results)} trends from database")
         
         # Return full trend data instead of just trend breakdown
         return trend_results[:top_n]
     except Exception as e:
-        print(f"❌ Error parsing trends from database: {e}")
-        traceback.print_exc()
+        logger.exception(f"❌ Error parsing trends from database: {e}")
         return []
 
 app = FastAPI(
@@ -504,8 +780,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id", "X-Profile-Skipped", "X-Request-Id", "ETag"],
 )
 
+# gzip/brotli for large responses such as fetch-google-trends with a big top_n
+add_compression(app)
+
+profiler = Profiler()
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Profile requests sent with X-Profile: 1 or ?profile=1, at most one at a time and rate limited"""
+    if not profiler.requested(request.headers, request.query_params) or request.url.path.startswith("/api/profiles"):
+        return await call_next(request)
+
+    skipped = profiler.acquire()
+    if skipped:
+        response = await call_next(request)
+        response.headers["X-Profile-Skipped"] = skipped
+        return response
+
+    sampler = StackSampler()
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        sampler.stop()
+        profiler.release()
+    duration = time.perf_counter() - started
+    profile_id = await asyncio.to_thread(
+        profiler.save, sampler, request.method, request.url.path, response.status_code, duration
+    )
+    logger.info(f"🔬 Profiled {request.method} {request.url.path} in {duration:.2f}s ({sampler.samples} samples): {profile_id}")
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
 class TrendRequest(BaseModel):
     keywords: List[str]
     trend_data: Optional[List[Dict[str, Any]]] = None
@@ -516,6 +826,7 @@ class TrendResponse(BaseModel):
     program: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
     message: Optional[str] = None
+    timings_ms: Optional[Dict[str, float]] = None
 
 class HealthResponse(BaseModel):
     status: str
@@ -530,11 +841,178 @@ class LogEntry(BaseModel):
 
 class GoogleTrendsRequest(BaseModel):
     top_n: int = 10
+    # Save every row of the export, ignoring the ingestion watermark
+    full_resync: bool = False
+
+class PendingTrendsRequest(BaseModel):
+    top_n: int = 10
+
+class ArchiveReingestRequest(BaseModel):
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    geo: Optional[str] = None
 
 class GoogleTrendsResponse(BaseModel):
     success: bool
     trends: Optional[List[Dict[str, Any]]] = None
+    clusters: Optional[List[Dict[str, Any]]] = None
     error: Optional[str] = None
+    timings_ms: Optional[Dict[str, float]] = None
+
+@app.on_event("startup")
+async def warm_up_modules():
+    """Load the BACKEND_WARMUP module groups before serving, off the event loop"""
+    if STARTUP_CONFIG['warmup']:
+        await asyncio.to_thread(warm_up, STARTUP_CONFIG['warmup'])
+
+@app.on_event("startup")
+async def start_event_bus():
+    """Join the cross-worker bus so logs reach viewers connected to any worker"""
+    bus = create_event_bus(connect=get_db_connection)
+    try:
+        await bus.start(manager.receive)
+        manager.bus = bus
+    except Exception as e:
+        logger.warning(f"⚠️ Could not start event bus, logs stay within this worker: {e}")
+
+@app.on_event("shutdown")
+async def stop_event_bus():
+    if manager.bus is not None:
+        await manager.bus.stop()
+
+@app.on_event("startup")
+async def ensure_topic_cache():
+    """Create the persistent topic mapping table when TOPIC_CACHE_PERSIST is on"""
+    if not TOPIC_CACHE_CONFIG['persist']:
+        return
+    conn = await asyncio.to_thread(get_db_connection)
+    if conn:
+        try:
+            await asyncio.to_thread(ensure_topic_cache_table, conn, DB_CONFIG['schema'])
+        except Exception as e:
+            logger.warning(f"⚠️ Could not create topic cache table: {e}")
+        finally:
+            conn.close()
+
+@app.on_event("startup")
+async def ensure_tmdb_cache():
+    """Create the persistent TMDB details cache when enrichment is configured"""
+    if not (tmdb_enricher.available and TMDB_CONFIG['persist']):
+        return
+    conn = await asyncio.to_thread(get_db_connection)
+    if conn:
+        try:
+            await asyncio.to_thread(ensure_tmdb_cache_table, conn, DB_CONFIG['schema'])
+        except Exception as e:
+            logger.warning(f"⚠️ Could not create TMDB cache table: {e}")
+        finally:
+            conn.close()
+
+@app.on_event("startup")
+async def ensure_trends_schema():
+    """Create the snapshot sequence, the history and watermark tables and the listing and search indexes"""
+    conn = await asyncio.to_thread(get_db_connection)
+    if conn:
+        try:
+            # Partitioned tables change the google_trends upsert and the pending window, and can't be indexed concurrently
+            PARTITION_CONFIG['partitioned'] = await asyncio.to_thread(is_partitioned, conn, DB_CONFIG['schema'], 'google_trends')
+            await asyncio.to_thread(ensure_snapshot_sequence, conn, DB_CONFIG['schema'])
+            await asyncio.to_thread(ensure_history_table, conn, DB_CONFIG['schema'])
+            await asyncio.to_thread(ensure_watermark_table, conn, DB_CONFIG['schema'])
+            await asyncio.to_thread(ensure_listing_index, conn, DB_CONFIG['schema'])
+            # Trigram matching stays on only when pg_trgm could actually be used
+            TREND_SEARCH_CONFIG['trigram'] = await asyncio.to_thread(ensure_search_indexes, conn, DB_CONFIG['schema'])
+            if not TREND_SEARCH_CONFIG['trigram']:
+                logger.info("ℹ️ pg_trgm unavailable, trend search uses full-text matching only")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not create trends listing/search indexes: {e}")
+        finally:
+            conn.close()
+
+def run_partition_maintenance():
+    """Create upcoming partitions and apply retention; None when another worker is already on it"""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        result = maintain_partitions(conn, DB_CONFIG['schema'])
+        if result and result['retired']:
+            trends_snapshot.bump(conn)
+        return result
+    finally:
+        conn.close()
+
+async def partition_maintenance_loop():
+    while True:
+        try:
+            result = await asyncio.to_thread(run_partition_maintenance)
+            if result and (result['created'] or result['retired']):
+                logger.info(f"🗂️ Partition maintenance: created {result['created']}, "
+                            f"retired {[r['partition'] for r in result['retired']]}")
+        except Exception as e:
+            logger.error(f"❌ Partition maintenance error: {e}")
+        await asyncio.sleep(PARTITION_CONFIG['maintenance_interval'])
+
+partition_maintenance_task = None
+
+@app.on_event("startup")
+async def start_partition_maintenance():
+    """Keep partitions ahead of incoming trends and apply retention when the tables are partitioned"""
+    global partition_maintenance_task
+    if PARTITION_CONFIG['partitioned']:
+        partition_maintenance_task = asyncio.create_task(partition_maintenance_loop())
+
+@app.on_event("shutdown")
+async def stop_partition_maintenance():
+    if partition_maintenance_task is not None:
+        partition_maintenance_task.cancel()
+        await asyncio.gather(partition_maintenance_task, return_exceptions=True)
+
+@app.on_event("startup")
+async def start_outbox_dispatcher():
+    """Create the outbox table and start draining it in the background"""
+    if not OUTBOX_CONFIG['enabled']:
+        return
+    conn = await asyncio.to_thread(get_db_connection)
+    if conn:
+        try:
+            await asyncio.to_thread(ensure_outbox_table, conn, DB_CONFIG['schema'])
+        except Exception as e:
+            logger.warning(f"⚠️ Could not create outbox table: {e}")
+        finally:
+            conn.close()
+    outbox_dispatcher.start()
+
+@app.on_event("startup")
+async def start_analysis_scheduler():
+    """Start analyzing pending trends in the background when TREND_SCHEDULER is on"""
+    if SCHEDULER_CONFIG['enabled']:
+        if load_trend_agent():
+            analysis_scheduler.start()
+        else:
+            logger.warning("⚠️ Trend scheduler not started: agent is not available")
+
+@app.on_event("shutdown")
+async def stop_analysis_scheduler():
+    """Let in-flight scheduled analyses finish"""
+    await analysis_scheduler.stop()
+
+@app.on_event("shutdown")
+async def close_merger_client():
+    """Stop the outbox dispatcher and release pooled merger connections"""
+    await outbox_dispatcher.stop()
+    await upsert_batcher.aclose()
+    await merger_client.aclose()
+
+@app.on_event("shutdown")
+async def close_tmdb_enricher():
+    """Finish pending TMDB lookups and release pooled connections"""
+    await tmdb_enricher.aclose()
+
+@app.on_event("shutdown")
+async def flush_logs():
+    """Write out queued log records before the worker exits"""
+    stop_logging()
 
 @app.get("/", response_model=HealthResponse)
 async def root():
@@ -547,7 +1025,7 @@ async def root():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
-    agent_status = "available" if TrendAgent else "unavailable"
+    agent_status = "available" if load_trend_agent() else "unavailable"
     return HealthResponse(
         status="healthy",
         message=f"API is running. Agent: {agent_status}"
@@ -556,15 +1034,89 @@ async def health_check():
 @app.get("/ws/test")
 async def websocket_test():
     """Test endpoint to verify WebSocket support"""
-    return {"message": "WebSocket endpoint is accessible", "active_connections": len(manager.active_connections)}
+    return {
+        "message": "WebSocket endpoint is accessible",
+        "active_connections": sum(len(sockets) for sockets in manager.active_connections.values()),
+        "log_stream": manager.metrics()
+    }
+
+@app.get("/api/scheduler/metrics")
+async def scheduler_metrics():
+    """Trend scheduler queue depth per category and worker counters"""
+    return analysis_scheduler.metrics()
+
+@app.get("/api/outbox/metrics")
+async def outbox_metrics():
+    """Merger outbox queue depth and dispatcher counters"""
+    return await asyncio.to_thread(outbox_dispatcher.metrics)
+
+@app.get("/api/merger/metrics")
+async def merger_metrics():
+    """Topic resolution cache hit/miss counters and upsert batching stats"""
+    return {
+        "topic_cache": topic_cache.metrics(),
+        "upsert_batcher": {**upsert_batcher.stats, "bulk_supported": upsert_batcher.bulk_supported},
+    }
+
+@app.get("/api/enrichment/metrics")
+async def enrichment_metrics():
+    """TMDB details cache hit/miss counters and batch stats"""
+    return tmdb_enricher.metrics()
+
+@app.get("/api/programs/{imdb_id}/details")
+async def program_details(imdb_id: str, program_type: str = Query("movie")):
+    """Cached TMDB details for a program, for clients that don't have them from /api/analyze-trends"""
+    if not tmdb_enricher.available:
+        raise HTTPException(status_code=503, detail="TMDB enrichment is not configured (set TMDB_API_KEY)")
+    details = await tmdb_enricher.lookup(imdb_id, program_type)
+    if details is None:
+        raise HTTPException(status_code=404, detail=f"No TMDB details for {imdb_id}")
+    return FastJSONResponse(details)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint with per-stage latency histograms"""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+@app.middleware("http")
+async def correlate_requests(request: Request, call_next):
+    """Give every request an id (or adopt the caller's X-Request-Id) that all its log records carry"""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    set_correlation(request_id=request_id)
+    response = await call_next(request)
+    response.headers["X-Request-Id"] = request_id
+    return response
+
+def require_profile_access(request: Request):
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not profiler.authorized(request.headers):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Profile-Token")
+
+@app.get("/api/profiles")
+async def list_profiles(request: Request):
+    """Saved request profiles, newest first"""
+    require_profile_access(request)
+    return await asyncio.to_thread(profiler.list_profiles)
+
+@app.get("/api/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, request: Request):
+    """Collapsed stacks for a saved profile; feed to flamegraph.pl or load in speedscope"""
+    require_profile_access(request)
+    profile = await asyncio.to_thread(profiler.load, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile)
 
 @app.post("/api/fetch-google-trends", response_model=GoogleTrendsResponse)
 async def fetch_google_trends(request: GoogleTrendsRequest):
     """
     Fetch latest Google Trends and return top N trending keywords
     """
+    start_breakdown()
     try:
-        print(f"📊 Fetching top {request.top_n} Google Trends...")
+        logger.info(f"📊 Fetching top {request.top_n} Google Trends...")
         
         # Download CSV from Google Trends
         csv_path = await asyncio.to_thread(download_google_trends_csv)
@@ -576,14 +1128,16 @@ async def fetch_google_trends(request: GoogleTrendsRequest):
             )
         
         # Save CSV data to database BEFORE parsing
-        print("💾 Saving CSV data to database...")
-        db_save_success = await asyncio.to_thread(save_csv_to_database, csv_path)
+        logger.info("💾 Saving CSV data to database...")
+        db_save_success = await asyncio.to_thread(save_csv_to_database, csv_path, request.full_resync)
         
         if not db_save_success:
-            print("⚠️ Warning: Failed to save data to database, but continuing with parsing")
+            logger.warning("⚠️ Warning: Failed to save data to database, but continuing with parsing")
+        elif SCHEDULER_CONFIG['enabled']:
+            analysis_scheduler.notify()
         
         # Parse trends from database and get full trend data
-        trends = parse_google_trends_from_db(request.top_n)
+        trends = await asyncio.to_thread(parse_google_trends_from_db, request.top_n)
         
         if not trends:
             raise HTTPException(
@@ -591,52 +1145,316 @@ async def fetch_google_trends(request: GoogleTrendsRequest):
                 detail="Failed to parse trends from database"
             )
         
-        print(f"✅ Successfully fetched {len(trends)} trends from database")
+        logger.info(f"✅ Successfully fetched {len(trends)} trends from database")
+        clusters = await asyncio.to_thread(group_trends, trends)
         
-        return GoogleTrendsResponse(
-            success=True,
-            trends=trends
-        )
+        # Rows come straight from our own table, so skip re-validating them through GoogleTrendsResponse
+        return FastJSONResponse({
+            "success": True,
+            "trends": trends,
+            "clusters": [describe_cluster(cluster) for cluster in clusters],
+            "error": None,
+            "timings_ms": current_breakdown()
+        })
     
     except HTTPException:
         raise
     
     except Exception as e:
-        print(f"❌ Error fetching Google Trends: {e}")
-        traceback.print_exc()
+        logger.exception(f"❌ Error fetching Google Trends: {e}")
         return GoogleTrendsResponse(
             success=False,
-            error=str(e)
+            error=str(e),
+            timings_ms=current_breakdown()
+        )
+
+@timed("clustering")
+def group_trends(trends):
+    """Near-duplicate clusters of trends, or one cluster per trend when TREND_CLUSTERING is off"""
+    if not CLUSTERING_CONFIG['enabled']:
+        return [[trend] for trend in trends]
+    clusters = cluster_trends(trends)
+    if len(clusters) < len(trends):
+        logger.info(f"🧩 Grouped {len(trends)} trends into {len(clusters)} clusters")
+    return clusters
+
+def describe_cluster(cluster):
+    return {"trend_ids": [trend.get('id') for trend in cluster], "keywords": cluster_keywords(cluster)}
+
+async def analyze_cluster(cluster, client_id=None):
+    """One agent run for a cluster of trends, recorded against every member"""
+    # Same JSON shape the frontend posts as trend_data (dates as ISO strings)
+    trend_data = json.loads(dumps_bytes(cluster))
+    return await analyze_trends(TrendRequest(keywords=cluster_keywords(cluster), trend_data=trend_data), client_id=client_id)
+
+# Background analysis of pending trends, biggest live trends first with per-category quotas
+analysis_scheduler = AnalysisScheduler(
+    connect=lambda: get_db_connection(),
+    analyze=analyze_cluster,
+    schema=DB_CONFIG['schema'],
+    group=group_trends
+)
+
+@app.post("/api/analyze-pending-trends")
+async def analyze_pending_trends(request: PendingTrendsRequest, client_id: str = Query(None)):
+    """
+    Analyze the top pending trends, running the agent once per near-duplicate cluster
+
+    Every member of a cluster gets the cluster's result recorded in trends_to_topics
+    (and synced to the merger), exactly as if it had been analyzed on its own.
+    """
+    if not load_trend_agent():
+        raise HTTPException(status_code=503, detail="Agent is not available. Please check agent configuration.")
+    
+    trends = await asyncio.to_thread(parse_google_trends_from_db, request.top_n)
+    clusters = await asyncio.to_thread(group_trends, trends)
+    
+    results = []
+    for index, cluster in enumerate(clusters):
+        cluster_client_id = f"{client_id}-{index}" if client_id else None
+        response = await analyze_cluster(cluster, cluster_client_id)
+        results.append({**describe_cluster(cluster), "client_id": cluster_client_id, "result": response.model_dump()})
+    
+    return FastJSONResponse({
+        "success": True,
+        "trends": len(trends),
+        "agent_runs": len(clusters),
+        "clusters": results
+    })
+
+@app.get("/api/trends")
+async def list_trends(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    pending: bool = Query(False),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """
+    List trends newest first with keyset pagination
+
+    JSON pages return `next_cursor`; pass it back as `cursor` for the next page.
+    With format=ndjson (or Accept: application/x-ndjson) every matching row after
+    `cursor` is streamed one JSON object per line, up to `limit` if given.
+    `pending=true` limits the listing to trends not yet linked to a topic.
+    Responses carry the trend snapshot version (plus the format for NDJSON) as
+    ETag; a matching If-None-Match gets a 304 without touching the trends tables.
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Accept can pick the format, so each format gets its own ETag and caches key on Accept
+    ndjson = format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", "")
+
+    # Read the version before the data so the ETag never claims newer data than was sent
+    version = await trends_snapshot.current()
+    cache_headers = {"Vary": "Accept"}
+    if version is not None:
+        cache_headers.update({"ETag": etag_for(version, "ndjson" if ndjson else None), "Cache-Control": "no-cache"})
+        if etag_matches(request.headers.get("if-none-match"), cache_headers["ETag"]):
+            return Response(status_code=304, headers=cache_headers)
+
+    if ndjson:
+        stream = stream_ndjson(get_db_connection, DB_CONFIG['schema'], category, pending, after, limit)
+        # Pull the first batch before answering so connection/query errors still get a proper status
+        try:
+            first = await anext(stream, b"")
+        except Exception as e:
+            logger.exception(f"❌ Error streaming trends: {e}")
+            raise HTTPException(status_code=503, detail="Failed to query trends")
+
+        async def body():
+            yield first
+            async for chunk in stream:
+                yield chunk
+
+        return StreamingResponse(body(), media_type="application/x-ndjson", headers=cache_headers)
+
+    page_size = min(limit or TREND_LISTING_CONFIG['default_limit'], TREND_LISTING_CONFIG['max_limit'])
+    conn = await asyncio.to_thread(get_db_connection)
+    if not conn:
+        raise HTTPException(status_code=503, detail="Database connection failed")
+    try:
+        trends, next_cursor = await asyncio.to_thread(
+            fetch_page, conn, DB_CONFIG['schema'], page_size, category, pending, after
         )
+    except Exception as e:
+        logger.exception(f"❌ Error listing trends: {e}")
+        raise HTTPException(status_code=503, detail="Failed to query trends")
+    finally:
+        conn.close()
+    return FastJSONResponse({"trends": trends, "next_cursor": next_cursor}, headers=cache_headers)
+
+@app.get("/api/trends/search")
+async def search_trends_endpoint(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: Optional[int] = Query(None, ge=1),
+    category: Optional[str] = Query(None),
+):
+    """
+    Search trend titles and trend_breakdown terms, best match first
+
+    Every word of q must match (words of 3+ characters as prefixes, so "chalam"
+    finds "timothee chalamet"); title matches rank above breakdown matches.
+    Carries the same snapshot ETag as /api/trends.
+    """
+    version = await trends_snapshot.current()
+    cache_headers = {"ETag": etag_for(version), "Cache-Control": "no-cache"} if version is not None else {}
+    if version is not None and etag_matches(request.headers.get("if-none-match"), cache_headers["ETag"]):
+        return Response(status_code=304, headers=cache_headers)
+
+    limit = min(limit or TREND_SEARCH_CONFIG['default_limit'], TREND_SEARCH_CONFIG['max_limit'])
+    conn = await asyncio.to_thread(get_db_connection)
+    if not conn:
+        raise HTTPException(status_code=503, detail="Database connection failed")
+    try:
+        trends = await asyncio.to_thread(
+            search_trends, conn, DB_CONFIG['schema'], q, limit, category, TREND_SEARCH_CONFIG['trigram']
+        )
+    except Exception as e:
+        logger.exception(f"❌ Error searching trends: {e}")
+        raise HTTPException(status_code=503, detail="Failed to search trends")
+    finally:
+        conn.close()
+    return FastJSONResponse({"query": q, "trends": trends}, headers=cache_headers)
+
+@app.get("/api/trends/growth")
+async def trends_growth(
+    sort: str = Query("velocity", pattern=f"^({'|'.join(GROWTH_SORTS)})$"),
+    limit: int = Query(50, ge=1, le=500),
+    category: Optional[str] = Query(None),
+):
+    """Trends ranked by latest search-volume velocity (per hour) or acceleration (per hour²)"""
+    conn = await asyncio.to_thread(get_db_connection)
+    if not conn:
+        raise HTTPException(status_code=503, detail="Database connection failed")
+    try:
+        trends = await asyncio.to_thread(growth_ranking, conn, DB_CONFIG['schema'], sort, limit, category)
+    except Exception as e:
+        logger.exception(f"❌ Error ranking trends by growth: {e}")
+        raise HTTPException(status_code=503, detail="Failed to query trend history")
+    finally:
+        conn.close()
+    return FastJSONResponse({"trends": trends, "sort": sort})
+
+@app.get("/api/trends/{trend_id}/history")
+async def trend_history(trend_id: int):
+    """Search-volume history of one trend with velocity and acceleration at each snapshot"""
+    conn = await asyncio.to_thread(get_db_connection)
+    if not conn:
+        raise HTTPException(status_code=503, detail="Database connection failed")
+    try:
+        points = await asyncio.to_thread(trend_series, conn, DB_CONFIG['schema'], trend_id)
+    except Exception as e:
+        logger.exception(f"❌ Error reading trend history: {e}")
+        raise HTTPException(status_code=503, detail="Failed to query trend history")
+    finally:
+        conn.close()
+    if not points:
+        raise HTTPException(status_code=404, detail="No history for this trend")
+    return FastJSONResponse({"trend_id": trend_id, "points": points})
+
+@app.get("/api/archive/snapshots")
+async def archive_snapshots(date_from: Optional[date] = Query(None), date_to: Optional[date] = Query(None),
+                            geo: Optional[str] = Query(None)):
+    """Archived Google Trends snapshots in capture order"""
+    snapshots = await asyncio.to_thread(list_snapshots, date_from, date_to, geo)
+    return FastJSONResponse({"snapshots": snapshots})
+
+def reingest_snapshots(snapshots: List[Dict[str, Any]]) -> int:
+    """Replay archived snapshots through the normal save path, oldest first; returns how many were saved"""
+    saved = 0
+    for snapshot in snapshots:
+        df = read_snapshot(snapshot["path"]).to_pandas()
+        # Backfills replay older exports in full; the watermark only ever moves forward
+        if save_trends_dataframe(df, snapshot["captured_at"], full_resync=True, geo=snapshot["geo"]) is not None:
+            saved += 1
+    if saved:
+        # Replayed points may fall between ones already recorded; recompute the latest growth of every trend
+        conn = get_db_connection()
+        if conn:
+            try:
+                rebuild_growth(conn, DB_CONFIG['schema'])
+            finally:
+                conn.close()
+    return saved
+
+@app.get("/api/partitions")
+async def partitions():
+    """Attached partitions of google_trends and trends_to_topics with their date ranges"""
+    if not PARTITION_CONFIG['partitioned']:
+        return {"partitioned": False}
+    conn = await asyncio.to_thread(get_db_connection)
+    if not conn:
+        raise HTTPException(status_code=503, detail="Database is not available")
+    try:
+        tables = {table: await asyncio.to_thread(list_partitions, conn, DB_CONFIG['schema'], table)
+                  for table in ('google_trends', 'trends_to_topics')}
+        return FastJSONResponse({"partitioned": True, "interval": PARTITION_CONFIG['interval'], "tables": tables})
+    finally:
+        conn.close()
+
+@app.get("/api/ingest/watermarks")
+async def ingest_watermarks():
+    """Ingestion watermark per (geo, category), with the row counts of the import that set it"""
+    conn = await asyncio.to_thread(get_db_connection)
+    if not conn:
+        raise HTTPException(status_code=503, detail="Database is not available")
+    try:
+        return FastJSONResponse({"watermarks": await asyncio.to_thread(list_watermarks, conn, DB_CONFIG['schema'])})
+    finally:
+        conn.close()
+
+@app.post("/api/archive/reingest")
+async def reingest_archive(request: ArchiveReingestRequest):
+    """Re-ingest archived snapshots (e.g. to backfill history) without scraping Google Trends again"""
+    if not TREND_ARCHIVE_CONFIG['enabled']:
+        raise HTTPException(status_code=503, detail="Trend archive is disabled or pyarrow is not installed")
+    snapshots = await asyncio.to_thread(list_snapshots, request.date_from, request.date_to, request.geo)
+    saved = await asyncio.to_thread(reingest_snapshots, snapshots)
+    return {"success": saved == len(snapshots), "snapshots": len(snapshots), "saved": saved}
 
 @app.websocket("/ws/logs/{client_id}")
-async def websocket_logs(websocket: WebSocket, client_id: str):
-    """WebSocket endpoint for real-time logs"""
-    print(f"WebSocket connection attempt from client: {client_id}")
+async def websocket_logs(websocket: WebSocket, client_id: str, since: Optional[int] = Query(None)):
+    """WebSocket endpoint for real-time logs; pass ?since=<seq> to resume after the last event seen"""
+    logger.debug(f"WebSocket connection attempt from client: {client_id}")
+    set_correlation(client_id=client_id)
+    subscriber = None
     try:
-        await manager.connect(websocket, client_id)
-        print(f"WebSocket connected successfully for client: {client_id}")
+        subscriber = await manager.connect(websocket, client_id, since)
+        logger.info(f"WebSocket connected successfully for client: {client_id}")
         while True:
             # Keep connection alive
             await websocket.receive_text()
     except WebSocketDisconnect:
-        print(f"WebSocket disconnected for client: {client_id}")
-        manager.disconnect(client_id)
+        logger.info(f"WebSocket disconnected for client: {client_id}")
     except Exception as e:
-        print(f"WebSocket error for client {client_id}: {e}")
-        manager.disconnect(client_id)
+        logger.info(f"WebSocket error for client {client_id}: {e}")
+    finally:
+        if subscriber is not None:
+            manager.disconnect(client_id, subscriber)
 
 @app.post("/api/analyze-trends", response_model=TrendResponse)
 async def analyze_trends(request: TrendRequest, client_id: str = Query(None)):
     """
     Analyze trending keywords using the agent
     """
+    start_breakdown()
+    if client_id:
+        set_correlation(client_id=client_id)
+        # A reused client_id starts a fresh log stream instead of replaying the last run's close
+        manager.start_run(client_id)
     try:
         # Validate input
         if not request.keywords:
             raise HTTPException(status_code=400, detail="No keywords provided")
         
         # Check if agent is available
+        TrendAgent = load_trend_agent()
         if not TrendAgent:
             raise HTTPException(
                 status_code=503, 
@@ -647,66 +1465,39 @@ async def analyze_trends(request: TrendRequest, client_id: str = Query(None)):
         agent = TrendAgent()
         
         # Send initial log
-        if client_id:
-            await manager.send_log(client_id, {
-                "timestamp": datetime.now().isoformat(),
-                "level": "INFO",
-                "category": "ANALYSIS",
-                "message": f"Starting trend analysis for: {', '.join(request.keywords)}",
-                "data": {"keywords": request.keywords}
-            })
+        logger.info(f"Starting trend analysis for: {', '.join(request.keywords)}",
+                    extra={"category": "ANALYSIS", "data": {"keywords": request.keywords}})
         
         # Run agent analysis
-        print(f"Analyzing trends: {request.keywords}")
-        selected_program, error_message, successfully_completed = await agent.run(request.keywords, client_id, manager)
+        logger.info(f"Analyzing trends: {request.keywords}")
+        with stage("agent_run"):
+            selected_program, error_message, successfully_completed = await agent.run(request.keywords, client_id, manager)
+        
+        # Look up poster and details while the result is recorded
+        enrichment = None
+        if selected_program and successfully_completed:
+            enrichment = asyncio.create_task(enrich_program(selected_program))
+        
+        # Record trend to topic regardless of agent success/failure; merger calls are queued in the same transaction
+        unqueued = []
+        if request.trend_data:
+            found_program = selected_program if (selected_program and successfully_completed) else None
+            unqueued = await asyncio.to_thread(record_trends_to_topics, request.keywords, request.trend_data, found_program, error_message)
+            if found_program and OUTBOX_CONFIG['enabled'] and len(unqueued) < len(request.trend_data):
+                outbox_dispatcher.notify()
         
         # Handle the 3 cases: program found, agent error, or no program found
         if selected_program and successfully_completed:
-            print(f"Agent found program: {selected_program.get('title', 'Unknown')}")
+            logger.info(f"Agent found program: {selected_program.get('title', 'Unknown')}")
             
-            # Store topic_id for response
-            topic_id = None
+            # Store topic_id for response; queued trends reuse the cached topic_id when there is one
+            topic_id = topic_cache.get(topic_cache_key(selected_program))
             
-            # Call ingest topic API when agent is successful
-            if selected_program and request.trend_data:
-                for trend in request.trend_data:
-                    try:
-                        # Prepare ingest topic API call
-                        topic_id = call_ingest_topic_api(
-                            name=selected_program.get('title', ''),
-                            topic_type=selected_program.get('program_type', 'movie'),
-                            source_id=trend.get('id', ''),
-                            source_name=f"{DB_CONFIG['schema']}.google_trends",
-                            source_id_type='id',
-                            description=selected_program.get('descriptions', [''])[0] if selected_program.get('descriptions') else '',
-                            date=trend.get('trend_started')
-                        )
-                        
-                        if topic_id:
-                            # Call upsert trend API after successful ingest
-                            trend_info = {
-                                'search_volume': trend.get('search_volume', 0),
-                                'trend_breakdown': trend.get('trend_breakdown', []),
-                                'trend_started': trend.get('trend_started'),
-                                'trend_ended': trend.get('trend_ended')
-                            }
-                            
-                            upsert_success = call_upsert_trend_api(
-                                topic_id=topic_id,
-                                source='google',
-                                trend_info=trend_info,
-                                source_detail=trend.get('explore_link')
-                            )
-                            
-                            if upsert_success:
-                                print(f"✅ Successfully upserted trend for topic {topic_id}")
-                            else:
-                                print(f"⚠️ Failed to upsert trend for topic {topic_id}")
-                        else:
-                            print(f"⚠️ Failed to ingest topic for trend {trend.get('id', 'unknown')}")
-                            
-                    except Exception as e:
-                        print(f"❌ Error in API calls for trend {trend.get('id', 'unknown')}: {e}")
+            # Call merger APIs inline for trends the outbox could not take (or all of them when it is disabled)
+            if unqueued:
+                topic_id = await sync_trends_with_merger(selected_program, unqueued) or topic_id
+            
+            details = await enrichment
             
             # Format response according to frontend expectations
             # When program is returned, it's always trending (agent only returns trending programs)
@@ -722,108 +1513,75 @@ async def analyze_trends(request: TrendRequest, client_id: str = Query(None)):
                     "explanation_of_trend": selected_program.get('explanation_of_trend', ''),
                     "imdb_id": selected_program.get('imdb_id', ''),
                     "topic_id": topic_id,  # Include topic_id in response
-                    "poster_path": None  # Will be filled by TMDB API in frontend
+                    "poster_path": details.get('poster_path') if details else None,
+                    "details": details  # TMDB details, None when not enriched
                 },
-                "message": "Successfully identified trending program"
+                "message": "Successfully identified trending program",
+                "timings_ms": current_breakdown()
             }
             
             # Send completion log and disconnect WebSocket
+            logger.info("Analysis completed successfully", extra={
+                "category": "RESULT",
+                "data": {"result": "trending_program_found", "timings_ms": response_data["timings_ms"]}
+            })
             if client_id:
-                await manager.send_log(client_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "level": "INFO",
-                    "category": "RESULT",
-                    "message": "Analysis completed successfully",
-                    "data": {"result": "trending_program_found"}
-                })
-                # Disconnect WebSocket after completion
-                manager.disconnect(client_id)
+                # Finish the run's log stream once viewers have the remaining events
+                await manager.finish_run(client_id, result=response_data)
             
             return TrendResponse(**response_data)
         # Handle agent error (only when not successfully completed)
         elif not successfully_completed:
-            print(f"Agent failed with error: {error_message}")
-            
-            # Send error log and disconnect WebSocket
-            if client_id:
-                await manager.send_log(client_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "level": "ERROR",
-                    "category": "RESULT",
-                    "message": "Analysis completed with error",
-                    "data": {"error": error_message}
-                })
-                # Disconnect WebSocket after completion
-                manager.disconnect(client_id)
+            logger.info(f"Agent failed with error: {error_message}")
             
-            return TrendResponse(
+            response = TrendResponse(
                 success=False,
                 error=error_message,
-                message="Agent analysis failed"
+                message="Agent analysis failed",
+                timings_ms=current_breakdown()
             )
+            
+            # Send error log and disconnect WebSocket
+            logger.error("Analysis completed with error", extra={
+                "category": "RESULT",
+                "data": {"error": error_message, "timings_ms": response.timings_ms}
+            })
+            if client_id:
+                # Finish the run's log stream once viewers have the remaining events
+                await manager.finish_run(client_id, result=response.model_dump())
+            
+            return response
         # Handle no program found but agent completed successfully
         else:
-            print("Agent completed successfully but no program found")
+            logger.info("Agent completed successfully but no program found")
             if error_message:
-                print(f"Agent info: {error_message}")
-            
-            # Send no result log and disconnect WebSocket
-            if client_id:
-                await manager.send_log(client_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "level": "INFO",
-                    "category": "RESULT",
-                    "message": "Analysis completed - no program found",
-                    "data": {"result": "no_program_found", "info": error_message}
-                })
-                # Disconnect WebSocket after completion
-                manager.disconnect(client_id)
+                logger.info(f"Agent info: {error_message}")
             
-            return TrendResponse(
+            response = TrendResponse(
                 success=True,
                 program_is_trending=False,
                 program=None,
-                message=error_message or "Agent completed successfully but no program was identified"
+                message=error_message or "Agent completed successfully but no program was identified",
+                timings_ms=current_breakdown()
             )
-        
-        # Insert trend to topic regardless of agent success/failure
-        if request.trend_data:
-            for trend in request.trend_data:
-                try:
-                    # Determine topic and category based on agent result
-                    if selected_program and successfully_completed:
-                        topic = selected_program.get('title', '')
-                        topic_category = selected_program.get('program_type', 'movie')
-                        llm_output = selected_program.get('explanation_of_trend', '')
-                    else:
-                        # Fallback when agent fails or no program found
-                        topic = ', '.join(request.keywords[:3])  # Use first 3 keywords
-                        topic_category = 'unknown'
-                        llm_output = error_message or 'No program identified'
-                    
-                    # Insert trend to topic
-                    insert_success = insert_trend_to_topic(
-                        trend_id=trend.get('id', ''),
-                        topic=topic,
-                        topic_category=topic_category,
-                        llm_output=llm_output,
-                        date=trend.get('trend_started')
-                    )
-                    
-                    if insert_success:
-                        print(f"✅ Successfully inserted trend {trend.get('id', 'unknown')} to topic")
-                    else:
-                        print(f"⚠️ Failed to insert trend {trend.get('id', 'unknown')} to topic")
-                        
-                except Exception as e:
-                    print(f"❌ Error inserting trend to topic for trend {trend.get('id', 'unknown')}: {e}")
+            
+            # Send no result log and disconnect WebSocket
+            logger.info("Analysis completed - no program found", extra={
+                "category": "RESULT",
+                "data": {"result": "no_program_found", "info": error_message, "timings_ms": response.timings_ms}
+            })
+            if client_id:
+                # Finish the run's log stream once viewers have the remaining events
+                await manager.finish_run(client_id, result=response.model_dump())
+            
+            return response
+
     
     except HTTPException:
         raise
     
     except Exception as e:
-        print(f"Unexpected error in analyze_trends: {e}")
-        traceback.print_exc()
+        logger.exception(f"Unexpected error in analyze_trends: {e}")
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
@@ -0,0 +1,180 @@
+"""
+Benchmark harness for the Trend Analysis Portal API
+Drives /api/analyze-trends and the batch paths in-process against mock DB,
+mock merger, mock TMDB and a zero-latency seeded mock agent, then reports p50/p95/p99
+latency and requests per second for each scenario.
+
+Usage:
+    python benchmarks/bench_api.py
+    python benchmarks/bench_api.py --scenario analyze-batch --requests 500 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from typing import List, Dict, Any, Callable, Awaitable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mocks import MockDB, MockMerger, MockTmdb, make_trends, write_trends_csv
+
+KEYWORDS = ["dune", "oppenheimer", "wednesday", "game of thrones", "breaking bad",
+            "error", "timeout", "random", "info", "unknown keywords"]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def serialize_trend(trend: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a mock DB row into the JSON shape the frontend sends as trend_data"""
+    return {k: (v.isoformat() if hasattr(v, "isoformat") else v) for k, v in trend.items()}
+
+
+async def run_scenario(name: str, send: Callable[[int], Awaitable[int]], total: int, concurrency: int) -> Dict[str, Any]:
+    """Issue `total` requests with at most `concurrency` in flight and collect latency stats"""
+    latencies: List[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            status = await send(i)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "failures": failures,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rps": total / elapsed if elapsed else 0.0,
+    }
+
+
+async def main_async(args) -> List[Dict[str, Any]]:
+    import httpx
+    import backend_api
+
+    db = MockDB(make_trends(args.batch_size * 4), query_latency=args.db_latency)
+    merger = MockMerger(latency=args.merger_latency, fail_rate=args.merger_fail_rate,
+                        bulk=not args.merger_no_bulk)
+    backend_api.get_db_connection = db.connect
+    merger.install(backend_api)
+    tmdb = MockTmdb(latency=args.tmdb_latency)
+    tmdb.install(backend_api)
+
+    scratch_dir = tempfile.mkdtemp()
+    csv_path = write_trends_csv(os.path.join(scratch_dir, "trending_US.csv"), args.batch_size)
+    backend_api.download_google_trends_csv = lambda: csv_path
+    # Every request re-reads the same export, so keep it and archive snapshots out of the working tree
+    backend_api.TREND_ARCHIVE_CONFIG.update(keep_csv=True, dir=os.path.join(scratch_dir, "archive"))
+
+    batch = [serialize_trend(t) for t in make_trends(args.batch_size)]
+    # ASGITransport doesn't run startup events, so drive the outbox dispatcher here
+    dispatcher = backend_api.outbox_dispatcher
+    dispatcher.poll_interval, dispatcher.base_backoff = 0.05, 0.01
+    dispatcher.start()
+    transport = httpx.ASGITransport(app=backend_api.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def analyze(i: int) -> int:
+            response = await client.post("/api/analyze-trends", json={"keywords": [KEYWORDS[i % len(KEYWORDS)]]})
+            return response.status_code
+
+        async def analyze_batch(i: int) -> int:
+            payload = {"keywords": [KEYWORDS[i % 5]], "trend_data": batch}
+            response = await client.post("/api/analyze-trends", json=payload)
+            return response.status_code
+
+        async def fetch(i: int) -> int:
+            response = await client.post("/api/fetch-google-trends", json={"top_n": args.batch_size})
+            return response.status_code
+
+        scenarios = {
+            "analyze": analyze,
+            "analyze-batch": analyze_batch,
+            "fetch-google-trends": fetch,
+        }
+        selected = scenarios if args.scenario == "all" else {args.scenario: scenarios[args.scenario]}
+
+        results = []
+        for name, send in selected.items():
+            # Warm up imports, pydantic models and connection setup before measuring
+            await send(0)
+            results.append(await run_scenario(name, send, args.requests, args.concurrency))
+
+    drain_started = time.perf_counter()
+    while time.perf_counter() - drain_started < 30:
+        depth = dispatcher.queue_depth()
+        if not depth["pending"] and not depth["in_flight"]:
+            break
+        await asyncio.sleep(0.05)
+    await dispatcher.stop()
+    print(f"   outbox drained in {time.perf_counter() - drain_started:.2f}s: {dispatcher.metrics()}")
+
+    print(f"   merger calls: ingest={merger.ingest_calls} upsert={merger.upsert_calls} bulk={merger.bulk_calls}, "
+          f"db statements={len(db.executed)}")
+    print(f"   topic cache: {backend_api.topic_cache.metrics()}")
+    print(f"   upsert batches: {backend_api.upsert_batcher.stats}")
+    print(f"   tmdb calls: find={tmdb.find_calls} details={tmdb.details_calls}, "
+          f"enrichment cache: {backend_api.tmdb_enricher.metrics()}")
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Trend Analysis Portal API with mock backends")
+    parser.add_argument("--scenario", default="all", choices=["all", "analyze", "analyze-batch", "fetch-google-trends"])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once")
+    parser.add_argument("--batch-size", type=int, default=20, help="Trends per batch request / CSV export")
+    parser.add_argument("--agent-latency", type=float, default=0.0, help="Seconds per mock agent step")
+    parser.add_argument("--merger-latency", type=float, default=0.0, help="Seconds per mock merger call")
+    parser.add_argument("--merger-fail-rate", type=float, default=0.0, help="Share of mock merger calls that fail")
+    parser.add_argument("--tmdb-latency", type=float, default=0.0, help="Seconds per mock TMDB call")
+    parser.add_argument("--merger-no-bulk", action="store_true", help="Mock merger without a bulk upsert endpoint")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Seconds per mock DB statement")
+    parser.add_argument("--seed", type=int, default=1234, help="Mock agent seed")
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    # The mock agent reads these when each request constructs a TrendAgent
+    os.environ["TREND_AGENT_SEED"] = str(args.seed)
+    os.environ["TREND_AGENT_LATENCY"] = str(args.agent_latency)
+
+    results = asyncio.run(main_async(args))
+
+    print(f"{'scenario':<22}{'reqs':>7}{'fail':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for r in results:
+        print(f"{r['scenario']:<22}{r['requests']:>7}{r['failures']:>6}"
+              f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['rps']:>10.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if any(r["failures"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Program catalog benchmark
+Builds a synthetic catalog, then starts several worker interpreters side by side
+that either parse the programs into a dict (the heap-loaded approach) or mmap
+the catalog file, run the same lookups, and report load time, lookup latency
+and memory. Private MB is memory owned by one worker alone; PSS splits shared
+pages across the processes mapping them, so shared catalog pages count once
+per machine rather than once per worker. Linux only (reads /proc/self/smaps_rollup).
+
+Usage:
+    python benchmarks/bench_catalog.py
+    python benchmarks/bench_catalog.py --programs 500000 --workers 8
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Runs inside each worker interpreter; prints one JSON line once every worker has loaded and looked up
+CHILD = """
+import json, random, sys, time
+mode, source, lookups_path, ready_path = sys.argv[1:5]
+lookups = json.load(open(lookups_path))
+started = time.perf_counter()
+if mode == "dict":
+    from program_catalog import normalize_title
+    by_imdb, by_title = {}, {}
+    for program in json.load(open(source)):
+        by_imdb[program["imdb_id"]] = program
+        by_title.setdefault(normalize_title(program["title"]), []).append(program)
+    find = lambda kind, key: by_imdb.get(key) if kind == "imdb" else by_title.get(normalize_title(key))
+else:
+    from program_catalog import ProgramCatalog
+    catalog = ProgramCatalog(source)
+    find = lambda kind, key: catalog.by_imdb_id(key) if kind == "imdb" else catalog.by_title(key)
+loaded = time.perf_counter()
+for kind, key in lookups:
+    assert find(kind, key), (kind, key)
+done = time.perf_counter()
+# Keep the mapping/heap alive until the parent has every worker running, then measure
+open(ready_path + "." + str(time.time_ns()), "w").close()
+while len(__import__("glob").glob(ready_path + ".*")) < int(sys.argv[5]):
+    time.sleep(0.01)
+memory = {}
+for line in open("/proc/self/smaps_rollup"):
+    name, _, value = line.partition(":")
+    if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+        memory[name] = int(value.split()[0]) / 1024
+print(json.dumps({
+    "load_ms": (loaded - started) * 1000,
+    "lookup_us": (done - loaded) / len(lookups) * 1e6,
+    "rss_mb": memory["Rss"],
+    "pss_mb": memory["Pss"],
+    "private_mb": memory["Private_Clean"] + memory["Private_Dirty"],
+}))
+"""
+
+
+def make_programs(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randrange(3, 9))) for _ in range(5000)]
+    programs = []
+    for i in range(count):
+        title = " ".join(rng.sample(words, rng.randrange(1, 4))).title()
+        programs.append({
+            "title": f"{title} {i}",
+            "program_type": rng.choice(["movie", "show"]),
+            "release_year": rng.randrange(1950, 2025),
+            "descriptions": [" ".join(rng.choices(words, k=25)) for _ in range(2)],
+            "cast": [" ".join(rng.sample(words, 2)).title() for _ in range(6)],
+            "explanation_of_trend": "",
+            "imdb_id": f"tt{1000000 + i}",
+        })
+    return programs
+
+
+def run_workers(mode: str, source: str, lookups_path: str, workers: int) -> List[Dict[str, float]]:
+    ready = os.path.join(tempfile.mkdtemp(), "ready")
+    procs = [subprocess.Popen([sys.executable, "-c", CHILD, mode, source, lookups_path, ready, str(workers)],
+                              cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+             for _ in range(workers)]
+    samples = []
+    for proc in procs:
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"Worker failed:\n{err}")
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare heap-loaded and memory-mapped program catalogs")
+    parser.add_argument("--programs", type=int, default=200000, help="Programs in the synthetic catalog")
+    parser.add_argument("--workers", type=int, default=4, help="Worker interpreters running side by side")
+    parser.add_argument("--lookups", type=int, default=20000, help="Lookups per worker (half imdb, half title)")
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    from program_catalog import build_catalog
+
+    workdir = tempfile.mkdtemp()
+    programs = make_programs(args.programs)
+    json_path = os.path.join(workdir, "programs.json")
+    with open(json_path, "w") as f:
+        json.dump(programs, f)
+    catalog_path = os.path.join(workdir, "programs.tcat")
+    build_catalog(programs, catalog_path)
+
+    rng = random.Random(1)
+    picks = rng.choices(programs, k=args.lookups)
+    lookups = [["imdb", p["imdb_id"]] if i % 2 else ["title", p["title"].lower()] for i, p in enumerate(picks)]
+    lookups_path = os.path.join(workdir, "lookups.json")
+    with open(lookups_path, "w") as f:
+        json.dump(lookups, f)
+
+    print(f"{args.programs} programs: JSON {os.path.getsize(json_path) / 2**20:.1f} MB, "
+          f"catalog {os.path.getsize(catalog_path) / 2**20:.1f} MB; {args.workers} workers")
+    results = []
+    for mode, source in (("dict", json_path), ("mmap", catalog_path)):
+        samples = run_workers(mode, source, lookups_path, args.workers)
+        results.append({
+            "mode": mode,
+            "workers": args.workers,
+            "load_ms": statistics.median(s["load_ms"] for s in samples),
+            "lookup_us": statistics.median(s["lookup_us"] for s in samples),
+            "rss_mb": statistics.median(s["rss_mb"] for s in samples),
+            "pss_mb": statistics.median(s["pss_mb"] for s in samples),
+            "private_mb": statistics.median(s["private_mb"] for s in samples),
+            "total_pss_mb": sum(s["pss_mb"] for s in samples),
+        })
+
+    print(f"{'mode':<6}{'load ms':>10}{'lookup us':>11}{'RSS MB':>9}{'PSS MB':>9}{'private MB':>12}{'total PSS MB':>14}")
+    for r in results:
+        print(f"{r['mode']:<6}{r['load_ms']:>10.1f}{r['lookup_us']:>11.2f}{r['rss_mb']:>9.1f}{r['pss_mb']:>9.1f}"
+              f"{r['private_mb']:>12.1f}{r['total_pss_mb']:>14.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
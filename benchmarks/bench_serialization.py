@@ -0,0 +1,100 @@
+"""
+Serialization benchmark for the fetch-google-trends response
+Compares the pydantic path (validate GoogleTrendsResponse, dump, json.dumps)
+with the trusted-row FastJSONResponse path, and reports payload size raw,
+gzipped and brotli-compressed for growing top_n.
+
+Usage:
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --sizes 10,100,1000,5000 --repeat 20
+"""
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mocks import make_trends
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def time_ms(fn: Callable[[], Any], repeat: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    import backend_api
+    from fast_json import COMPRESSION_CONFIG, FastJSONResponse
+
+    results = []
+    for size in sizes:
+        payload = {"success": True, "trends": make_trends(size), "error": None, "timings_ms": None}
+
+        def pydantic_path():
+            model = backend_api.GoogleTrendsResponse.model_validate(payload)
+            return json.dumps(model.model_dump(mode="json"), ensure_ascii=False,
+                              allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+        def fast_path():
+            return FastJSONResponse(payload).body
+
+        body = fast_path()
+        result = {
+            "top_n": size,
+            "pydantic_ms": time_ms(pydantic_path, repeat),
+            "fast_ms": time_ms(fast_path, repeat),
+            "raw_kb": len(body) / 1024,
+            "gzip_kb": len(gzip.compress(body, COMPRESSION_CONFIG["gzip_level"])) / 1024,
+            "gzip_ms": time_ms(lambda: gzip.compress(body, COMPRESSION_CONFIG["gzip_level"]), repeat),
+            "brotli_kb": None,
+            "brotli_ms": None,
+        }
+        if brotli is not None:
+            quality = COMPRESSION_CONFIG["brotli_quality"]
+            result["brotli_kb"] = len(brotli.compress(body, quality=quality)) / 1024
+            result["brotli_ms"] = time_ms(lambda: brotli.compress(body, quality=quality), repeat)
+        results.append(result)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark fetch-google-trends response serialization and compression")
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="Comma-separated top_n values")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions per measurement")
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = run([int(s) for s in args.sizes.split(",")], args.repeat)
+
+    print(f"{'top_n':>7}{'pydantic ms':>13}{'fast ms':>10}{'raw KB':>10}{'gzip KB':>10}{'gzip ms':>10}"
+          f"{'br KB':>10}{'br ms':>10}")
+    for r in results:
+        brotli_cols = (f"{r['brotli_kb']:>10.1f}{r['brotli_ms']:>10.2f}" if r["brotli_kb"] is not None
+                       else f"{'-':>10}{'-':>10}")
+        print(f"{r['top_n']:>7}{r['pydantic_ms']:>13.2f}{r['fast_ms']:>10.2f}{r['raw_kb']:>10.1f}"
+              f"{r['gzip_kb']:>10.1f}{r['gzip_ms']:>10.2f}{brotli_cols}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Startup benchmark for the Trend Analysis Portal API
+Imports backend_api in fresh interpreters and reports how long the import and
+the startup hooks take and the resulting peak RSS, with and without warm-up.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --warmup agent,pandas,psycopg2,selenium
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside each child interpreter; prints one JSON line with its measurements
+CHILD = """
+import json, resource, time
+started = time.perf_counter()
+import backend_api
+imported = time.perf_counter()
+backend_api.warm_up(backend_api.STARTUP_CONFIG['warmup'])
+warmed = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "warmup_ms": (warmed - imported) * 1000,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def measure(runs: int, warmup: str) -> Dict[str, Any]:
+    env = {**os.environ, "BACKEND_WARMUP": warmup}
+    samples: List[Dict[str, float]] = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Child interpreter failed:\n{proc.stderr}")
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return {
+        "warmup": warmup or "(none)",
+        "runs": runs,
+        "import_ms": statistics.median(s["import_ms"] for s in samples),
+        "warmup_ms": statistics.median(s["warmup_ms"] for s in samples),
+        "rss_mb": statistics.median(s["rss_mb"] for s in samples),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure backend_api cold start time and memory")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per configuration")
+    parser.add_argument("--warmup", default="agent,pandas,psycopg2,selenium",
+                        help="BACKEND_WARMUP groups for the warmed configuration")
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = [measure(args.runs, ""), measure(args.runs, args.warmup)]
+
+    print(f"{'warmup':<36}{'runs':>6}{'import ms':>12}{'warmup ms':>12}{'RSS MB':>10}")
+    for r in results:
+        print(f"{r['warmup']:<36}{r['runs']:>6}{r['import_ms']:>12.1f}{r['warmup_ms']:>12.1f}{r['rss_mb']:>10.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
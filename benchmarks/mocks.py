@@ -0,0 +1,375 @@
+"""
+Mock backends for benchmarking the Trend Analysis Portal API
+In-memory stand-ins for PostgreSQL, the merger service and TMDB so the API can
+be driven end to end without external dependencies
+"""
+
+import asyncio
+import csv
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional
+
+
+def make_trends(count: int, category: str = "Entertainment") -> List[Dict[str, Any]]:
+    """Generate google_trends rows shaped like the RealDictCursor output of get_new_trends"""
+    now = datetime(2024, 3, 1, 12, 0, 0, tzinfo=timezone.utc)
+    seeds = ["dune", "oppenheimer", "wednesday", "game of thrones", "breaking bad", "random"]
+    trends = []
+    for i in range(count):
+        seed = seeds[i % len(seeds)]
+        started = now - timedelta(hours=i)
+        trends.append({
+            "id": i + 1,
+            "trends": f"{seed} {i}",
+            "category": category,
+            "search_volume": 1000 * (count - i),
+            "trend_started": started,
+            "trend_ended": started + timedelta(hours=2) if i % 3 else None,
+            "trend_breakdown": [seed, f"{seed} trailer", f"{seed} cast"],
+            "explore_link": f"https://trends.google.com/explore?q={seed.replace(' ', '+')}",
+        })
+    return trends
+
+
+def write_trends_csv(path: str, count: int) -> str:
+    """Write a CSV in the Google Trends export format and return its path"""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Trends", "Search volume", "Started", "Ended", "Trend breakdown", "Explore link"])
+        for trend in make_trends(count):
+            writer.writerow([
+                trend["trends"],
+                f"{trend['search_volume']}+",
+                trend["trend_started"].strftime("%B %d, %Y at %I:%M:%S %p UTC"),
+                trend["trend_ended"].strftime("%B %d, %Y at %I:%M:%S %p UTC") if trend["trend_ended"] else "",
+                ",".join(trend["trend_breakdown"]),
+                trend["explore_link"],
+            ])
+    return path
+
+
+class MockCursor:
+    """Minimal psycopg2 cursor replacement backed by MockDB"""
+
+    def __init__(self, db: "MockDB"):
+        self.db = db
+        self.results: List[Any] = []
+        self.rowcount = 0
+
+    def execute(self, query: str, params=None):
+        if self.db.query_latency:
+            time.sleep(self.db.query_latency)
+        self.db.executed.append((query, params))
+        self.results = self.db.handle(" ".join(query.split()).lower(), params)
+        self.rowcount = len(self.results)
+
+    def fetchall(self):
+        return list(self.results)
+
+    def fetchone(self):
+        return self.results[0] if self.results else None
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class MockConnection:
+    """Minimal psycopg2 connection replacement backed by MockDB"""
+
+    def __init__(self, db: "MockDB"):
+        self.db = db
+
+    def cursor(self, cursor_factory=None, name=None):
+        return MockCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class MockDB:
+    """In-memory google_trends / trends_to_topics store that answers the API's queries"""
+
+    def __init__(self, trends: Optional[List[Dict[str, Any]]] = None, query_latency: float = 0.0):
+        self.trends: Dict[tuple, Dict[str, Any]] = {}
+        self.processed_ids = set()
+        self.query_latency = query_latency
+        self.executed: List[tuple] = []
+        self.commits = 0
+        self.outbox: Dict[int, Dict[str, Any]] = {}
+        self.history: List[tuple] = []
+        self.watermarks: Dict[tuple, datetime] = {}
+        for trend in trends or []:
+            self.trends[(trend["trends"], trend["category"])] = trend
+
+    def connect(self) -> MockConnection:
+        """Drop-in replacement for backend_api.get_db_connection"""
+        return MockConnection(self)
+
+    def handle(self, query: str, params) -> List[Any]:
+        if ".merger_outbox" in query:
+            return self.handle_outbox(query, params)
+        if ".ingest_watermarks" in query:
+            if query.startswith("insert into"):
+                geo, category, captured_at = params[:3]
+                self.watermarks[(geo, category)] = max(self.watermarks.get((geo, category), captured_at), captured_at)
+                return []
+            watermark = self.watermarks.get(tuple(params or ()))
+            return [{"watermark": watermark}] if watermark else []
+        if ".google_trends_history" in query:
+            if query.startswith("insert into"):
+                captured_at, trend_ids, volumes, ended = params
+                self.history.extend(zip(trend_ids, [captured_at] * len(trend_ids), volumes, ended))
+            return []
+        if query.startswith("insert into") and ".google_trends" in query:
+            trend_name, category = params[0], params[1]
+            existing = self.trends.get((trend_name, category), {"id": len(self.trends) + 1})
+            existing.update({
+                "trends": trend_name,
+                "category": category,
+                "search_volume": params[2],
+                "trend_started": params[3],
+                "trend_ended": params[4],
+                "trend_breakdown": params[5],
+                "explore_link": params[6],
+            })
+            self.trends[(trend_name, category)] = existing
+            return [{"id": existing["id"]}] if "returning" in query else []
+        if query.startswith("insert into") and ".trends_to_topics" in query:
+            self.processed_ids.add(params[0])
+            return []
+        if query.startswith("select") and ".google_trends" in query:
+            pending = [t for t in self.trends.values() if t["id"] not in self.processed_ids]
+            pending.sort(key=lambda t: (t["trend_ended"] or datetime.min.replace(tzinfo=timezone.utc), t["trend_started"]), reverse=True)
+            return pending
+        return []
+
+    def handle_outbox(self, query: str, params) -> List[Any]:
+        now = time.time()
+        if query.startswith("insert into"):
+            key, event_type, payload = params
+            if all(e["idempotency_key"] != key for e in self.outbox.values()):
+                event_id = len(self.outbox) + 1
+                self.outbox[event_id] = {"id": event_id, "idempotency_key": key, "event_type": event_type,
+                                         "payload": json.loads(payload), "status": "pending",
+                                         "attempts": 0, "next_attempt_at": now, "created_at": now}
+            return []
+        if query.startswith("update") and "returning" in query:
+            _, limit = params
+            claimed = [e for e in self.outbox.values()
+                       if e["status"] == "pending" and e["next_attempt_at"] <= now][:limit]
+            for e in claimed:
+                e["status"] = "in_flight"
+                e["attempts"] += 1
+            return [(e["id"], e["idempotency_key"], e["event_type"], e["payload"], e["attempts"]) for e in claimed]
+        if query.startswith("update") and "status = 'done'" in query:
+            for event_id in params[0]:
+                self.outbox[event_id]["status"] = "done"
+            return []
+        if query.startswith("update"):
+            status, _, backoff, event_id = params
+            self.outbox[event_id].update(status=status, next_attempt_at=now + backoff)
+            return []
+        if query.startswith("select"):
+            groups: Dict[str, List[float]] = {}
+            for e in self.outbox.values():
+                if e["status"] != "done":
+                    groups.setdefault(e["status"], []).append(e["created_at"])
+            return [(status, len(created), now - min(created)) for status, created in groups.items()]
+        return []
+
+
+class MockMerger:
+    """Stand-in for the merger ingest_topic / upsert_trend endpoints
+
+    Usable in-process as an httpx transport (install) or over HTTP (create_merger_app).
+    fail_rate makes a share of calls return 503 so outbox retries can be exercised.
+    """
+
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0, bulk: bool = True, seed: int = 0):
+        self.latency = latency
+        self.bulk = bulk
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.topic_ids: Dict[tuple, int] = {}
+        self.seen_keys = set()
+        self.ingest_calls = 0
+        self.upsert_calls = 0
+        self.bulk_calls = 0
+        self.failed_calls = 0
+        self.replayed_calls = 0
+
+    async def respond(self, path: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None):
+        """Return (status_code, body) for one merger call"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_rate and self.rng.random() < self.fail_rate:
+            self.failed_calls += 1
+            return 503, {"detail": "merger unavailable"}
+        if idempotency_key:
+            if idempotency_key in self.seen_keys:
+                self.replayed_calls += 1
+            self.seen_keys.add(idempotency_key)
+        if path.endswith("/ingest_topic"):
+            self.ingest_calls += 1
+            key = (payload.get("name"), payload.get("topic_type"))
+            if key not in self.topic_ids:
+                self.topic_ids[key] = len(self.topic_ids) + 1
+            return 200, {"topic_id": self.topic_ids[key]}
+        if path.endswith("/bulk_upsert_trends"):
+            if not self.bulk:
+                return 404, {"detail": "Not Found"}
+            self.bulk_calls += 1
+            self.upsert_calls += len(payload.get("items", []))
+            return 200, {"results": [{"success": True} for _ in payload.get("items", [])]}
+        if path.endswith("/upsert_trend"):
+            self.upsert_calls += 1
+            return 200, {"success": True}
+        return 404, {"detail": "Not Found"}
+
+    async def handle(self, request):
+        import httpx
+
+        status, body = await self.respond(request.url.path, json.loads(request.content or b"{}"),
+                                          request.headers.get("Idempotency-Key"))
+        return httpx.Response(status, json=body)
+
+    def install(self, backend_api):
+        """Point the backend's pooled merger client at this stand-in"""
+        import httpx
+        from merger_client import MergerClient, UpsertBatcher
+
+        backend_api.merger_client = MergerClient(base_url="http://merger", transport=httpx.MockTransport(self.handle))
+        backend_api.upsert_batcher = UpsertBatcher(backend_api.merger_client)
+
+
+class MockTmdb:
+    """Stand-in for the TMDB find and movie/tv details endpoints used for enrichment
+
+    Every tt id resolves to a movie (or a tv show when listed in tv_ids) except those in missing_ids.
+    """
+
+    def __init__(self, latency: float = 0.0, tv_ids=(), missing_ids=()):
+        self.latency = latency
+        self.tv_ids = set(tv_ids)
+        self.missing_ids = set(missing_ids)
+        self.find_calls = 0
+        self.details_calls = 0
+
+    async def respond(self, path: str) -> tuple:
+        """Return (status_code, body) for one TMDB call; path is relative to the /3 API root"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "find":
+            self.find_calls += 1
+            imdb_id = parts[1]
+            results = {"movie_results": [], "tv_results": []}
+            if imdb_id.startswith("tt") and imdb_id not in self.missing_ids:
+                media = "tv" if imdb_id in self.tv_ids else "movie"
+                results[f"{media}_results"].append({"id": int(imdb_id[2:])})
+            return 200, results
+        if len(parts) == 2 and parts[0] in ("movie", "tv") and parts[1].isdigit():
+            self.details_calls += 1
+            name_field, date_field = ("title", "release_date") if parts[0] == "movie" else ("name", "first_air_date")
+            return 200, {
+                "id": int(parts[1]),
+                name_field: f"Program {parts[1]}",
+                date_field: "2024-03-01",
+                "overview": f"Overview of program {parts[1]}",
+                "poster_path": f"/poster-{parts[1]}.jpg",
+                "backdrop_path": f"/backdrop-{parts[1]}.jpg",
+                "vote_average": 7.5,
+                "vote_count": 1000,
+                "runtime": 120,
+                "genres": [{"id": 18, "name": "Drama"}],
+                "production_companies": [{"name": "Mock Studios", "logo_path": None}],
+                "credits": {"cast": [{"name": f"Actor {i}", "character": f"Role {i}", "profile_path": None}
+                                     for i in range(12)],
+                            "crew": [{"name": "Director", "job": "Director"}]},
+            }
+        return 404, {"status_message": "The resource you requested could not be found."}
+
+    async def handle(self, request):
+        import httpx
+
+        status, body = await self.respond(request.url.path.split("/3", 1)[-1])
+        return httpx.Response(status, json=body)
+
+    def install(self, backend_api):
+        """Point the backend's TMDB enricher at this stand-in (in-memory cache only)"""
+        import httpx
+        from tmdb_enrichment import TmdbEnricher
+
+        backend_api.tmdb_enricher = TmdbEnricher(api_key="mock", base_url="http://tmdb/3",
+                                                 transport=httpx.MockTransport(self.handle))
+
+
+def create_merger_app(merger: MockMerger, tmdb: Optional[MockTmdb] = None):
+    """FastAPI app serving a MockMerger over HTTP, for pointing MERGER_BASE_URL at a local stand-in
+
+    With tmdb, the same app also serves TMDB under /3 (point TMDB_BASE_URL at http://host:port/3).
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI(title="Mock Merger")
+
+    @app.post("/merger/{action}")
+    async def merger_call(action: str, request: Request):
+        status, body = await merger.respond(request.url.path, await request.json(),
+                                            request.headers.get("Idempotency-Key"))
+        return JSONResponse(body, status_code=status)
+
+    @app.get("/merger/stats")
+    async def merger_stats():
+        return {"ingest_calls": merger.ingest_calls, "upsert_calls": merger.upsert_calls, "bulk_calls": merger.bulk_calls,
+                "failed_calls": merger.failed_calls, "replayed_calls": merger.replayed_calls}
+
+    if tmdb is not None:
+        @app.get("/3/{path:path}")
+        async def tmdb_call(path: str):
+            status, body = await tmdb.respond(path)
+            return JSONResponse(body, status_code=status)
+
+        @app.get("/tmdb/stats")
+        async def tmdb_stats():
+            return {"find_calls": tmdb.find_calls, "details_calls": tmdb.details_calls}
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a local stand-in merger service")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per call")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of calls answered with 503")
+    parser.add_argument("--no-bulk", action="store_true", help="Answer bulk_upsert_trends with 404")
+    parser.add_argument("--tmdb", action="store_true", help="Also serve a TMDB stand-in under /3")
+    args = parser.parse_args()
+    merger = MockMerger(args.latency, args.fail_rate, bulk=not args.no_bulk)
+    tmdb = MockTmdb(args.latency) if args.tmdb else None
+    uvicorn.run(create_merger_app(merger, tmdb), host="127.0.0.1", port=args.port)
@@ -0,0 +1,298 @@
+"""
+Cross-worker event bus for log streams and job results
+Lets a WebSocket connected to one uvicorn/gunicorn worker receive the logs of
+an analysis running on another. Backends:
+    local    - single process, nothing leaves the worker (default)
+    postgres - LISTEN/NOTIFY on a shared channel
+    unix     - Unix datagram sockets, one per worker, in a shared directory
+"""
+
+import asyncio
+import errno
+import glob
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from app_logging import get_logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = get_logger("event_bus")
+
+# Event bus configuration
+EVENT_BUS_CONFIG = {
+    "backend": os.getenv("EVENT_BUS", "local"),
+    "channel": os.getenv("EVENT_BUS_CHANNEL", "trend_portal_events"),
+    "socket_dir": os.getenv("EVENT_BUS_SOCKET_DIR", "/tmp/trend-portal-bus"),
+    "queue_size": int(os.getenv("EVENT_BUS_QUEUE_SIZE", "10000")),
+    # How often the unix bus rescans socket_dir for peers
+    "peer_refresh_interval": float(os.getenv("EVENT_BUS_PEER_REFRESH", "5")),
+    # Delay before re-LISTENing after the postgres listener connection drops (doubles up to 30s)
+    "reconnect_delay": float(os.getenv("EVENT_BUS_RECONNECT_DELAY", "1")),
+    # At most one send-failure warning per interval; these warnings are log events themselves
+    "warn_interval": 60.0,
+}
+
+# NOTIFY payloads must stay under 8000 bytes
+PG_NOTIFY_MAX_BYTES = 7900
+
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+Handler = Callable[[Dict[str, Any]], None]
+
+
+def encode(message: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(message, default=str)
+    return json.dumps(message, default=str).encode("utf-8")
+
+
+def decode(raw: bytes) -> Dict[str, Any]:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+class EventBus:
+    """Base bus: publish() fans a message out to the other workers, start() registers the receiver
+
+    Messages are dicts; the bus stamps them with this worker's id and never hands
+    a worker its own messages back.
+    """
+
+    def __init__(self, worker_id: str = None):
+        self.worker_id = worker_id or WORKER_ID
+        self.handler: Optional[Handler] = None
+        self.stats = {"published": 0, "received": 0, "errors": 0}
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def stop(self):
+        pass
+
+    def publish(self, message: Dict[str, Any]):
+        """Send without waiting; delivery to other workers is best effort"""
+        pass
+
+    def _receive(self, raw: bytes):
+        try:
+            message = decode(raw)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ Dropping undecodable bus message: {e}")
+            return
+        if message.get("origin") == self.worker_id or self.handler is None:
+            return
+        self.stats["received"] += 1
+        self.handler(message)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "worker_id": self.worker_id, **self.stats}
+
+
+class LocalEventBus(EventBus):
+    """Single-process bus; every subscriber already lives in this worker"""
+
+
+class PostgresEventBus(EventBus):
+    """LISTEN/NOTIFY bus; one listening connection driven by the event loop, NOTIFYs sent from a queue"""
+
+    def __init__(self, connect: Callable[[], Any], channel: str = None, queue_size: int = None, worker_id: str = None):
+        super().__init__(worker_id)
+        self.connect = connect
+        self.channel = channel or EVENT_BUS_CONFIG["channel"]
+        self._outbound: asyncio.Queue = asyncio.Queue(maxsize=queue_size or EVENT_BUS_CONFIG["queue_size"])
+        self._listen_conn = None
+        self._listen_fd = -1
+        self._sender: Optional[asyncio.Task] = None
+        self._reconnect: Optional[asyncio.Task] = None
+        self.stats["reconnects"] = 0
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        await self._listen()
+        self._sender = asyncio.create_task(self._send_loop())
+
+    async def _listen(self):
+        conn = await asyncio.to_thread(self.connect)
+        if not conn:
+            raise RuntimeError("Event bus could not connect to PostgreSQL")
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+        self._listen_conn = conn
+        # Kept because fileno() raises once psycopg2 has closed a dropped connection
+        self._listen_fd = conn.fileno()
+        asyncio.get_running_loop().add_reader(self._listen_fd, self._on_readable)
+
+    def _close_listener(self):
+        conn, self._listen_conn = self._listen_conn, None
+        if conn is not None:
+            asyncio.get_running_loop().remove_reader(self._listen_fd)
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    async def stop(self):
+        for task in (self._reconnect, self._sender):
+            if task is not None:
+                task.cancel()
+        self._reconnect = self._sender = None
+        self._close_listener()
+
+    def _on_readable(self):
+        try:
+            self._listen_conn.poll()
+        except Exception as e:
+            # A dropped connection stays readable; stop watching it and LISTEN again on a new one
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ Event bus listener connection lost, reconnecting: {e}")
+            self._close_listener()
+            if self._reconnect is None or self._reconnect.done():
+                self._reconnect = asyncio.create_task(self._reconnect_loop())
+            return
+        while self._listen_conn.notifies:
+            notify = self._listen_conn.notifies.pop(0)
+            self._receive(notify.payload.encode("utf-8"))
+
+    async def _reconnect_loop(self):
+        delay = EVENT_BUS_CONFIG["reconnect_delay"]
+        while self._listen_conn is None:
+            await asyncio.sleep(delay)
+            try:
+                await self._listen()
+                self.stats["reconnects"] += 1
+                logger.info("🔌 Event bus listener reconnected")
+            except Exception as e:
+                logger.warning(f"⚠️ Event bus reconnect failed, retrying in {delay:.0f}s: {e}")
+                delay = min(delay * 2, 30.0)
+
+    def publish(self, message: Dict[str, Any]):
+        payload = encode({**message, "origin": self.worker_id})
+        if len(payload) > PG_NOTIFY_MAX_BYTES and isinstance(message.get("event"), dict):
+            # Keep the log line itself; drop the bulky data payload
+            event = {**message["event"], "data": {"truncated": True}}
+            payload = encode({**message, "event": event, "origin": self.worker_id})
+        if len(payload) > PG_NOTIFY_MAX_BYTES:
+            self.stats["errors"] += 1
+            return
+        try:
+            self._outbound.put_nowait(payload.decode("utf-8"))
+            self.stats["published"] += 1
+        except asyncio.QueueFull:
+            self.stats["errors"] += 1
+
+    async def _send_loop(self):
+        conn = None
+        while True:
+            payload = await self._outbound.get()
+            try:
+                if conn is None or conn.closed:
+                    conn = await asyncio.to_thread(self.connect)
+                    conn.autocommit = True
+                await asyncio.to_thread(self._notify, conn, payload)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"⚠️ Event bus NOTIFY failed: {e}")
+                if conn is not None:
+                    conn.close()
+                conn = None
+
+    def _notify(self, conn, payload: str):
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+
+
+class _DatagramReceiver(asyncio.DatagramProtocol):
+    def __init__(self, bus: "UnixSocketEventBus"):
+        self.bus = bus
+
+    def datagram_received(self, data: bytes, addr):
+        self.bus._receive(data)
+
+
+class UnixSocketEventBus(EventBus):
+    """Same-host bus: each worker binds a datagram socket in socket_dir and sends to every peer socket there"""
+
+    def __init__(self, socket_dir: str = None, worker_id: str = None):
+        super().__init__(worker_id)
+        self.socket_dir = socket_dir or EVENT_BUS_CONFIG["socket_dir"]
+        self.path = os.path.join(self.socket_dir, f"{self.worker_id}.sock")
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._send_sock: Optional[socket.socket] = None
+        self._peers: list = []
+        self._peers_at = float("-inf")
+        self._warned_at = float("-inf")
+        self.stats["dropped"] = 0
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        os.makedirs(self.socket_dir, exist_ok=True)
+        self._transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: _DatagramReceiver(self), local_addr=self.path, family=socket.AF_UNIX
+        )
+        self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._send_sock.setblocking(False)
+
+    async def stop(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        if self._send_sock is not None:
+            self._send_sock.close()
+            self._send_sock = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def peers(self) -> list:
+        """Other workers' sockets, rescanned every peer_refresh_interval seconds rather than per message"""
+        now = time.monotonic()
+        if now - self._peers_at >= EVENT_BUS_CONFIG["peer_refresh_interval"]:
+            self._peers = [peer for peer in glob.glob(os.path.join(self.socket_dir, "*.sock")) if peer != self.path]
+            self._peers_at = now
+        return self._peers
+
+    def publish(self, message: Dict[str, Any]):
+        if self._send_sock is None:
+            return
+        payload = encode({**message, "origin": self.worker_id})
+        for peer in self.peers():
+            try:
+                self._send_sock.sendto(payload, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker gone: forget it now, and unlink its socket file if it exited without cleaning up
+                self._peers = [p for p in self._peers if p != peer]
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            except OSError as e:
+                # A peer whose receive buffer is full; logging here would only add more events
+                if isinstance(e, BlockingIOError) or e.errno in (errno.EAGAIN, errno.ENOBUFS):
+                    self.stats["dropped"] += 1
+                    continue
+                self.stats["errors"] += 1
+                now = time.monotonic()
+                if now - self._warned_at >= EVENT_BUS_CONFIG["warn_interval"]:
+                    self._warned_at = now
+                    logger.warning(f"⚠️ Event bus send to {peer} failed: {e} ({self.stats['errors']} errors so far)")
+        self.stats["published"] += 1
+
+
+def create_event_bus(backend: str = None, connect: Callable[[], Any] = None) -> EventBus:
+    """Build the bus selected by EVENT_BUS (local, postgres or unix)"""
+    backend = backend or EVENT_BUS_CONFIG["backend"]
+    if backend == "postgres":
+        return PostgresEventBus(connect)
+    if backend == "unix":
+        return UnixSocketEventBus()
+    if backend != "local":
+        raise ValueError(f"Unknown event bus backend: {backend}")
+    return LocalEventBus()
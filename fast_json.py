@@ -0,0 +1,71 @@
+"""
+Fast JSON responses and response compression
+FastJSONResponse encodes with orjson when it is installed (datetimes, lists and
+Decimals from psycopg2 rows included), so endpoints returning trusted DB rows can
+skip pydantic re-validation. add_compression() negotiates brotli (when
+brotli-asgi is installed) or gzip for responses above a size threshold.
+"""
+
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# Response compression configuration
+COMPRESSION_CONFIG = {
+    "enabled": os.getenv("RESPONSE_COMPRESSION", "1") not in ("0", "false", "False"),
+    "minimum_size": int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    "gzip_level": int(os.getenv("GZIP_LEVEL", "6")),
+    "brotli_quality": int(os.getenv("BROTLI_QUALITY", "4")),
+}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+
+def dumps_bytes(content: Any) -> bytes:
+    """Compact UTF-8 JSON; orjson when available, stdlib json otherwise"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps_bytes; content is sent as-is without model validation"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+
+def add_compression(app):
+    """Compress responses larger than COMPRESSION_MIN_SIZE, preferring brotli when the client accepts it"""
+    if not COMPRESSION_CONFIG["enabled"]:
+        return
+    if BrotliMiddleware is not None:
+        # Falls back to gzip for clients without brotli support
+        app.add_middleware(BrotliMiddleware, quality=COMPRESSION_CONFIG["brotli_quality"],
+                           minimum_size=COMPRESSION_CONFIG["minimum_size"], gzip_fallback=True)
+    else:
+        app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_CONFIG["minimum_size"],
+                           compresslevel=COMPRESSION_CONFIG["gzip_level"])
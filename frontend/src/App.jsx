@@ -91,7 +91,9 @@ function App() {
 
     for (let i = 0; i < keywordLines.length; i++) {
       const line = keywordLines[i];
-      await processSingleTrend(line, i, newTrendResults, newStatus, setTrendResults, setProcessingStatus, trendData);
+      // Clustered Google Trends pass one array of member trends per line
+      const lineTrendData = Array.isArray(trendData) && Array.isArray(trendData[i]) ? trendData[i] : trendData;
+      await processSingleTrend(line, i, newTrendResults, newStatus, setTrendResults, setProcessingStatus, lineTrendData);
     }
 
     setIsLoading(false);
@@ -115,15 +117,17 @@ function App() {
         const ws = new WebSocket(`ws://localhost:8000/ws/logs/${clientId}`);
         ws.onmessage = (event) => {
           try {
-            const log = JSON.parse(event.data);
+            // Log frames arrive as arrays of events
+            const payload = JSON.parse(event.data);
+            const batch = Array.isArray(payload) ? payload : [payload];
             setLogsByClientId(prev => {
               const current = prev[clientId] || [];
-              return { ...prev, [clientId]: [...current, log] };
+              return { ...prev, [clientId]: [...current, ...batch] };
             });
             // Also keep logs on trend item for easy access
             const updated = [...newTrendResults];
             const trend = { ...(updated[index] || {}) };
-            trend.logs = [...(trend.logs || []), log];
+            trend.logs = [...(trend.logs || []), ...batch];
             updated[index] = trend;
             setTrendResults(updated);
           } catch (e) {
@@ -190,7 +194,10 @@ function App() {
         
         let tmdbData;
         
-        if (movie.program_type === 'movie') {
+        if (movie.details) {
+          // Enriched by the backend along with the analysis result
+          tmdbData = movie.details;
+        } else if (movie.program_type === 'movie') {
           console.log('Fetching movie data...');
           tmdbData = await tmdbAPI.getMovieByImdbId(movie.imdb_id);
         } else {
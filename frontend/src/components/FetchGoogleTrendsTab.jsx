@@ -48,17 +48,24 @@ const FetchGoogleTrendsTab = ({
       const data = await response.json();
 
       if (data.success && data.trends) {
-        // Store full trend data objects
-        setTrendData(data.trends);
-        
         // Extract trend breakdown for display
-        const trendsText = data.trends.map(trend => {
+        const trendLine = (trend) => {
           const breakdown = trend.trend_breakdown || [];
           const breakdownText = Array.isArray(breakdown) ? breakdown.join(', ') : breakdown;
           return breakdownText || trend.trends || 'Unknown trend';
-        }).join('\n');
+        };
         
-        setGoogleTrends(trendsText);
+        if (data.clusters && data.clusters.length) {
+          // One line (and one agent run) per cluster of near-duplicate trends,
+          // with the cluster's member trends as that line's trend data
+          const trendsById = new Map(data.trends.map(trend => [trend.id, trend]));
+          setTrendData(data.clusters.map(cluster => cluster.trend_ids.map(id => trendsById.get(id)).filter(Boolean)));
+          setGoogleTrends(data.clusters.map(cluster => cluster.keywords.join(', ')).join('\n'));
+        } else {
+          // Store full trend data objects
+          setTrendData(data.trends);
+          setGoogleTrends(data.trends.map(trendLine).join('\n'));
+        }
       } else {
         setFetchError(data.error || 'Failed to fetch Google Trends');
       }
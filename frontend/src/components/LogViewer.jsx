@@ -11,16 +11,21 @@ const LogViewer = ({ isOpen, onClose, clientId, initialLogs = [] }) => {
   const [isAutoScroll, setIsAutoScroll] = useState(true);
   const wsRef = useRef(null);
   const logsEndRef = useRef(null);
+  // Highest log sequence number seen, so reconnects resume instead of replaying everything
+  const lastSeqRef = useRef(0);
+  const reconnectTimerRef = useRef(null);
 
   const levels = ['ALL', 'INFO', 'WARN', 'ERROR', 'DEBUG'];
-  const categories = ['ALL', 'AGENT', 'ANALYSIS', 'SEARCH', 'ANALYZE', 'VALIDATE', 'MATCH', 'RESULT', 'ERROR'];
+  const categories = ['ALL', 'AGENT', 'ANALYSIS', 'SEARCH', 'ANALYZE', 'VALIDATE', 'MATCH', 'RESULT', 'ERROR', 'LOGS'];
 
   useEffect(() => {
     // Seed with any existing logs for this trend
     if (Array.isArray(initialLogs) && initialLogs.length > 0) {
       setLogs(initialLogs);
+      lastSeqRef.current = initialLogs.reduce((max, log) => Math.max(max, log.seq || 0), 0);
     } else {
       setLogs([]);
+      lastSeqRef.current = 0;
     }
 
     if (isOpen && clientId) {
@@ -41,8 +46,10 @@ const LogViewer = ({ isOpen, onClose, clientId, initialLogs = [] }) => {
   }, [filteredLogs, isAutoScroll]);
 
   const connectWebSocket = () => {
-    console.log(`Attempting to connect to WebSocket: ws://localhost:8000/ws/logs/${clientId}`);
-    const ws = new WebSocket(`ws://localhost:8000/ws/logs/${clientId}`);
+    const since = lastSeqRef.current ? `?since=${lastSeqRef.current}` : '';
+    const url = `ws://localhost:8000/ws/logs/${clientId}${since}`;
+    console.log(`Attempting to connect to WebSocket: ${url}`);
+    const ws = new WebSocket(url);
     wsRef.current = ws;
 
     ws.onopen = () => {
@@ -51,13 +58,26 @@ const LogViewer = ({ isOpen, onClose, clientId, initialLogs = [] }) => {
     };
 
     ws.onmessage = (event) => {
-      const logData = JSON.parse(event.data);
-      setLogs(prevLogs => [...prevLogs, logData]);
+      // The backend coalesces log events into array frames; accept single events too
+      const payload = JSON.parse(event.data);
+      const batch = Array.isArray(payload) ? payload : [payload];
+      // Skip events already seen before a reconnect
+      const fresh = batch.filter(log => log.seq === undefined || log.seq > lastSeqRef.current);
+      fresh.forEach(log => {
+        if (log.seq) lastSeqRef.current = Math.max(lastSeqRef.current, log.seq);
+      });
+      if (fresh.length > 0) {
+        setLogs(prevLogs => [...prevLogs, ...fresh]);
+      }
     };
 
     ws.onclose = (event) => {
       console.log('WebSocket disconnected:', event.code, event.reason);
       setIsConnected(false);
+      // Resume from the last sequence number if the connection dropped unexpectedly
+      if (wsRef.current === ws && event.code !== 1000) {
+        reconnectTimerRef.current = setTimeout(connectWebSocket, 1000);
+      }
     };
 
     ws.onerror = (error) => {
@@ -67,9 +87,11 @@ const LogViewer = ({ isOpen, onClose, clientId, initialLogs = [] }) => {
   };
 
   const disconnectWebSocket = () => {
+    clearTimeout(reconnectTimerRef.current);
     if (wsRef.current) {
-      wsRef.current.close();
+      const ws = wsRef.current;
       wsRef.current = null;
+      ws.close(1000);
       setIsConnected(false);
     }
   };
@@ -3,12 +3,16 @@ import { Film, Tv, Calendar, Users, TrendingUp, TrendingDown, Loader2 } from 'lu
 import { tmdbAPI } from '../services/api';
 
 const ProgramCard = ({ program, onClick, isTrending = true }) => {
-  const [posterPath, setPosterPath] = useState(null);
+  const [posterPath, setPosterPath] = useState(program.poster_path || null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     const fetchPoster = async () => {
-      if (program.imdb_id) {
+      // Use the details the backend fetched from TMDB; fall back to the browser lookup without them
+      if (program.details) {
+        setPosterPath(program.poster_path || null);
+        setLoading(false);
+      } else if (program.imdb_id) {
         try {
           setLoading(true);
           const tmdbData = program.program_type === 'movie' 
@@ -29,7 +33,7 @@ const ProgramCard = ({ program, onClick, isTrending = true }) => {
     };
 
     fetchPoster();
-  }, [program.imdb_id, program.program_type]);
+  }, [program.imdb_id, program.program_type, program.details, program.poster_path]);
 
   return (
     <div className={`program-card ${isTrending ? 'trending' : 'not-trending'}`} onClick={() => onClick(program)}>
@@ -0,0 +1,367 @@
+"""
+WebSocket log streaming for live agent logs
+Every run keeps a bounded ring of sequence-numbered events that any number of
+viewers can subscribe to and resume from. Each viewer gets a bounded queue
+drained by its own sender task, so a slow or stalled browser never blocks the
+agent producing the logs. Events are coalesced into JSON array frames, flushed
+on a short interval or as soon as a batch fills up, and an overflow policy
+decides what to drop when a viewer falls behind.
+"""
+
+import asyncio
+import json
+import os
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from fastapi import WebSocket
+
+from app_logging import get_logger
+from metrics import stage
+
+logger = get_logger("log_stream")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Log streaming configuration
+LOG_STREAM_CONFIG = {
+    "flush_interval": float(os.getenv("LOG_FLUSH_INTERVAL", "0.05")),
+    "max_batch": int(os.getenv("LOG_MAX_BATCH", "100")),
+    "queue_size": int(os.getenv("LOG_QUEUE_SIZE", "1000")),
+    # drop_oldest | drop_debug | summarize
+    "overflow_policy": os.getenv("LOG_OVERFLOW_POLICY", "drop_oldest"),
+    "send_timeout": float(os.getenv("LOG_SEND_TIMEOUT", "5")),
+    "linger_timeout": float(os.getenv("LOG_LINGER_TIMEOUT", "10")),
+    "ring_size": int(os.getenv("LOG_RING_SIZE", "500")),
+    "max_runs": int(os.getenv("LOG_MAX_RUNS", "200")),
+}
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_debug", "summarize")
+
+
+def dumps(obj: Any) -> str:
+    """Serialize to a JSON string, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode("utf-8")
+    return json.dumps(obj, default=str)
+
+
+class ClientLogQueue:
+    """Bounded log queue for one WebSocket plus the task that drains it"""
+
+    def __init__(self, client_id: str, websocket: WebSocket, maxsize: int, policy: str,
+                 max_batch: int, flush_interval: float, send_timeout: float):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown log overflow policy: {policy}")
+        self.client_id = client_id
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.send_timeout = send_timeout
+
+        self.events: Deque[dict] = deque()
+        self.dropped = 0
+        self.frames = 0
+        self.closing = False
+        self.failed = False
+        self._unreported: Counter = Counter()
+        self._ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def put(self, event: dict):
+        """Enqueue without ever waiting on the consumer; applies the overflow policy when full"""
+        if len(self.events) >= self.maxsize:
+            if self.policy == "summarize":
+                self._drop(event)
+                return
+            if self.policy == "drop_debug":
+                if event.get("level") == "DEBUG":
+                    self._drop(event)
+                    return
+                debug_event = next((e for e in self.events if e.get("level") == "DEBUG"), None)
+                if debug_event is not None:
+                    self.events.remove(debug_event)
+                    self._drop(debug_event)
+                else:
+                    self._drop(self.events.popleft())
+            else:
+                self._drop(self.events.popleft())
+        self.events.append(event)
+        self._ready.set()
+
+    def _drop(self, event: dict):
+        self.dropped += 1
+        self._unreported[event.get("level", "INFO")] += 1
+
+    def _summary_event(self) -> Optional[dict]:
+        """Single WARN event describing everything dropped since the last frame"""
+        if not self._unreported:
+            return None
+        total = sum(self._unreported.values())
+        summary = {
+            "timestamp": datetime.now().isoformat(),
+            "level": "WARN",
+            "category": "LOGS",
+            "message": f"{total} log events dropped because the viewer fell behind",
+            "data": {"dropped_by_level": dict(self._unreported)},
+        }
+        self._unreported.clear()
+        return summary
+
+    def _next_batch(self) -> List[dict]:
+        batch = []
+        summary = self._summary_event()
+        if summary:
+            batch.append(summary)
+        while self.events and len(batch) < self.max_batch:
+            batch.append(self.events.popleft())
+        return batch
+
+    async def run(self):
+        """Sender loop: coalesce queued events into frames until closed and drained"""
+        try:
+            while True:
+                if not self.events and not self._unreported:
+                    if self.closing:
+                        return
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+
+                # Give a burst a moment to accumulate unless a full batch is already waiting
+                if len(self.events) < self.max_batch and not self.closing:
+                    await asyncio.sleep(self.flush_interval)
+
+                batch = self._next_batch()
+                if batch:
+                    with stage("ws_send"):
+                        await asyncio.wait_for(self.websocket.send_text(dumps(batch)), timeout=self.send_timeout)
+                    self.frames += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Dropping log stream for client {self.client_id}: {e!r}")
+            self.failed = True
+
+    def close(self):
+        """Stop accepting events; the sender exits once the queue is drained"""
+        self.closing = True
+        self._ready.set()
+
+
+class RunLog:
+    """Bounded ring of one run's log events plus the viewers subscribed to it"""
+
+    def __init__(self, run_id: str, ring_size: int):
+        self.run_id = run_id
+        self.ring: Deque[dict] = deque(maxlen=ring_size)
+        self.next_seq = 1
+        self.subscribers: Set[ClientLogQueue] = set()
+        self.finished = False
+
+    def append(self, event: dict) -> dict:
+        """Stamp the event with the run's next sequence number and keep it in the ring"""
+        event = {**event, "seq": self.next_seq}
+        self.next_seq += 1
+        self.ring.append(event)
+        return event
+
+    def ingest(self, event: dict) -> dict:
+        """Keep an event that was already stamped by the worker running this run"""
+        self.next_seq = max(self.next_seq, event.get("seq", 0) + 1)
+        self.ring.append(event)
+        return event
+
+    def restart(self):
+        """Reuse the run id for a new run: drop the old events, keep numbering so resuming viewers see no gap"""
+        self.ring.clear()
+        self.finished = False
+
+    def since(self, seq: Optional[int]) -> List[dict]:
+        """Events still in the ring with a sequence number greater than seq (all of them if None)"""
+        if seq is None:
+            return list(self.ring)
+        return [e for e in self.ring if e["seq"] > seq]
+
+
+class ConnectionManager:
+    """Per-run log streams: ring-buffered replay and fan-out to any number of viewers
+
+    Runs are keyed by the client_id the analysis was started with. Events logged
+    before a viewer connects, or while it reconnects, stay in the run's ring so
+    the viewer can resume from the last sequence number it saw.
+    """
+
+    def __init__(self, flush_interval: float = None, max_batch: int = None, queue_size: int = None,
+                 overflow_policy: str = None, send_timeout: float = None, linger_timeout: float = None,
+                 ring_size: int = None, max_runs: int = None):
+        self.flush_interval = flush_interval if flush_interval is not None else LOG_STREAM_CONFIG["flush_interval"]
+        self.max_batch = max_batch or LOG_STREAM_CONFIG["max_batch"]
+        self.queue_size = queue_size or LOG_STREAM_CONFIG["queue_size"]
+        self.overflow_policy = overflow_policy or LOG_STREAM_CONFIG["overflow_policy"]
+        self.send_timeout = send_timeout or LOG_STREAM_CONFIG["send_timeout"]
+        self.linger_timeout = linger_timeout or LOG_STREAM_CONFIG["linger_timeout"]
+        self.ring_size = ring_size or LOG_STREAM_CONFIG["ring_size"]
+        self.max_runs = max_runs or LOG_STREAM_CONFIG["max_runs"]
+        self.runs: "OrderedDict[str, RunLog]" = OrderedDict()
+        self.stats = {"events": 0, "frames": 0, "dropped": 0, "evicted_runs": 0}
+        # Cross-worker bus (see event_bus.py); None keeps everything in this process
+        self.bus = None
+
+    @property
+    def active_connections(self) -> Dict[str, List[WebSocket]]:
+        """Connected viewer sockets by run id"""
+        return {run_id: [q.websocket for q in run.subscribers] for run_id, run in self.runs.items() if run.subscribers}
+
+    def _run(self, run_id: str) -> RunLog:
+        run = self.runs.get(run_id)
+        if run is None:
+            run = self.runs[run_id] = RunLog(run_id, self.ring_size)
+            self._evict(keep=run_id)
+        else:
+            self.runs.move_to_end(run_id)
+        return run
+
+    def _evict(self, keep: Optional[str] = None):
+        """Bound memory by dropping the least recently active runs that nobody is watching (never keep)"""
+        excess = len(self.runs) - self.max_runs
+        if excess <= 0:
+            return
+        for run_id in [rid for rid, run in self.runs.items() if not run.subscribers and rid != keep][:excess]:
+            del self.runs[run_id]
+            self.stats["evicted_runs"] += 1
+
+    async def connect(self, websocket: WebSocket, client_id: str, since_seq: Optional[int] = None) -> ClientLogQueue:
+        """Subscribe a viewer to a run, replaying ring events after since_seq first"""
+        await websocket.accept()
+        run = self._run(client_id)
+        queue = ClientLogQueue(client_id, websocket, self.queue_size, self.overflow_policy,
+                               self.max_batch, self.flush_interval, self.send_timeout)
+        for event in run.since(since_seq):
+            queue.put(event)
+        queue.task = asyncio.create_task(queue.run())
+        queue.task.add_done_callback(lambda _task, q=queue: self._finished(q))
+        if run.finished:
+            queue.close()
+        else:
+            run.subscribers.add(queue)
+        return queue
+
+    def start_run(self, client_id: str):
+        """Mark the start of a run; a finished run with the same id is reset so new viewers stay connected"""
+        self._start_local(client_id)
+        if self.bus is not None:
+            self.bus.publish({"kind": "start", "run_id": client_id})
+
+    def _start_local(self, client_id: str):
+        run = self._run(client_id)
+        if run.finished:
+            run.restart()
+
+    def disconnect(self, client_id: str, subscriber: Optional[ClientLogQueue] = None):
+        """Detach one viewer (or every viewer when subscriber is None) from a run"""
+        run = self.runs.get(client_id)
+        if run is None:
+            return
+        queues = [subscriber] if subscriber is not None else list(run.subscribers)
+        for queue in queues:
+            run.subscribers.discard(queue)
+            if queue.task is not None and not queue.task.done():
+                queue.task.cancel()
+
+    def _finished(self, queue: ClientLogQueue):
+        """Roll a finished sender's counters into the totals and unsubscribe it"""
+        self.stats["frames"] += queue.frames
+        self.stats["dropped"] += queue.dropped
+        run = self.runs.get(queue.client_id)
+        if run is not None:
+            run.subscribers.discard(queue)
+
+    async def send_log(self, client_id: str, log_data: dict):
+        """Record a log event in the run's ring and queue it for every viewer; never waits on a socket"""
+        self.append_log(client_id, log_data)
+
+    def append_log(self, client_id: str, log_data: dict):
+        """Synchronous send_log for callers outside a coroutine, such as the logging handler"""
+        run = self._run(client_id)
+        event = run.append(log_data)
+        self.stats["events"] += 1
+        self._fan_out(run, event)
+        if self.bus is not None:
+            self.bus.publish({"kind": "log", "run_id": client_id, "event": event})
+
+    def _fan_out(self, run: RunLog, event: dict):
+        for queue in list(run.subscribers):
+            if not queue.failed:
+                queue.put(event)
+
+    async def finish_run(self, client_id: str, result: Optional[Dict[str, Any]] = None):
+        """Mark a run complete: viewers get the remaining events, then their senders stop
+
+        When result is given it is delivered to viewers as a final RESULT event.
+        Returns immediately; senders finish in the background and are cancelled if
+        they haven't drained within linger_timeout. The ring is kept for late viewers
+        until the run is evicted.
+        """
+        if result is not None:
+            await self.send_log(client_id, {
+                "timestamp": datetime.now().isoformat(),
+                "level": "INFO",
+                "category": "RESULT",
+                "message": "Run finished",
+                "data": {"response": result}
+            })
+        self._finish_local(client_id)
+        if self.bus is not None:
+            self.bus.publish({"kind": "finish", "run_id": client_id})
+
+    def _finish_local(self, client_id: str):
+        run = self.runs.get(client_id)
+        if run is None:
+            return
+        run.finished = True
+        loop = asyncio.get_running_loop()
+        for queue in list(run.subscribers):
+            queue.close()
+            if queue.task is not None:
+                loop.call_later(self.linger_timeout, lambda t=queue.task: t.done() or t.cancel())
+
+    def receive(self, message: Dict[str, Any]):
+        """Bus handler: replay a log event or run completion that happened on another worker"""
+        run_id = message.get("run_id")
+        if not run_id:
+            return
+        if message.get("kind") == "log":
+            run = self._run(run_id)
+            self._fan_out(run, run.ingest(message["event"]))
+        elif message.get("kind") == "start":
+            self._start_local(run_id)
+        elif message.get("kind") == "finish":
+            self._finish_local(run_id)
+
+    def metrics(self) -> Dict[str, Any]:
+        subscribers = [q for run in self.runs.values() for q in run.subscribers]
+        return {
+            "events": self.stats["events"],
+            "frames": self.stats["frames"] + sum(q.frames for q in subscribers),
+            "dropped": self.stats["dropped"] + sum(q.dropped for q in subscribers),
+            "evicted_runs": self.stats["evicted_runs"],
+            "bus": self.bus.metrics() if self.bus is not None else None,
+            "overflow_policy": self.overflow_policy,
+            "runs": {
+                run_id: {
+                    "last_seq": run.next_seq - 1,
+                    "buffered": len(run.ring),
+                    "finished": run.finished,
+                    "viewers": [{"queued": len(q.events), "dropped": q.dropped, "frames": q.frames}
+                                for q in run.subscribers],
+                }
+                for run_id, run in self.runs.items()
+            },
+        }
@@ -0,0 +1,256 @@
+"""
+Async client for the merger ingest_topic / upsert_trend API
+Keeps a pooled keep-alive connection set with timeouts, runs per-trend
+calls concurrently under a configurable limit and batches upserts into
+bulk requests when the merger supports them
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+
+from app_logging import get_logger
+
+logger = get_logger("merger")
+
+# Merger API configuration
+MERGER_CONFIG = {
+    "base_url": os.getenv("MERGER_BASE_URL", "http://localhost:8000"),
+    "timeout": float(os.getenv("MERGER_TIMEOUT", "10")),
+    "connect_timeout": float(os.getenv("MERGER_CONNECT_TIMEOUT", "3")),
+    "max_connections": int(os.getenv("MERGER_MAX_CONNECTIONS", "20")),
+    "max_keepalive_connections": int(os.getenv("MERGER_MAX_KEEPALIVE", "10")),
+    "concurrency": int(os.getenv("MERGER_CONCURRENCY", "10")),
+    "bulk_upsert": os.getenv("MERGER_BULK_UPSERT", "1") not in ("0", "false", "False"),
+    "bulk_max_items": int(os.getenv("MERGER_BULK_MAX_ITEMS", "100")),
+    "bulk_max_delay": float(os.getenv("MERGER_BULK_MAX_DELAY", "0.05")),
+    # After the bulk endpoint turns out to be missing, try it again this many seconds later
+    "bulk_retry_interval": float(os.getenv("MERGER_BULK_RETRY_INTERVAL", "300")),
+}
+
+# Status codes meaning the merger has no bulk endpoint, so callers should use per-item upserts
+BULK_UNSUPPORTED_STATUSES = (404, 405, 501)
+
+
+async def gather_limited(coros: Iterable[Awaitable[Any]], limit: int) -> List[Any]:
+    """Await coroutines concurrently with at most `limit` in flight, preserving order"""
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(bounded(c) for c in coros))
+
+
+class MergerClient:
+    """Pooled async client for the merger service"""
+
+    def __init__(self, base_url: str = None, timeout: float = None, connect_timeout: float = None,
+                 max_connections: int = None, max_keepalive_connections: int = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url or MERGER_CONFIG["base_url"]
+        self.timeout = httpx.Timeout(
+            timeout if timeout is not None else MERGER_CONFIG["timeout"],
+            connect=connect_timeout if connect_timeout is not None else MERGER_CONFIG["connect_timeout"],
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections or MERGER_CONFIG["max_connections"],
+            max_keepalive_connections=max_keepalive_connections or MERGER_CONFIG["max_keepalive_connections"],
+        )
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Lazily create the shared AsyncClient on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=self.transport,
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _idempotency_headers(idempotency_key: Optional[str]) -> Dict[str, str]:
+        return {"Idempotency-Key": idempotency_key} if idempotency_key else {}
+
+    async def ingest_topic(self, name, topic_type, source_id, source_name, source_id_type,
+                           idempotency_key: str = None, **kwargs) -> Optional[Any]:
+        """Call the ingest topic endpoint and return the topic_id, or None on failure"""
+        payload = {
+            "name": name,
+            "topic_type": topic_type,
+            "source_id": source_id,
+            "source_name": source_name,
+            "source_id_type": source_id_type
+        }
+
+        # Add optional fields if provided
+        for field in ("umd_program_id", "description", "date"):
+            if field in kwargs:
+                payload[field] = kwargs[field]
+
+        try:
+            response = await self.client.post("/merger/ingest_topic", json=payload,
+                                              headers=self._idempotency_headers(idempotency_key))
+            if response.status_code == 200:
+                return response.json().get('topic_id')
+            logger.error(f"❌ Ingest topic API error: {response.status_code} - {response.text}")
+            return None
+        except Exception as e:
+            logger.error(f"❌ Error calling ingest topic API: {e}")
+            return None
+
+    async def upsert_trend(self, topic_id, source, trend_info: Dict[str, Any], source_detail=None,
+                           idempotency_key: str = None) -> bool:
+        """Call the upsert trend endpoint and return whether it succeeded"""
+        payload = {
+            "topic_id": topic_id,
+            "source": source,
+            "trend_info": trend_info
+        }
+
+        if source_detail:
+            payload['source_detail'] = source_detail
+
+        try:
+            response = await self.client.post("/merger/upsert_trend", json=payload,
+                                              headers=self._idempotency_headers(idempotency_key))
+            if response.status_code == 200:
+                return response.json().get('success', False)
+            logger.error(f"❌ Upsert trend API error: {response.status_code} - {response.text}")
+            return False
+        except Exception as e:
+            logger.error(f"❌ Error calling upsert trend API: {e}")
+            return False
+
+    async def bulk_upsert_trends(self, items: List[Dict[str, Any]]) -> Optional[List[bool]]:
+        """Send many upsert payloads in one request
+
+        Returns one success flag per item, or None when the merger has no bulk endpoint.
+        """
+        try:
+            response = await self.client.post("/merger/bulk_upsert_trends", json={"items": items})
+            if response.status_code in BULK_UNSUPPORTED_STATUSES:
+                return None
+            if response.status_code != 200:
+                logger.error(f"❌ Bulk upsert API error: {response.status_code} - {response.text}")
+                return [False] * len(items)
+            results = response.json().get('results', [])
+            if len(results) != len(items):
+                logger.error(f"❌ Bulk upsert API returned {len(results)} results for {len(items)} items")
+                return [False] * len(items)
+            return [bool(r.get('success', False)) for r in results]
+        except Exception as e:
+            logger.error(f"❌ Error calling bulk upsert API: {e}")
+            return [False] * len(items)
+
+
+class UpsertBatcher:
+    """Collects upsert_trend calls into size- and time-bounded bulk requests
+
+    Each submit() resolves to that item's own success flag. When the merger doesn't
+    support bulk upserts the batch is sent as concurrent per-item calls instead, and
+    bulk is probed again once bulk_retry_interval has passed (e.g. after a deploy).
+    """
+
+    def __init__(self, client: MergerClient, max_items: int = None, max_delay: float = None, concurrency: int = None,
+                 bulk_retry_interval: float = None):
+        self.client = client
+        self.max_items = max_items or MERGER_CONFIG["bulk_max_items"]
+        self.max_delay = max_delay if max_delay is not None else MERGER_CONFIG["bulk_max_delay"]
+        self.concurrency = concurrency or MERGER_CONFIG["concurrency"]
+        self.bulk_retry_interval = (bulk_retry_interval if bulk_retry_interval is not None
+                                    else MERGER_CONFIG["bulk_retry_interval"])
+        # Monotonic time after which bulk is tried again; None while bulk works
+        self.bulk_retry_at: Optional[float] = None
+        self.stats = {"batches": 0, "bulk_items": 0, "fallback_items": 0}
+
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._sending: Set[asyncio.Task] = set()
+
+    @property
+    def bulk_supported(self) -> bool:
+        return self.bulk_retry_at is None
+
+    async def submit(self, topic_id, source, trend_info: Dict[str, Any], source_detail=None,
+                     idempotency_key: str = None) -> bool:
+        item = {"topic_id": topic_id, "source": source, "trend_info": trend_info}
+        if source_detail:
+            item["source_detail"] = source_detail
+        if idempotency_key:
+            item["idempotency_key"] = idempotency_key
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_items:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+        return await future
+
+    def flush(self):
+        """Send everything collected so far without waiting for the batch window"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def aclose(self):
+        self.flush()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    async def _send(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        items = [item for item, _ in batch]
+        results: List[Any] = []
+        try:
+            retry_at = self.bulk_retry_at
+            probe = retry_at is None or time.monotonic() >= retry_at
+            results = await self.client.bulk_upsert_trends(items) if probe else None
+            if results is None:
+                if probe:
+                    if retry_at is None:
+                        logger.info("ℹ️ Merger has no bulk upsert endpoint, falling back to per-item upserts")
+                    self.bulk_retry_at = time.monotonic() + self.bulk_retry_interval
+                results = await gather_limited(
+                    (self.client.upsert_trend(
+                        item["topic_id"], item["source"], item["trend_info"],
+                        item.get("source_detail"), item.get("idempotency_key")
+                    ) for item in items),
+                    self.concurrency
+                )
+                self.stats["fallback_items"] += len(items)
+            else:
+                if retry_at is not None:
+                    logger.info("✅ Merger bulk upsert endpoint is available again")
+                    self.bulk_retry_at = None
+                self.stats["bulk_items"] += len(items)
+            self.stats["batches"] += 1
+        except Exception as e:
+            logger.error(f"❌ Error sending upsert batch: {e}")
+            results = []
+        finally:
+            # Runs on cancellation too (shutdown, aclose), so no submit() caller is left waiting;
+            # items without a result count as failed
+            results = list(results or [])
+            for index, (_, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result(bool(results[index]) if index < len(results) else False)
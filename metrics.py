@@ -0,0 +1,106 @@
+"""
+Stage-level timing instrumentation and Prometheus export
+Wrap a unit of work in `with stage("agent_run"):` (or decorate it with
+@timed("scrape")) to record it in the trend_portal_stage_seconds histogram and
+in the timing breakdown of the request currently being served.
+"""
+
+import functools
+import inspect
+import os
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+STAGES = (
+    "scrape", "csv_parse", "db_upsert", "archive", "pending_trends_query", "clustering", "agent_run",
+    "enrichment", "ingest_topic", "upsert_trend", "ws_send",
+)
+
+STAGE_SECONDS = Histogram(
+    "trend_portal_stage_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+STAGE_ERRORS = Counter(
+    "trend_portal_stage_errors_total",
+    "Pipeline stage invocations that raised",
+    ["stage"],
+)
+
+# Pre-create every stage's series so dashboards see zeros before the first call
+for _name in STAGES:
+    STAGE_SECONDS.labels(_name)
+    STAGE_ERRORS.labels(_name)
+
+# Per-request stage totals in milliseconds; None outside a timed request
+_breakdown: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_breakdown", default=None)
+
+
+def start_breakdown() -> Dict[str, float]:
+    """Begin collecting stage timings for the current request; returns the live dict"""
+    breakdown: Dict[str, float] = {}
+    _breakdown.set(breakdown)
+    return breakdown
+
+
+def current_breakdown() -> Optional[Dict[str, float]]:
+    """Rounded copy of the current request's stage timings (ms), or None outside a request"""
+    breakdown = _breakdown.get()
+    if breakdown is None:
+        return None
+    return {name: round(ms, 3) for name, ms in breakdown.items()}
+
+
+class stage:
+    """Context manager timing one stage; usable around sync code and awaits alike"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.labels(self.name).observe(elapsed)
+        if exc_type is not None:
+            STAGE_ERRORS.labels(self.name).inc()
+        breakdown = _breakdown.get()
+        if breakdown is not None:
+            # Concurrent calls of one stage (e.g. fanned-out merger calls) add up
+            breakdown[self.name] = breakdown.get(self.name, 0.0) + elapsed * 1000
+        return False
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of stage() for plain and async functions"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_metrics():
+    """Prometheus exposition payload and content type; aggregates all workers in multiprocess mode"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
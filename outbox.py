@@ -0,0 +1,303 @@
+"""
+Transactional outbox for merger API calls
+Events are written in the same transaction as the trends_to_topics record and
+delivered off the request path by a background dispatcher with retries,
+exponential backoff and idempotency keys
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app_logging import get_logger
+from merger_client import gather_limited
+
+logger = get_logger("outbox")
+
+# Outbox configuration
+OUTBOX_CONFIG = {
+    "enabled": os.getenv("MERGER_OUTBOX", "1") not in ("0", "false", "False"),
+    "table": "merger_outbox",
+    "batch_size": int(os.getenv("OUTBOX_BATCH_SIZE", "50")),
+    "concurrency": int(os.getenv("OUTBOX_CONCURRENCY", "10")),
+    "poll_interval": float(os.getenv("OUTBOX_POLL_INTERVAL", "2")),
+    "max_attempts": int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+    "base_backoff": float(os.getenv("OUTBOX_BASE_BACKOFF", "2")),
+    "max_backoff": float(os.getenv("OUTBOX_MAX_BACKOFF", "600")),
+    "lease_seconds": int(os.getenv("OUTBOX_LEASE_SECONDS", "300")),
+    # Delivered events are deleted this long after dispatch (0 keeps them); dead ones are kept for inspection
+    "retention_hours": float(os.getenv("OUTBOX_RETENTION_HOURS", "168")),
+    "prune_interval": float(os.getenv("OUTBOX_PRUNE_INTERVAL", "600")),
+    "prune_batch_size": 10000,
+}
+
+
+def make_idempotency_key(*parts: Any) -> str:
+    """Stable key for an event so redelivery never creates duplicate merger records"""
+    raw = "|".join(str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def ensure_outbox_table(conn, schema: str, table: str = OUTBOX_CONFIG["table"]):
+    """Create the outbox table and its dispatch index if they don't exist"""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.{table} (
+            id BIGSERIAL PRIMARY KEY,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            event_type TEXT NOT NULL,
+            payload JSONB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            locked_at TIMESTAMPTZ,
+            last_error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            dispatched_at TIMESTAMPTZ
+        );
+        CREATE INDEX IF NOT EXISTS {table}_pending_idx
+            ON {schema}.{table} (next_attempt_at, id) WHERE status IN ('pending', 'in_flight');
+        CREATE INDEX IF NOT EXISTS {table}_done_idx
+            ON {schema}.{table} (dispatched_at) WHERE status = 'done';
+        """)
+    conn.commit()
+
+
+def enqueue_event(cursor, schema: str, event_type: str, payload: Dict[str, Any], idempotency_key: str,
+                  table: str = OUTBOX_CONFIG["table"]):
+    """Queue an event using the caller's cursor so it commits or rolls back with their transaction"""
+    cursor.execute(f"""
+    INSERT INTO {schema}.{table} (idempotency_key, event_type, payload)
+    VALUES (%s, %s, %s::jsonb)
+    ON CONFLICT (idempotency_key) DO NOTHING
+    """, (idempotency_key, event_type, json.dumps(payload, default=str)))
+
+
+class OutboxDispatcher:
+    """Background task that drains the outbox in batches"""
+
+    def __init__(self, connect: Callable[[], Any], deliver: Callable[[Dict[str, Any]], Awaitable[bool]],
+                 schema: str, table: str = None, batch_size: int = None, concurrency: int = None,
+                 poll_interval: float = None, max_attempts: int = None, base_backoff: float = None,
+                 max_backoff: float = None, lease_seconds: int = None, retention_hours: float = None):
+        """
+        Args:
+            connect: Returns a new DB connection (or None when the DB is unavailable)
+            deliver: Async callable that sends one event; returns True on success
+            schema: Schema holding the outbox table
+        """
+        self.connect = connect
+        self.deliver = deliver
+        self.schema = schema
+        self.table = table or OUTBOX_CONFIG["table"]
+        self.batch_size = batch_size or OUTBOX_CONFIG["batch_size"]
+        self.concurrency = concurrency or OUTBOX_CONFIG["concurrency"]
+        self.poll_interval = poll_interval if poll_interval is not None else OUTBOX_CONFIG["poll_interval"]
+        self.max_attempts = max_attempts or OUTBOX_CONFIG["max_attempts"]
+        self.base_backoff = base_backoff if base_backoff is not None else OUTBOX_CONFIG["base_backoff"]
+        self.max_backoff = max_backoff if max_backoff is not None else OUTBOX_CONFIG["max_backoff"]
+        self.lease_seconds = lease_seconds or OUTBOX_CONFIG["lease_seconds"]
+        self.retention_hours = retention_hours if retention_hours is not None else OUTBOX_CONFIG["retention_hours"]
+
+        self.counters = {"dispatched": 0, "retried": 0, "dead": 0, "batches": 0, "pruned": 0}
+        self._pruned_at = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._stopping = False
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self._stopping = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def notify(self):
+        """Wake the dispatcher early after new events are committed"""
+        self._wake.set()
+
+    async def run(self):
+        while not self._stopping:
+            try:
+                handled = await self.dispatch_batch()
+            except Exception as e:
+                logger.error(f"❌ Outbox dispatcher error: {e}")
+                handled = 0
+
+            if self.retention_hours > 0 and time.monotonic() - self._pruned_at >= OUTBOX_CONFIG["prune_interval"]:
+                self._pruned_at = time.monotonic()
+                try:
+                    await asyncio.to_thread(self.prune)
+                except Exception as e:
+                    logger.error(f"❌ Outbox prune error: {e}")
+
+            # A full batch means more work is probably waiting; otherwise sleep until poked or polled
+            if handled < self.batch_size and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    def backoff_seconds(self, attempts: int) -> float:
+        """Exponential backoff with equal jitter (between half and all of the step), capped at max_backoff"""
+        ceiling = min(self.max_backoff, self.base_backoff * (2 ** max(0, attempts - 1)))
+        return random.uniform(ceiling / 2, ceiling)
+
+    async def dispatch_batch(self) -> int:
+        """Claim, deliver and settle one batch; returns the number of events handled"""
+        events = await asyncio.to_thread(self._claim_batch)
+        if not events:
+            return 0
+
+        async def attempt(event):
+            try:
+                return bool(await self.deliver(event)), None
+            except Exception as e:
+                return False, str(e)
+
+        results = await gather_limited((attempt(e) for e in events), self.concurrency)
+        await asyncio.to_thread(self._settle, events, results)
+        self.counters["batches"] += 1
+        return len(events)
+
+    def _claim_batch(self) -> List[Dict[str, Any]]:
+        conn = self.connect()
+        if not conn:
+            return []
+        try:
+            with conn.cursor() as cur:
+                # Reclaim in-flight rows whose lease expired so a crashed worker can't strand them
+                cur.execute(f"""
+                UPDATE {self.schema}.{self.table} o
+                SET status = 'in_flight', locked_at = now(), attempts = o.attempts + 1
+                WHERE o.id IN (
+                    SELECT id FROM {self.schema}.{self.table}
+                    WHERE (status = 'pending' AND next_attempt_at <= now())
+                       OR (status = 'in_flight' AND locked_at < now() - make_interval(secs => %s))
+                    ORDER BY next_attempt_at, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING o.id, o.idempotency_key, o.event_type, o.payload, o.attempts
+                """, (self.lease_seconds, self.batch_size))
+                rows = cur.fetchall()
+            conn.commit()
+            return [
+                {"id": r[0], "idempotency_key": r[1], "event_type": r[2],
+                 "payload": r[3] if isinstance(r[3], dict) else json.loads(r[3]), "attempts": r[4]}
+                for r in rows
+            ]
+        except Exception as e:
+            logger.error(f"❌ Error claiming outbox batch: {e}")
+            conn.rollback()
+            return []
+        finally:
+            conn.close()
+
+    def _settle(self, events: List[Dict[str, Any]], results: List[tuple]):
+        done_ids = [e["id"] for e, (ok, _) in zip(events, results) if ok]
+        conn = self.connect()
+        if not conn:
+            return
+        try:
+            with conn.cursor() as cur:
+                if done_ids:
+                    cur.execute(f"""
+                    UPDATE {self.schema}.{self.table}
+                    SET status = 'done', dispatched_at = now(), locked_at = NULL, last_error = NULL
+                    WHERE id = ANY(%s)
+                    """, (done_ids,))
+                    self.counters["dispatched"] += len(done_ids)
+
+                for event, (ok, error) in zip(events, results):
+                    if ok:
+                        continue
+                    dead = event["attempts"] >= self.max_attempts
+                    cur.execute(f"""
+                    UPDATE {self.schema}.{self.table}
+                    SET status = %s, locked_at = NULL, last_error = %s,
+                        next_attempt_at = now() + make_interval(secs => %s)
+                    WHERE id = %s
+                    """, ('dead' if dead else 'pending', error or 'delivery failed',
+                          self.backoff_seconds(event["attempts"]), event["id"]))
+                    self.counters["dead" if dead else "retried"] += 1
+                    if dead:
+                        logger.error(f"❌ Outbox event {event['id']} gave up after {event['attempts']} attempts")
+            conn.commit()
+        except Exception as e:
+            logger.error(f"❌ Error settling outbox batch: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+
+    def prune(self) -> int:
+        """Delete events delivered more than retention_hours ago, in batches; returns the number deleted"""
+        conn = self.connect()
+        if not conn:
+            return 0
+        deleted = 0
+        batch_size = OUTBOX_CONFIG["prune_batch_size"]
+        try:
+            while True:
+                with conn.cursor() as cur:
+                    cur.execute(f"""
+                    DELETE FROM {self.schema}.{self.table} WHERE id IN (
+                        SELECT id FROM {self.schema}.{self.table}
+                        WHERE status = 'done' AND dispatched_at < now() - make_interval(secs => %s)
+                        LIMIT %s
+                    )
+                    """, (self.retention_hours * 3600, batch_size))
+                    count = cur.rowcount
+                # Commit per batch so the delete never holds many row locks at once
+                conn.commit()
+                deleted += count
+                if count < batch_size:
+                    break
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+            self.counters["pruned"] += deleted
+        if deleted:
+            logger.info(f"🧹 Pruned {deleted} delivered outbox events")
+        return deleted
+
+    def queue_depth(self) -> Dict[str, Any]:
+        """Per-status row counts and the age of the oldest undelivered event"""
+        depth = {"pending": 0, "in_flight": 0, "dead": 0, "oldest_pending_seconds": None}
+        conn = self.connect()
+        if not conn:
+            return depth
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                SELECT status, count(*), EXTRACT(EPOCH FROM now() - min(created_at))
+                FROM {self.schema}.{self.table}
+                WHERE status <> 'done'
+                GROUP BY status
+                """)
+                for status, count, oldest in cur.fetchall():
+                    depth[status] = count
+                    if status in ("pending", "in_flight") and oldest is not None:
+                        current = depth["oldest_pending_seconds"] or 0
+                        depth["oldest_pending_seconds"] = max(current, float(oldest))
+            return depth
+        except Exception as e:
+            logger.error(f"❌ Error reading outbox depth: {e}")
+            return depth
+        finally:
+            conn.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.queue_depth(), **self.counters, "running": self._task is not None and not self._task.done()}
@@ -0,0 +1,175 @@
+"""
+On-demand request profiling
+A request sent with `X-Profile: 1` (or `?profile=1`) is run under a sampling
+profiler that walks every thread's stack, so work pushed to asyncio.to_thread is
+captured alongside the event loop. Profiles are saved as collapsed stacks
+(flamegraph.pl / speedscope input) and rate limited per worker.
+"""
+
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# Profiling configuration
+PROFILING_CONFIG = {
+    # Off by default: profiles expose code paths, so only turn it on where PROFILING_TOKEN is set or access is trusted
+    "enabled": os.getenv("PROFILING_ENABLED", "0") in ("1", "true", "True"),
+    "token": os.getenv("PROFILING_TOKEN", ""),
+    "dir": os.getenv("PROFILES_DIR", "profiles"),
+    "interval": float(os.getenv("PROFILING_INTERVAL", "0.005")),
+    "min_interval": float(os.getenv("PROFILING_MIN_INTERVAL", "10")),
+    "max_profiles": int(os.getenv("PROFILING_MAX_PROFILES", "50")),
+}
+
+PROFILE_HEADER = "x-profile"
+PROFILE_TOKEN_HEADER = "x-profile-token"
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Background thread that samples all other threads' Python stacks at a fixed interval"""
+
+    def __init__(self, interval: float = None):
+        self.interval = interval or PROFILING_CONFIG["interval"]
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                # An idle thread pool worker sits in _worker waiting on its queue
+                if frame.f_code.co_name == "_worker" and frame.f_code.co_filename.endswith("thread.py"):
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Profile in collapsed-stack format, one `frame;frame;... count` line per stack"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+class Profiler:
+    """Decides which requests get profiled and stores the results"""
+
+    def __init__(self, directory: str = None, min_interval: float = None, max_profiles: int = None,
+                 token: str = None, enabled: bool = None):
+        self.directory = directory or PROFILING_CONFIG["dir"]
+        self.min_interval = min_interval if min_interval is not None else PROFILING_CONFIG["min_interval"]
+        self.max_profiles = max_profiles or PROFILING_CONFIG["max_profiles"]
+        self.token = token if token is not None else PROFILING_CONFIG["token"]
+        self.enabled = enabled if enabled is not None else PROFILING_CONFIG["enabled"]
+        self._active = False
+        self._last_started = 0.0
+
+    def requested(self, headers, query_params) -> bool:
+        flag = headers.get(PROFILE_HEADER) or query_params.get("profile")
+        if not flag or flag in ("0", "false"):
+            return False
+        # With a token configured the flag must carry it
+        return not self.token or hmac.compare_digest(flag, self.token)
+
+    def authorized(self, headers) -> bool:
+        """Whether a request may list or download profiles: profiling is on and X-Profile-Token matches any token"""
+        if not self.enabled:
+            return False
+        return not self.token or hmac.compare_digest(headers.get(PROFILE_TOKEN_HEADER, ""), self.token)
+
+    def acquire(self) -> Optional[str]:
+        """Reserve the profiler; returns why it can't be used, or None when the caller may profile"""
+        if not self.enabled:
+            return "disabled"
+        if self._active:
+            return "busy"
+        if time.monotonic() - self._last_started < self.min_interval:
+            return "rate_limited"
+        self._active = True
+        self._last_started = time.monotonic()
+        return None
+
+    def release(self):
+        self._active = False
+
+    def save(self, sampler: StackSampler, method: str, path: str, status_code: int, duration: float) -> str:
+        """Write the collapsed stacks and a metadata file; returns the profile id"""
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = uuid.uuid4().hex
+        with open(os.path.join(self.directory, f"{profile_id}.folded"), "w") as f:
+            f.write(sampler.collapsed())
+        meta = {
+            "id": profile_id,
+            "method": method,
+            "path": path,
+            "status_code": status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "samples": sampler.samples,
+            "interval_ms": sampler.interval * 1000,
+            "created_at": time.time(),
+        }
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w") as f:
+            json.dump(meta, f)
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        metas = sorted(
+            (os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")),
+            key=os.path.getmtime,
+        )
+        for meta_path in metas[:-self.max_profiles]:
+            for path in (meta_path, meta_path[:-len(".json")] + ".folded"):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+        return sorted(profiles, key=lambda p: p["created_at"], reverse=True)
+
+    def load(self, profile_id: str) -> Optional[str]:
+        """Collapsed stacks for a saved profile, or None if it doesn't exist"""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.folded")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read()
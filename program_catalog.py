@@ -0,0 +1,266 @@
+"""
+Memory-mapped program catalog for agent lookups
+The catalog is one read-only file built offline (see the CLI below): a header,
+compact length-prefixed program records, and two sorted fixed-width indexes,
+one keyed by numeric imdb_id and one by a hash of the normalized title. Workers
+mmap the file instead of parsing it, so every process shares the same page-cache
+pages and a lookup only decodes the records it returns.
+
+Usage:
+    python program_catalog.py build programs.jsonl catalog.tcat
+    python program_catalog.py lookup catalog.tcat --title "dune part two"
+    python program_catalog.py lookup catalog.tcat --imdb tt15239678
+"""
+
+import argparse
+import bisect
+import functools
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Program catalog configuration
+CATALOG_CONFIG = {
+    "path": os.getenv("PROGRAM_CATALOG", ""),
+}
+
+MAGIC = b"TCAT"
+VERSION = 1
+# magic, version, record count, imdb index entries, title index entries, records/imdb/title offsets
+HEADER = struct.Struct("<4sHxxIIIQQQ")
+# Record: total length, release year (0 = unknown), then length-prefixed strings and string lists
+RECORD_HEAD = struct.Struct("<IH")
+STR_LEN = struct.Struct("<H")
+LIST_LEN = struct.Struct("<H")
+# Index entries: key, record offset
+IMDB_ENTRY = struct.Struct("<IQ")
+TITLE_ENTRY = struct.Struct("<QQ")
+
+_IMDB_ID = re.compile(r"^tt(\d+)$")
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def normalize_title(title: str) -> str:
+    """Case-, accent- and punctuation-insensitive form of a title: "Dune: Part Two" -> "dune part two" """
+    decomposed = unicodedata.normalize("NFKD", title)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(_NON_WORD.sub(" ", stripped.lower()).split())
+
+
+def title_key(title: str) -> int:
+    """Stable 64-bit key of a normalized title (the same in every process)"""
+    return int.from_bytes(hashlib.blake2b(normalize_title(title).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def imdb_key(imdb_id: str) -> Optional[int]:
+    match = _IMDB_ID.match(imdb_id or "")
+    return int(match.group(1)) if match else None
+
+
+def _pack_str(value: Any) -> bytes:
+    raw = str(value or "").encode("utf-8")
+    if len(raw) > 0xFFFF:
+        # Cut on a character boundary so the record still decodes
+        raw = raw[:0xFFFF].decode("utf-8", "ignore").encode("utf-8")
+    return STR_LEN.pack(len(raw)) + raw
+
+
+def encode_program(program: Dict[str, Any]) -> bytes:
+    """Compact record for one program dict (the shape TrendAgent returns)"""
+    body = [
+        _pack_str(program.get("imdb_id")),
+        _pack_str(program.get("title")),
+        _pack_str(program.get("program_type")),
+        _pack_str(program.get("explanation_of_trend")),
+    ]
+    for field in ("descriptions", "cast"):
+        values = list(program.get(field) or [])[:0xFFFF]
+        body.append(LIST_LEN.pack(len(values)))
+        body.extend(_pack_str(value) for value in values)
+    payload = b"".join(body)
+    return RECORD_HEAD.pack(RECORD_HEAD.size + len(payload), int(program.get("release_year") or 0)) + payload
+
+
+def build_catalog(programs: Iterable[Dict[str, Any]], path: str) -> Dict[str, int]:
+    """Write programs to a catalog file (atomically); returns counts of records and index entries"""
+    records = bytearray()
+    imdb_index, title_index = [], []
+    for program in programs:
+        if not program.get("title"):
+            continue
+        offset = HEADER.size + len(records)
+        records += encode_program(program)
+        key = imdb_key(program.get("imdb_id", ""))
+        if key is not None:
+            imdb_index.append((key, offset))
+        title_index.append((title_key(program["title"]), offset))
+    imdb_index.sort()
+    title_index.sort()
+
+    records_off = HEADER.size
+    imdb_off = records_off + len(records)
+    title_off = imdb_off + IMDB_ENTRY.size * len(imdb_index)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(title_index), len(imdb_index), len(title_index),
+                            records_off, imdb_off, title_off))
+        f.write(records)
+        f.write(b"".join(IMDB_ENTRY.pack(*entry) for entry in imdb_index))
+        f.write(b"".join(TITLE_ENTRY.pack(*entry) for entry in title_index))
+    # Rename so workers never map a half-written catalog
+    os.replace(tmp_path, path)
+    return {"records": len(title_index), "imdb_ids": len(imdb_index), "titles": len(title_index)}
+
+
+class _SortedKeys:
+    """Sequence view over the keys of a fixed-width index section, for bisect without copying"""
+
+    def __init__(self, buf, offset: int, count: int, entry: struct.Struct):
+        self.buf, self.offset, self.count, self.entry = buf, offset, count, entry
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> int:
+        return self.entry.unpack_from(self.buf, self.offset + i * self.entry.size)[0]
+
+    def value(self, i: int) -> int:
+        return self.entry.unpack_from(self.buf, self.offset + i * self.entry.size)[1]
+
+
+class ProgramCatalog:
+    """Read-only, memory-mapped view of a catalog file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buf = memoryview(self._mmap)
+        magic, version, self.count, imdb_count, title_count, _, imdb_off, title_off = HEADER.unpack_from(self.buf)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} program catalog")
+        self._imdb = _SortedKeys(self.buf, imdb_off, imdb_count, IMDB_ENTRY)
+        self._titles = _SortedKeys(self.buf, title_off, title_count, TITLE_ENTRY)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        self.buf.release()
+        self._mmap.close()
+
+    def record(self, offset: int) -> Dict[str, Any]:
+        """Decode the program record at offset"""
+        buf = self.buf
+        _, release_year = RECORD_HEAD.unpack_from(buf, offset)
+        pos = offset + RECORD_HEAD.size
+
+        def read_str():
+            nonlocal pos
+            (length,) = STR_LEN.unpack_from(buf, pos)
+            pos += STR_LEN.size + length
+            return str(buf[pos - length:pos], "utf-8")
+
+        def read_list():
+            nonlocal pos
+            (count,) = LIST_LEN.unpack_from(buf, pos)
+            pos += LIST_LEN.size
+            return [read_str() for _ in range(count)]
+
+        program = {"imdb_id": read_str(), "title": read_str(), "program_type": read_str(),
+                   "explanation_of_trend": read_str()}
+        program["descriptions"] = read_list()
+        program["cast"] = read_list()
+        program["release_year"] = release_year or None
+        return program
+
+    def by_imdb_id(self, imdb_id: str) -> Optional[Dict[str, Any]]:
+        key = imdb_key(imdb_id)
+        if key is None:
+            return None
+        i = bisect.bisect_left(self._imdb, key)
+        if i < len(self._imdb) and self._imdb[i] == key:
+            return self.record(self._imdb.value(i))
+        return None
+
+    def by_title(self, title: str) -> List[Dict[str, Any]]:
+        """Programs whose normalized title equals title's (remakes share a title), newest first"""
+        key, wanted = title_key(title), normalize_title(title)
+        matches = []
+        i = bisect.bisect_left(self._titles, key)
+        while i < len(self._titles) and self._titles[i] == key:
+            program = self.record(self._titles.value(i))
+            # Hash collisions are possible in principle, so confirm against the stored title
+            if normalize_title(program["title"]) == wanted:
+                matches.append(program)
+            i += 1
+        return sorted(matches, key=lambda p: p["release_year"] or 0, reverse=True)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self._titles)):
+            yield self.record(self._titles.value(i))
+
+
+@functools.lru_cache(maxsize=4)
+def open_catalog(path: str = None) -> Optional[ProgramCatalog]:
+    """The process-wide catalog for path (PROGRAM_CATALOG by default), or None when unset or unreadable"""
+    path = path or CATALOG_CONFIG["path"]
+    if not path or not os.path.exists(path):
+        return None
+    return ProgramCatalog(path)
+
+
+def _read_programs(path: str) -> Iterator[Dict[str, Any]]:
+    """Programs from a JSON array or a JSON Lines file"""
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build or query a memory-mapped program catalog")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build a catalog from a JSON array or JSON Lines file of programs")
+    build.add_argument("source", help="Programs with title, program_type, release_year, descriptions, cast, imdb_id")
+    build.add_argument("output", help="Catalog file to write")
+    lookup = commands.add_parser("lookup", help="Look a program up by imdb_id or title")
+    lookup.add_argument("catalog", help="Catalog file")
+    lookup.add_argument("--imdb", help="IMDb id, e.g. tt15239678")
+    lookup.add_argument("--title", help="Title (matched case-, accent- and punctuation-insensitively)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        counts = build_catalog(_read_programs(args.source), args.output)
+        print(f"📚 Wrote {counts['records']} programs ({counts['imdb_ids']} with imdb ids) "
+              f"to {args.output} ({os.path.getsize(args.output) / 1024 / 1024:.1f} MB)")
+        return 0
+
+    catalog = ProgramCatalog(args.catalog)
+    if args.imdb:
+        program = catalog.by_imdb_id(args.imdb)
+        results = [program] if program else []
+    elif args.title:
+        results = catalog.by_title(args.title)
+    else:
+        parser.error("lookup needs --imdb or --title")
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+Server-side TMDB enrichment of identified programs
+Resolves an imdb_id to TMDB details (find, then movie/tv details with credits)
+through one pooled client, so the frontend no longer calls TMDB for every
+result. Lookups arriving within a short window are read from the cache table in
+one query, concurrent lookups of one id share a single request, and details are
+kept in a bounded in-memory LRU plus a Postgres table shared by workers and
+restarts. Titles TMDB doesn't know are cached too, for a shorter TTL.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from app_logging import get_logger
+from merger_client import gather_limited
+
+logger = get_logger("tmdb")
+
+# TMDB enrichment configuration
+TMDB_CONFIG = {
+    "enabled": os.getenv("TMDB_ENRICHMENT", "1") not in ("0", "false", "False"),
+    "api_key": os.getenv("TMDB_API_KEY", ""),
+    "base_url": os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3"),
+    "timeout": float(os.getenv("TMDB_TIMEOUT", "5")),
+    "connect_timeout": float(os.getenv("TMDB_CONNECT_TIMEOUT", "3")),
+    "max_connections": int(os.getenv("TMDB_MAX_CONNECTIONS", "20")),
+    "concurrency": int(os.getenv("TMDB_CONCURRENCY", "8")),
+    "batch_max_items": int(os.getenv("TMDB_BATCH_MAX_ITEMS", "50")),
+    "batch_max_delay": float(os.getenv("TMDB_BATCH_MAX_DELAY", "0.01")),
+    # How long /api/analyze-trends waits for details; a slower lookup still finishes and fills the cache
+    "response_timeout": float(os.getenv("TMDB_RESPONSE_TIMEOUT", "2")),
+    "max_size": int(os.getenv("TMDB_CACHE_MAX_SIZE", "10000")),
+    "ttl_seconds": float(os.getenv("TMDB_CACHE_TTL", str(7 * 86400))),
+    "not_found_ttl_seconds": float(os.getenv("TMDB_CACHE_NOT_FOUND_TTL", "86400")),
+    "persist": os.getenv("TMDB_CACHE_PERSIST", "1") not in ("0", "false", "False"),
+    "table": "tmdb_cache",
+    "cast_limit": 10,
+    "crew_limit": 10,
+}
+
+_IMDB_ID = re.compile(r"^tt\d+$")
+
+
+def summarize_details(data: Dict[str, Any], media_type: str, tmdb_id: Any) -> Dict[str, Any]:
+    """The subset of a TMDB movie/tv details response the frontend renders"""
+    credits = data.get("credits") or {}
+    return {
+        "tmdb_id": tmdb_id,
+        "media_type": media_type,
+        "title": data.get("title") or data.get("name"),
+        "overview": data.get("overview"),
+        "poster_path": data.get("poster_path"),
+        "backdrop_path": data.get("backdrop_path"),
+        "release_date": data.get("release_date") or data.get("first_air_date"),
+        "vote_average": data.get("vote_average"),
+        "vote_count": data.get("vote_count"),
+        "runtime": data.get("runtime") or next(iter(data.get("episode_run_time") or []), None),
+        "genres": [{"id": g.get("id"), "name": g.get("name")} for g in data.get("genres") or []],
+        "production_companies": [{"name": c.get("name"), "logo_path": c.get("logo_path")}
+                                 for c in data.get("production_companies") or []],
+        "credits": {
+            "cast": [{"name": p.get("name"), "character": p.get("character"), "profile_path": p.get("profile_path")}
+                     for p in (credits.get("cast") or [])[:TMDB_CONFIG["cast_limit"]]],
+            "crew": [{"name": p.get("name"), "job": p.get("job")}
+                     for p in (credits.get("crew") or [])[:TMDB_CONFIG["crew_limit"]]],
+        },
+    }
+
+
+def ensure_tmdb_cache_table(conn, schema: str, table: str = TMDB_CONFIG["table"]):
+    """Create the persistent imdb_id -> details cache (NULL details: not on TMDB)"""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.{table} (
+            imdb_id TEXT PRIMARY KEY,
+            details JSONB,
+            fetched_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """)
+    conn.commit()
+
+
+class TmdbEnricher:
+    """Batched, coalesced and cached imdb_id -> TMDB details lookups"""
+
+    def __init__(self, api_key: str = None, base_url: str = None, connect: Callable[[], Any] = None,
+                 schema: str = None, table: str = None, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 max_size: int = None, ttl_seconds: float = None, not_found_ttl_seconds: float = None,
+                 concurrency: int = None, max_items: int = None, max_delay: float = None):
+        """
+        Args:
+            connect: Returns a DB connection; when given, the Postgres cache table is read and written
+            schema: Schema holding the cache table
+            transport: httpx transport override, e.g. a local stand-in for offline runs
+        """
+        self.api_key = api_key if api_key is not None else TMDB_CONFIG["api_key"]
+        self.base_url = base_url or TMDB_CONFIG["base_url"]
+        self.connect = connect
+        self.schema = schema
+        self.table = table or TMDB_CONFIG["table"]
+        self.transport = transport
+        self.max_size = max_size or TMDB_CONFIG["max_size"]
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else TMDB_CONFIG["ttl_seconds"]
+        self.not_found_ttl_seconds = (not_found_ttl_seconds if not_found_ttl_seconds is not None
+                                      else TMDB_CONFIG["not_found_ttl_seconds"])
+        self.concurrency = concurrency or TMDB_CONFIG["concurrency"]
+        self.max_items = max_items or TMDB_CONFIG["batch_max_items"]
+        self.max_delay = max_delay if max_delay is not None else TMDB_CONFIG["batch_max_delay"]
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._entries: "OrderedDict[str, Tuple[Optional[Dict[str, Any]], float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending: List[Tuple[str, str]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._sending = set()
+        self.stats = {"hits": 0, "db_hits": 0, "fetched": 0, "not_found": 0, "errors": 0, "coalesced": 0,
+                      "batches": 0, "evictions": 0}
+
+    @property
+    def available(self) -> bool:
+        return TMDB_CONFIG["enabled"] and bool(self.api_key)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Lazily create the shared AsyncClient on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(TMDB_CONFIG["timeout"], connect=TMDB_CONFIG["connect_timeout"]),
+                limits=httpx.Limits(max_connections=TMDB_CONFIG["max_connections"]),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def aclose(self):
+        self.flush()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get(self, imdb_id: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(cached, details) from memory; details is None for a cached not-found"""
+        entry = self._entries.get(imdb_id)
+        if entry is None:
+            return False, None
+        details, expires_at = entry
+        if time.monotonic() > expires_at:
+            del self._entries[imdb_id]
+            return False, None
+        self._entries.move_to_end(imdb_id)
+        return True, details
+
+    def put(self, imdb_id: str, details: Optional[Dict[str, Any]], ttl_seconds: float = None):
+        if ttl_seconds is None:
+            ttl_seconds = self.ttl_seconds if details is not None else self.not_found_ttl_seconds
+        self._entries[imdb_id] = (details, time.monotonic() + ttl_seconds)
+        self._entries.move_to_end(imdb_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    async def lookup(self, imdb_id: str, program_type: str = "movie") -> Optional[Dict[str, Any]]:
+        """TMDB details for imdb_id, or None when TMDB doesn't know it or can't be reached
+
+        Failed requests are not cached, so the next lookup tries again.
+        """
+        if not self.available or not _IMDB_ID.match(imdb_id or ""):
+            return None
+        cached, details = self.get(imdb_id)
+        if cached:
+            self.stats["hits"] += 1
+            return details
+
+        pending = self._inflight.get(imdb_id)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[imdb_id] = future
+        self._pending.append((imdb_id, program_type))
+        if len(self._pending) >= self.max_items:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+        return await asyncio.shield(future)
+
+    def flush(self):
+        """Resolve everything collected so far without waiting for the batch window"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._resolve(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _resolve(self, batch: List[Tuple[str, str]]):
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        try:
+            self.stats["batches"] += 1
+            cached = await asyncio.to_thread(self._fetch_db, [imdb_id for imdb_id, _ in batch]) if self.connect else {}
+            for imdb_id, (details, ttl_left) in cached.items():
+                self.stats["db_hits"] += 1
+                self.put(imdb_id, details, ttl_left)
+                results[imdb_id] = details
+
+            misses = [(imdb_id, program_type) for imdb_id, program_type in batch if imdb_id not in cached]
+            fetched = await gather_limited((self.fetch(*miss) for miss in misses), self.concurrency)
+            resolved = {}
+            for (imdb_id, _), (definitive, details) in zip(misses, fetched):
+                results[imdb_id] = details
+                if definitive:
+                    self.put(imdb_id, details)
+                    resolved[imdb_id] = details
+            if resolved and self.connect:
+                await asyncio.to_thread(self._store_db, resolved)
+        except Exception as e:
+            logger.error(f"❌ Error resolving TMDB batch: {e}")
+        finally:
+            for imdb_id, _ in batch:
+                future = self._inflight.pop(imdb_id, None)
+                if future is not None and not future.done():
+                    future.set_result(results.get(imdb_id))
+
+    async def fetch(self, imdb_id: str, program_type: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(definitive, details) from TMDB; definitive is False when the answer shouldn't be cached"""
+        try:
+            response = await self.client.get(f"/find/{imdb_id}",
+                                              params={"api_key": self.api_key, "external_source": "imdb_id"})
+            if response.status_code != 200:
+                logger.error(f"❌ TMDB find error for {imdb_id}: {response.status_code} - {response.text}")
+                self.stats["errors"] += 1
+                return False, None
+            found = response.json()
+            # Prefer the agent's program type, but a "show" TMDB files as a movie (or vice versa) still matches
+            media_types = ("movie", "tv") if program_type == "movie" else ("tv", "movie")
+            media_type, match = next(((media, found[f"{media}_results"][0]) for media in media_types
+                                      if found.get(f"{media}_results")), (None, None))
+            if match is None:
+                self.stats["not_found"] += 1
+                return True, None
+
+            response = await self.client.get(f"/{media_type}/{match['id']}",
+                                              params={"api_key": self.api_key, "append_to_response": "credits"})
+            if response.status_code != 200:
+                logger.error(f"❌ TMDB {media_type} details error for {imdb_id}: {response.status_code} - {response.text}")
+                self.stats["errors"] += 1
+                return False, None
+            self.stats["fetched"] += 1
+            return True, summarize_details(response.json(), media_type, match["id"])
+        except Exception as e:
+            logger.error(f"❌ Error calling TMDB for {imdb_id}: {e}")
+            self.stats["errors"] += 1
+            return False, None
+
+    def _fetch_db(self, imdb_ids: List[str]) -> Dict[str, Tuple[Optional[Dict[str, Any]], float]]:
+        """Fresh cached rows for imdb_ids in one query: imdb_id -> (details, seconds of TTL left)"""
+        conn = self.connect()
+        if not conn:
+            return {}
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                SELECT imdb_id, details,
+                       CASE WHEN details IS NULL THEN %s ELSE %s END - extract(epoch FROM now() - fetched_at) AS ttl_left
+                FROM {self.schema}.{self.table}
+                WHERE imdb_id = ANY(%s)
+                """, (self.not_found_ttl_seconds, self.ttl_seconds, imdb_ids))
+                rows = cur.fetchall()
+            return {imdb_id: (details, float(ttl_left)) for imdb_id, details, ttl_left in rows if ttl_left > 0}
+        except Exception as e:
+            logger.error(f"❌ Error reading TMDB cache: {e}")
+            return {}
+        finally:
+            conn.close()
+
+    def _store_db(self, resolved: Dict[str, Optional[Dict[str, Any]]]):
+        conn = self.connect()
+        if not conn:
+            return
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                INSERT INTO {self.schema}.{self.table} (imdb_id, details)
+                SELECT t.imdb_id, t.details FROM unnest(%s::text[], %s::jsonb[]) AS t(imdb_id, details)
+                ON CONFLICT (imdb_id) DO UPDATE SET
+                    details = EXCLUDED.details,
+                    fetched_at = now()
+                """, (list(resolved), [json.dumps(d) if d is not None else None for d in resolved.values()]))
+            conn.commit()
+        except Exception as e:
+            logger.error(f"❌ Error writing TMDB cache: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "size": len(self._entries), "max_size": self.max_size, "in_flight": len(self._inflight),
+                "available": self.available}
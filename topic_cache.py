@@ -0,0 +1,181 @@
+"""
+Topic resolution cache for merger ingest_topic calls
+Maps (title, program_type, imdb_id) to the merger topic_id so repeat matches of
+the same program skip ingest_topic. Entries live in a bounded LRU with a TTL and
+can optionally be backed by a Postgres mapping table shared across workers.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app_logging import get_logger
+
+logger = get_logger("topic_cache")
+
+# Topic cache configuration
+TOPIC_CACHE_CONFIG = {
+    "max_size": int(os.getenv("TOPIC_CACHE_MAX_SIZE", "10000")),
+    "ttl_seconds": float(os.getenv("TOPIC_CACHE_TTL", "86400")),
+    "persist": os.getenv("TOPIC_CACHE_PERSIST", "0") in ("1", "true", "True"),
+    "table": "topic_cache",
+}
+
+TopicKey = Tuple[str, str, str]
+
+
+def topic_cache_key(program: Dict[str, Any]) -> TopicKey:
+    """Cache key for an agent program; titles are normalized so casing/spacing variants share an entry"""
+    title = " ".join(str(program.get('title', '')).lower().split())
+    return title, program.get('program_type', 'movie') or 'movie', program.get('imdb_id', '') or ''
+
+
+def ensure_topic_cache_table(conn, schema: str, table: str = TOPIC_CACHE_CONFIG["table"]):
+    """Create the persistent (title, program_type, imdb_id) -> topic_id mapping"""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.{table} (
+            title TEXT NOT NULL,
+            program_type TEXT NOT NULL,
+            imdb_id TEXT NOT NULL DEFAULT '',
+            topic_id TEXT NOT NULL,  -- JSON-encoded so ints come back as ints
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (title, program_type, imdb_id)
+        )
+        """)
+    conn.commit()
+
+
+class TopicCache:
+    """LRU + TTL cache of topic ids with in-flight request coalescing"""
+
+    def __init__(self, max_size: int = None, ttl_seconds: float = None, connect: Callable[[], Any] = None,
+                 schema: str = None, table: str = None):
+        """
+        Args:
+            max_size: Maximum in-memory entries before least recently used ones are evicted
+            ttl_seconds: How long a topic_id is trusted before ingest_topic is called again
+            connect: Returns a DB connection; when given, the Postgres mapping table is consulted on misses
+            schema: Schema holding the mapping table
+        """
+        self.max_size = max_size or TOPIC_CACHE_CONFIG["max_size"]
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else TOPIC_CACHE_CONFIG["ttl_seconds"]
+        self.connect = connect
+        self.schema = schema
+        self.table = table or TOPIC_CACHE_CONFIG["table"]
+
+        self._entries: "OrderedDict[TopicKey, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[TopicKey, asyncio.Future] = {}
+        self.stats = {"hits": 0, "db_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def get(self, key: TopicKey) -> Optional[Any]:
+        """Return a fresh in-memory topic_id, refreshing its LRU position"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        topic_id, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return topic_id
+
+    def put(self, key: TopicKey, topic_id: Any):
+        self._entries[key] = (topic_id, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    async def resolve(self, key: TopicKey, ingest: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """Return the topic_id for key, calling ingest() only on a miss
+
+        Concurrent callers for the same key share a single ingest() call. Failed
+        lookups (None) are not cached.
+        """
+        topic_id = self.get(key)
+        if topic_id is not None:
+            self.stats["hits"] += 1
+            return topic_id
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            topic_id = await self._lookup_db(key) if self.connect else None
+            if topic_id is not None:
+                self.stats["db_hits"] += 1
+            else:
+                self.stats["misses"] += 1
+                topic_id = await ingest()
+                if topic_id is not None and self.connect:
+                    await asyncio.to_thread(self._store_db, key, topic_id)
+            if topic_id is not None:
+                self.put(key, topic_id)
+            future.set_result(topic_id)
+            return topic_id
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception retrieved so asyncio doesn't warn
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _lookup_db(self, key: TopicKey) -> Optional[Any]:
+        return await asyncio.to_thread(self._fetch_db, key)
+
+    def _fetch_db(self, key: TopicKey) -> Optional[Any]:
+        conn = self.connect()
+        if not conn:
+            return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                SELECT topic_id FROM {self.schema}.{self.table}
+                WHERE title = %s AND program_type = %s AND imdb_id = %s
+                  AND updated_at > now() - make_interval(secs => %s)
+                """, (*key, self.ttl_seconds))
+                row = cur.fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            logger.error(f"❌ Error reading topic cache: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def _store_db(self, key: TopicKey, topic_id: Any):
+        conn = self.connect()
+        if not conn:
+            return
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                INSERT INTO {self.schema}.{self.table} (title, program_type, imdb_id, topic_id)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (title, program_type, imdb_id) DO UPDATE SET
+                    topic_id = EXCLUDED.topic_id,
+                    updated_at = now()
+                """, (*key, json.dumps(topic_id)))
+            conn.commit()
+        except Exception as e:
+            logger.error(f"❌ Error writing topic cache: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "size": len(self._entries), "max_size": self.max_size}
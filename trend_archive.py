@@ -0,0 +1,117 @@
+"""
+Columnar archive of Google Trends snapshots
+Each ingested export is written as a zstd-compressed Parquet file under
+<dir>/date=YYYY-MM-DD/geo=XX/, named after its capture time, so backfills and
+re-ingests read the archive instead of scraping again. Readers memory-map the
+files and can load just the columns they need.
+"""
+
+import importlib.util
+import os
+import re
+import uuid
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Trend archive configuration
+TREND_ARCHIVE_CONFIG = {
+    # pyarrow itself is only imported when a snapshot is written or read
+    "enabled": importlib.util.find_spec("pyarrow") is not None and os.getenv("TREND_ARCHIVE", "1") not in ("0", "false", "False"),
+    "dir": os.getenv("TREND_ARCHIVE_DIR", "archive"),
+    "compression": os.getenv("TREND_ARCHIVE_COMPRESSION", "zstd"),
+    # Set TREND_ARCHIVE_KEEP_CSV=0 to delete the downloaded CSV once its rows are saved and archived
+    "keep_csv": os.getenv("TREND_ARCHIVE_KEEP_CSV", "1") not in ("0", "false", "False"),
+}
+
+SNAPSHOT_NAME = re.compile(r"^snapshot-(\d{8}T\d{6}\d{6}Z)-[0-9a-f]+\.parquet$")
+CAPTURED_AT_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("pyarrow is required for the trend archive")
+    return pa, pq
+
+
+def archive_snapshot(df, captured_at: datetime, geo: str, directory: str = None) -> str:
+    """Write one export (a DataFrame with the CSV columns) to its date/geo partition; returns the file path"""
+    pa, pq = _require_pyarrow()
+    captured_at = captured_at.astimezone(timezone.utc)
+    partition = os.path.join(directory or TREND_ARCHIVE_CONFIG["dir"],
+                             f"date={captured_at:%Y-%m-%d}", f"geo={geo}")
+    os.makedirs(partition, exist_ok=True)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"captured_at": captured_at.isoformat().encode(),
+        b"geo": geo.encode(),
+    })
+    name = f"snapshot-{captured_at.strftime(CAPTURED_AT_FORMAT)}-{uuid.uuid4().hex[:8]}.parquet"
+    path = os.path.join(partition, name)
+    # Write then rename so readers never see a half-written file
+    pq.write_table(table, path + ".tmp", compression=TREND_ARCHIVE_CONFIG["compression"])
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def list_snapshots(date_from: Optional[date] = None, date_to: Optional[date] = None, geo: Optional[str] = None,
+                   directory: str = None) -> List[Dict[str, Any]]:
+    """Archived snapshots in capture order, pruned by partition directory names without opening files"""
+    root = directory or TREND_ARCHIVE_CONFIG["dir"]
+    if not os.path.isdir(root):
+        return []
+    snapshots = []
+    for date_dir in os.listdir(root):
+        if not date_dir.startswith("date="):
+            continue
+        try:
+            day = date.fromisoformat(date_dir[len("date="):])
+        except ValueError:
+            continue
+        if (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        for geo_dir in os.listdir(os.path.join(root, date_dir)):
+            if not geo_dir.startswith("geo=") or (geo and geo_dir != f"geo={geo}"):
+                continue
+            partition = os.path.join(root, date_dir, geo_dir)
+            for name in os.listdir(partition):
+                match = SNAPSHOT_NAME.match(name)
+                if not match:
+                    continue
+                path = os.path.join(partition, name)
+                captured_at = datetime.strptime(match.group(1), CAPTURED_AT_FORMAT).replace(tzinfo=timezone.utc)
+                snapshots.append({
+                    "path": path,
+                    "date": day.isoformat(),
+                    "geo": geo_dir[len("geo="):],
+                    "captured_at": captured_at,
+                    "bytes": os.path.getsize(path),
+                })
+    return sorted(snapshots, key=lambda s: s["captured_at"])
+
+
+def read_snapshot(path: str, columns: Optional[List[str]] = None):
+    """Memory-mapped read of one archived snapshot as a pyarrow Table (only `columns` if given)"""
+    _, pq = _require_pyarrow()
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+
+def read_archive(date_from: Optional[date] = None, date_to: Optional[date] = None, geo: Optional[str] = None,
+                 columns: Optional[List[str]] = None, directory: str = None):
+    """All matching snapshots as one Table with captured_at, date and geo columns added"""
+    pa, _ = _require_pyarrow()
+    tables = []
+    for snapshot in list_snapshots(date_from, date_to, geo, directory):
+        table = read_snapshot(snapshot["path"], columns)
+        rows = table.num_rows
+        table = table.append_column("captured_at", pa.array([snapshot["captured_at"]] * rows, pa.timestamp("us", tz="UTC")))
+        table = table.append_column("date", pa.array([snapshot["date"]] * rows, pa.string()))
+        table = table.append_column("geo", pa.array([snapshot["geo"]] * rows, pa.string()))
+        tables.append(table)
+    if not tables:
+        return None
+    return pa.concat_tables(tables, promote_options="default")
@@ -0,0 +1,180 @@
+"""
+Near-duplicate clustering of pending trends
+Google Trends often lists several variants of one topic ("dune part two",
+"dune 2 release", "dune showtimes"). Each trend's text (`trends` plus its
+`trend_breakdown`) is reduced to word shingles, leaving out filler words such as
+"release", "trailer" or "cast" that every breakdown repeats, summarised by a
+MinHash signature and bucketed with LSH banding. A candidate joins a cluster only
+if its Jaccard similarity with the cluster's first member clears the threshold,
+so one loose link never chains unrelated trends together. Off by default: the
+agent runs once per cluster and its result is recorded for every member.
+"""
+
+import functools
+import os
+import re
+import zlib
+from typing import Any, Dict, List, Sequence, Set
+
+# Trend clustering configuration
+CLUSTERING_CONFIG = {
+    "enabled": os.getenv("TREND_CLUSTERING", "0") in ("1", "true", "True"),
+    "threshold": float(os.getenv("TREND_CLUSTER_THRESHOLD", "0.5")),
+    "num_perm": int(os.getenv("TREND_CLUSTER_NUM_PERM", "128")),
+    # LSH bands of num_perm // bands rows; more bands catch lower similarities
+    "bands": int(os.getenv("TREND_CLUSTER_BANDS", "64")),
+    # Character n-grams of each word (0 = words only); short ones link unrelated titles
+    "char_ngram": int(os.getenv("TREND_CLUSTER_CHAR_NGRAM", "0")),
+    "seed": 1,
+}
+
+# Mersenne prime 2**31 - 1 keeps a * hash + b within uint64
+_PRIME = (1 << 31) - 1
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+# Words Google Trends breakdowns attach to any title; they say nothing about which program it is
+STOP_WORDS = frozenset("""
+a an and at for in is of on the to vs with
+release released date dates time times trailer teaser cast actors review reviews rating ratings
+showtimes tickets near me movie movies film show series season episode episodes part full watch
+stream streaming online free new news netflix hulu prime video disney max hbo apple tv ending explained
+""".split()) | frozenset(w for w in os.getenv("TREND_CLUSTER_STOP_WORDS", "").lower().split(",") if w)
+
+_NUMBER_WORDS = {"one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+                 "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10"}
+
+
+def trend_text(trend: Dict[str, Any]) -> str:
+    """Title and breakdown of a google_trends row as one string"""
+    breakdown = trend.get("trend_breakdown") or []
+    if isinstance(breakdown, str):
+        breakdown = [breakdown]
+    return " ".join([str(trend.get("trends") or "")] + [str(item) for item in breakdown])
+
+
+def trend_keywords(trend: Dict[str, Any]) -> str:
+    """The keyword line the frontend sends for a trend: its breakdown, else its title"""
+    breakdown = trend.get("trend_breakdown") or []
+    if isinstance(breakdown, str):
+        return breakdown or str(trend.get("trends") or "")
+    return ", ".join(str(item) for item in breakdown) or str(trend.get("trends") or "")
+
+
+def shingles(text: str, n: int = None) -> Set[str]:
+    """Word unigrams and bigrams of the text without stop words ("two" reads as "2"), plus optional character n-grams"""
+    n = CLUSTERING_CONFIG["char_ngram"] if n is None else n
+    words = [_NUMBER_WORDS.get(word, word) for word in _TOKEN.findall(text.lower()) if word not in STOP_WORDS]
+    result = set(words)
+    result.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    if n > 0:
+        for word in words:
+            padded = f" {word} "
+            result.update(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return result
+
+
+class MinHasher:
+    """MinHash signatures from universal hashes (a * x + b) mod p over crc32 shingle hashes"""
+
+    def __init__(self, num_perm: int = None, seed: int = None):
+        import numpy as np
+
+        self.num_perm = num_perm or CLUSTERING_CONFIG["num_perm"]
+        rng = np.random.default_rng(CLUSTERING_CONFIG["seed"] if seed is None else seed)
+        self._a = rng.integers(1, _PRIME, self.num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, self.num_perm, dtype=np.uint64)
+
+    def signatures(self, token_sets: Sequence[Set[str]]):
+        """One signature row per token set, computed for all sets in a single pass"""
+        import numpy as np
+
+        sizes = np.array([len(tokens) for tokens in token_sets])
+        # crc32 rather than the salted built-in hash keeps clusters stable across processes
+        hashes = np.fromiter((zlib.crc32(t.encode("utf-8")) % _PRIME for tokens in token_sets for t in tokens),
+                             dtype=np.uint64, count=int(sizes.sum()))
+        # One row per shingle, one column per permutation; each set's column minima are its signature
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME
+        result = np.full((len(token_sets), self.num_perm), _PRIME, dtype=np.uint64)
+        present = sizes > 0
+        if present.any():
+            starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[present]
+            result[present] = np.minimum.reduceat(permuted, starts, axis=0)
+        return result
+
+
+@functools.lru_cache(maxsize=1)
+def _hasher() -> MinHasher:
+    return MinHasher()
+
+
+def _candidate_pairs(signatures, bands: int):
+    """Unique (i, j) index pairs, i < j, that share at least one LSH band"""
+    import numpy as np
+
+    count, num_perm = signatures.shape
+    rows = num_perm // bands
+    # Fold each band's rows into one uint64 key (wrapping); a rare collision only adds a candidate
+    weights = np.random.default_rng(CLUSTERING_CONFIG["seed"]).integers(1, 1 << 63, rows, dtype=np.uint64) | np.uint64(1)
+    keys = (signatures[:, :bands * rows].reshape(count, bands, rows) * weights).sum(axis=2)
+
+    # Sort every (band, key) bucket entry; items sharing a bucket end up adjacent
+    band_ids = np.broadcast_to(np.arange(bands), (count, bands)).ravel()
+    items = np.broadcast_to(np.arange(count)[:, None], (count, bands)).ravel()
+    order = np.lexsort((items, keys.ravel(), band_ids))
+    sorted_keys, sorted_bands, items = keys.ravel()[order], band_ids[order], items[order]
+    new_bucket = np.ones(len(order), dtype=bool)
+    new_bucket[1:] = (sorted_keys[1:] != sorted_keys[:-1]) | (sorted_bands[1:] != sorted_bands[:-1])
+    starts = np.maximum.accumulate(np.where(new_bucket, np.arange(len(order)), 0))
+
+    # Pair each entry with every earlier entry of its bucket
+    partners = np.arange(len(order)) - starts
+    total = int(partners.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    right = np.repeat(np.arange(len(order)), partners)
+    left = np.repeat(starts, partners) + np.arange(total) - np.repeat(np.cumsum(partners) - partners, partners)
+    # items are ascending within a bucket, so every pair is already (low, high)
+    encoded = np.unique(items[left] * count + items[right])
+    return encoded // count, encoded % count
+
+
+def cluster_trends(trends: Sequence[Dict[str, Any]], threshold: float = None) -> List[List[Dict[str, Any]]]:
+    """Group near-duplicate trends; clusters keep the input order, as do members within each cluster"""
+    if len(trends) < 2:
+        return [[trend] for trend in trends]
+    threshold = CLUSTERING_CONFIG["threshold"] if threshold is None else threshold
+    token_sets = [shingles(trend_text(trend)) for trend in trends]
+    hasher = _hasher()
+    signatures = hasher.signatures(token_sets)
+
+    # LSH only proposes pairs; their exact Jaccard similarity decides
+    left, right = _candidate_pairs(signatures, max(1, min(CLUSTERING_CONFIG["bands"], hasher.num_perm)))
+    similar: Dict[int, Set[int]] = {}
+    for i, j in zip(left.tolist(), right.tolist()):
+        a, b = token_sets[i], token_sets[j]
+        # Trends without any text have identical placeholder signatures but nothing in common
+        if a and b and len(a & b) >= threshold * len(a | b):
+            similar.setdefault(j, set()).add(i)
+
+    # Each trend joins the first earlier cluster whose representative (first member) it resembles
+    representatives: List[int] = []
+    clusters: Dict[int, List[Dict[str, Any]]] = {}
+    for j, trend in enumerate(trends):
+        matches = similar.get(j, ())
+        representative = next((i for i in representatives if i in matches), None)
+        if representative is None:
+            representatives.append(j)
+            representative = j
+        clusters.setdefault(representative, []).append(trend)
+    return list(clusters.values())
+
+
+def cluster_keywords(cluster: Sequence[Dict[str, Any]]) -> List[str]:
+    """Agent keywords for a cluster: the highest-volume member's line, then the other distinct lines"""
+    ordered = sorted(cluster, key=lambda trend: trend.get("search_volume") or 0, reverse=True)
+    keywords: List[str] = []
+    for trend in ordered:
+        line = trend_keywords(trend)
+        if line and line not in keywords:
+            keywords.append(line)
+    return keywords
@@ -0,0 +1,187 @@
+"""
+Search-volume history for google_trends
+google_trends only keeps the latest scrape of each trend, so every CSV import
+also appends one (trend_id, captured_at, search_volume, trend_ended) point per
+row to an append-only history table in a single statement. Velocity (volume
+change per hour) and acceleration (velocity change per hour) of each trend's
+latest point are kept up to date at import time in a one-row-per-trend summary
+table, so ranking never reads the history; a single trend's series is computed
+with vectorized pandas group diffs.
+"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Trend history configuration
+TREND_HISTORY_CONFIG = {
+    "table": "google_trends_history",
+    # Latest point, velocity and acceleration per trend
+    "growth_table": "trend_growth",
+    # Points per trend needed for the latest velocity and acceleration
+    "ranking_points": 3,
+    "max_points": int(os.getenv("TREND_HISTORY_MAX_POINTS", "1000")),
+}
+
+GROWTH_SORTS = ("velocity", "acceleration", "search_volume")
+
+
+def ensure_history_table(conn, schema: str, table: str = TREND_HISTORY_CONFIG["table"]):
+    with conn.cursor() as cur:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.{table} (
+            trend_id INTEGER NOT NULL,
+            captured_at TIMESTAMPTZ NOT NULL,
+            search_volume INTEGER NOT NULL,
+            trend_ended TIMESTAMPTZ,
+            PRIMARY KEY (trend_id, captured_at)
+        )
+        """)
+        growth = TREND_HISTORY_CONFIG["growth_table"]
+        cur.execute(f"SELECT to_regclass(%s) IS NULL", (f"{schema}.{growth}",))
+        backfill = cur.fetchone()[0]
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.{growth} (
+            trend_id INTEGER PRIMARY KEY,
+            captured_at TIMESTAMPTZ NOT NULL,
+            search_volume INTEGER NOT NULL,
+            velocity DOUBLE PRECISION,
+            acceleration DOUBLE PRECISION
+        )
+        """)
+        for sort in GROWTH_SORTS:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {growth}_{sort}_idx ON {schema}.{growth} ({sort} DESC NULLS LAST)")
+    conn.commit()
+    if backfill:
+        rebuild_growth(conn, schema, table)
+
+
+def rebuild_growth(conn, schema: str, table: str = TREND_HISTORY_CONFIG["table"]):
+    """Recompute the growth summary from the full history, e.g. after replaying older snapshots"""
+    growth = TREND_HISTORY_CONFIG["growth_table"]
+    with conn.cursor() as cur:
+        cur.execute(f"""
+        WITH recent AS (
+            SELECT trend_id, captured_at, search_volume::float8 AS search_volume,
+                   row_number() OVER (PARTITION BY trend_id ORDER BY captured_at DESC) AS rn
+            FROM {schema}.{table}
+        ), rates AS (
+            SELECT *, (search_volume - lead(search_volume) OVER w) / nullif(hours, 0) AS velocity
+            FROM (
+                SELECT *, extract(epoch FROM captured_at - lead(captured_at) OVER w)::float8 / 3600 AS hours
+                FROM recent WHERE rn <= %s
+                WINDOW w AS (PARTITION BY trend_id ORDER BY captured_at DESC)
+            ) spaced
+            WINDOW w AS (PARTITION BY trend_id ORDER BY captured_at DESC)
+        )
+        SELECT trend_id, captured_at, search_volume, velocity, acceleration FROM (
+            SELECT *, (velocity - lead(velocity) OVER w) / nullif(hours, 0) AS acceleration
+            FROM rates WINDOW w AS (PARTITION BY trend_id ORDER BY captured_at DESC)
+        ) latest WHERE rn = 1
+        """, (TREND_HISTORY_CONFIG["ranking_points"],))
+        rows = cur.fetchall()
+        cur.execute(f"TRUNCATE {schema}.{growth}")
+        if rows:
+            from psycopg2.extras import execute_values
+
+            execute_values(cur, f"INSERT INTO {schema}.{growth} VALUES %s", rows, page_size=5000)
+    conn.commit()
+
+
+def record_snapshot(cursor, schema: str, points: Sequence[Tuple[int, int, Any]], captured_at: datetime,
+                    table: str = TREND_HISTORY_CONFIG["table"]):
+    """Append one history point per (trend_id, search_volume, trend_ended) in a single INSERT"""
+    if not points:
+        return
+    trend_ids, volumes, ended = zip(*points)
+    cursor.execute(f"""
+    INSERT INTO {schema}.{table} (trend_id, captured_at, search_volume, trend_ended)
+    SELECT t.trend_id, %s, t.search_volume, t.trend_ended
+    FROM unnest(%s::integer[], %s::integer[], %s::timestamptz[]) AS t(trend_id, search_volume, trend_ended)
+    ON CONFLICT (trend_id, captured_at) DO NOTHING
+    """, (captured_at, list(trend_ids), list(volumes), list(ended)))
+    # Advance each trend's summary from its previous latest point; older (replayed) snapshots leave it alone
+    cursor.execute(f"""
+    INSERT INTO {schema}.{TREND_HISTORY_CONFIG["growth_table"]} AS g
+        (trend_id, captured_at, search_volume, velocity, acceleration)
+    SELECT t.trend_id, %(at)s, t.search_volume, r.velocity, (r.velocity - prev.velocity) / nullif(r.hours, 0)
+    FROM (SELECT DISTINCT ON (trend_id) * FROM unnest(%(ids)s::integer[], %(volumes)s::integer[])
+          AS u(trend_id, search_volume)) t
+    LEFT JOIN {schema}.{TREND_HISTORY_CONFIG["growth_table"]} prev
+        ON prev.trend_id = t.trend_id AND prev.captured_at < %(at)s
+    CROSS JOIN LATERAL (
+        SELECT extract(epoch FROM %(at)s - prev.captured_at)::float8 / 3600 AS hours
+    ) h
+    CROSS JOIN LATERAL (
+        SELECT h.hours, (t.search_volume - prev.search_volume)::float8 / nullif(h.hours, 0) AS velocity
+    ) r
+    ON CONFLICT (trend_id) DO UPDATE SET
+        captured_at = EXCLUDED.captured_at,
+        search_volume = EXCLUDED.search_volume,
+        velocity = EXCLUDED.velocity,
+        acceleration = EXCLUDED.acceleration
+    WHERE g.captured_at < EXCLUDED.captured_at
+    """, {"at": captured_at, "ids": list(trend_ids), "volumes": list(volumes)})
+
+
+def add_growth_columns(df):
+    """Add velocity and acceleration (per hour) columns to points sorted by trend_id, captured_at"""
+    import numpy as np
+
+    by_trend = df.groupby("trend_id", sort=False)
+    hours = by_trend["captured_at"].diff().dt.total_seconds() / 3600.0
+    df["velocity"] = by_trend["search_volume"].diff() / hours
+    df["acceleration"] = df.groupby("trend_id", sort=False)["velocity"].diff() / hours
+    df[["velocity", "acceleration"]] = df[["velocity", "acceleration"]].replace([np.inf, -np.inf], np.nan)
+    return df
+
+
+def _records(df) -> List[Dict[str, Any]]:
+    # NaN (first points of a series) becomes null in the JSON response
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def growth_ranking(conn, schema: str, sort: str = "velocity", limit: int = 50, category: Optional[str] = None,
+                   table: str = TREND_HISTORY_CONFIG["table"]) -> List[Dict[str, Any]]:
+    """Trends ranked by their latest velocity/acceleration, read from the growth summary maintained at import"""
+    if sort not in GROWTH_SORTS:
+        raise ValueError(f"Unknown growth sort: {sort}")
+    params: List[Any] = []
+    category_filter = ""
+    if category:
+        category_filter = "WHERE gt.category = %s"
+        params.append(category)
+    params.append(limit)
+    with conn.cursor() as cur:
+        # Walks the summary's index on the sort column; no per-request pass over the history
+        cur.execute(f"""
+        SELECT g.trend_id, gt.trends, gt.category, g.captured_at AS last_captured_at, g.search_volume,
+               g.velocity, g.acceleration
+        FROM {schema}.{TREND_HISTORY_CONFIG["growth_table"]} g
+        JOIN {schema}.google_trends gt ON gt.id = g.trend_id
+        {category_filter}
+        ORDER BY g.{sort} DESC NULLS LAST, g.trend_id
+        LIMIT %s
+        """, params)
+        columns = [desc[0] for desc in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def trend_series(conn, schema: str, trend_id: int,
+                 table: str = TREND_HISTORY_CONFIG["table"]) -> List[Dict[str, Any]]:
+    """A trend's history points (most recent max_points) with velocity and acceleration at each point"""
+    import pandas as pd
+
+    with conn.cursor() as cur:
+        cur.execute(f"""
+        SELECT trend_id, captured_at, search_volume, trend_ended FROM (
+            SELECT * FROM {schema}.{table} WHERE trend_id = %s ORDER BY captured_at DESC LIMIT %s
+        ) recent ORDER BY captured_at
+        """, (trend_id, TREND_HISTORY_CONFIG["max_points"]))
+        rows = cur.fetchall()
+    if not rows:
+        return []
+
+    df = pd.DataFrame(rows, columns=["trend_id", "captured_at", "search_volume", "trend_ended"])
+    df["captured_at"] = pd.to_datetime(df["captured_at"], utc=True)
+    return _records(add_growth_columns(df))
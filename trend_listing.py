@@ -0,0 +1,131 @@
+"""
+Keyset-paginated and streaming access to google_trends
+Trends are listed newest first by (trend_ended, trend_started, id), with trends
+that haven't ended yet at the top. Pages are addressed by an opaque cursor
+encoding the last row's key, so deep pages cost the same as the first one, and
+the NDJSON stream reads through a server-side named cursor in fixed batches so
+memory stays flat however many rows are sent.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from fast_json import dumps_bytes
+from trend_partitions import index_concurrently
+
+# Trend listing configuration
+TREND_LISTING_CONFIG = {
+    "default_limit": int(os.getenv("TRENDS_PAGE_SIZE", "50")),
+    "max_limit": int(os.getenv("TRENDS_MAX_PAGE_SIZE", "500")),
+    "stream_batch": int(os.getenv("TRENDS_STREAM_BATCH", "500")),
+}
+
+# Ongoing trends (no trend_ended) sort as if they end at infinity, i.e. first
+SORT_KEY = "coalesce(gt.trend_ended, 'infinity'), gt.trend_started, gt.id"
+ORDER_BY = "coalesce(gt.trend_ended, 'infinity') desc, gt.trend_started desc, gt.id desc"
+
+Keyset = Tuple[str, str, int]
+
+
+def ensure_listing_index(conn, schema: str):
+    """Index matching the listing order so each page is a short index range scan"""
+    conn.autocommit = True
+    concurrently = index_concurrently(conn, schema, "google_trends")
+    with conn.cursor() as cur:
+        cur.execute(f"""
+        CREATE INDEX {concurrently} IF NOT EXISTS google_trends_listing_idx
+        ON {schema}.google_trends ((coalesce(trend_ended, 'infinity')), trend_started, id)
+        """)
+
+
+def _iso(value: Any) -> str:
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just past this row"""
+    ended = _iso(row["trend_ended"]) if row.get("trend_ended") is not None else "infinity"
+    raw = json.dumps([ended, _iso(row["trend_started"]), row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Keyset:
+    """Parse a cursor from encode_cursor; raises ValueError when it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ended, started, trend_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return str(ended), str(started), int(trend_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def listing_query(schema: str, category: Optional[str] = None, pending: bool = False,
+                  after: Optional[Keyset] = None, limit: Optional[int] = None) -> Tuple[str, List[Any]]:
+    """SQL and parameters for trends in listing order, starting after the `after` keyset"""
+    clauses, params = [], []
+    if category:
+        clauses.append("gt.category = %s")
+        params.append(category)
+    if pending:
+        clauses.append(f"NOT EXISTS (SELECT 1 FROM {schema}.trends_to_topics tt WHERE tt.google_trend_id = gt.id)")
+    if after is not None:
+        clauses.append(f"({SORT_KEY}) < (%s, %s, %s)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = f"SELECT gt.* FROM {schema}.google_trends gt {where} ORDER BY {ORDER_BY}"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+
+def fetch_page(conn, schema: str, limit: int, category: Optional[str] = None, pending: bool = False,
+               after: Optional[Keyset] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of trends and the cursor for the next page (None on the last page)"""
+    from psycopg2.extras import RealDictCursor
+
+    # One extra row tells us whether another page exists without a COUNT
+    query, params = listing_query(schema, category, pending, after, limit + 1)
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def stream_ndjson(connect: Callable[[], Any], schema: str, category: Optional[str] = None,
+                        pending: bool = False, after: Optional[Keyset] = None, limit: Optional[int] = None,
+                        batch_size: int = None) -> AsyncIterator[bytes]:
+    """Yield trends as NDJSON chunks read through a server-side cursor, batch_size rows at a time"""
+    from psycopg2.extras import RealDictCursor
+
+    batch_size = batch_size or TREND_LISTING_CONFIG["stream_batch"]
+    conn = await asyncio.to_thread(connect)
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    cur = None
+    try:
+        cur = conn.cursor(name=f"trends_stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor)
+        cur.itersize = batch_size
+        query, params = listing_query(schema, category, pending, after, limit)
+        await asyncio.to_thread(cur.execute, query, params)
+        while True:
+            rows = await asyncio.to_thread(cur.fetchmany, batch_size)
+            if not rows:
+                break
+            yield b"".join(dumps_bytes(row) + b"\n" for row in rows)
+    finally:
+        await asyncio.to_thread(_close_stream, conn, cur)
+
+
+def _close_stream(conn, cur):
+    try:
+        if cur is not None and not cur.closed:
+            cur.close()
+        conn.rollback()
+    finally:
+        conn.close()
@@ -0,0 +1,358 @@
+"""
+Time-partitioned google_trends / trends_to_topics storage with retention
+Both tables are range-partitioned by trend date (google_trends.trend_started,
+trends_to_topics.date, which holds the same value), one partition per day,
+week or month plus a default partition for anything outside them. Maintenance
+keeps partitions ready ahead of time and applies retention by detaching,
+archiving to Parquet or dropping whole partitions, so no DELETE ever scans the
+table. Pending-trend queries only look at the last few days, which lets the
+planner prune every older partition.
+
+Usage:
+    python trend_partitions.py migrate    # convert the existing tables (stop the backend first)
+    python trend_partitions.py maintain   # create upcoming partitions and apply retention
+    python trend_partitions.py list
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app_logging import get_logger
+
+logger = get_logger("partitions")
+
+# Partitioning configuration
+PARTITION_CONFIG = {
+    # Set at startup from the catalog; the google_trends upsert and the pending window depend on it
+    "partitioned": False,
+    "interval": os.getenv("TREND_PARTITION_INTERVAL", "month"),  # day | week | month
+    # Future partitions kept ready so new rows never land in the default partition
+    "premake": int(os.getenv("TREND_PARTITION_PREMAKE", "2")),
+    # Partitions entirely older than this are retired; 0 keeps everything
+    "retention_days": int(os.getenv("TREND_RETENTION_DAYS", "0")),
+    "retention_mode": os.getenv("TREND_RETENTION_MODE", "detach"),  # detach | archive | drop
+    "archive_dir": os.getenv("TREND_RETENTION_ARCHIVE_DIR", os.path.join("archive", "retention")),
+    "maintenance_interval": float(os.getenv("TREND_PARTITION_MAINTENANCE_INTERVAL", "3600")),
+    # Once partitioned, pending-trend queries only consider trends started this recently; 0 looks at every partition
+    "pending_window_days": float(os.getenv("TREND_PENDING_WINDOW_DAYS", "7")),
+}
+
+# Partitioned tables and their partition key
+PARTITIONED_TABLES = {"google_trends": "trend_started", "trends_to_topics": "date"}
+# Unique constraints of the partitioned tables; each must include the partition key
+UNIQUE_COLUMNS = {
+    "google_trends": [("id", "trend_started")],
+    "trends_to_topics": [("id", "date")],
+}
+# Plain indexes replacing unique keys that cannot include the partition key
+LOOKUP_INDEXES = {"google_trends": [("trends", "category")]}
+# Arrow types of archived columns by Postgres type OID; anything else is archived as text
+_ARROW_TYPES = {
+    16: "bool_", 20: "int64", 21: "int64", 23: "int64", 700: "float64", 701: "float64",
+    25: "string", 1043: "string", 1009: "string[]", 1015: "string[]",
+    1082: "date32", 1114: "timestamp", 1184: "timestamptz",
+}
+
+_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+# Arbitrary constant for the maintenance advisory lock, so only one worker runs it at a time
+_LOCK_KEY = 0x7472656e64
+
+
+def period_start(day: date, interval: str = None) -> date:
+    interval = interval or PARTITION_CONFIG["interval"]
+    if interval == "day":
+        return day
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period(start: date, interval: str = None) -> date:
+    interval = interval or PARTITION_CONFIG["interval"]
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "week":
+        return start + timedelta(days=7)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(table: str, start: date, interval: str = None) -> str:
+    interval = interval or PARTITION_CONFIG["interval"]
+    return f"{table}_p{start:%Y_%m}" if interval == "month" else f"{table}_p{start:%Y_%m_%d}"
+
+
+def pending_window_sql(column: str, slack_days: float = 0) -> str:
+    """Predicate limiting a pending-trend query to recent trend dates on partitioned tables (else constant-true)
+
+    Comparing the partition key with now() lets the executor prune older partitions.
+    """
+    days = float(PARTITION_CONFIG["pending_window_days"])
+    if days <= 0 or not PARTITION_CONFIG["partitioned"]:
+        return "true"
+    return f"{column} >= now() - make_interval(secs => {(days + slack_days) * 86400})"
+
+
+def is_partitioned(conn, schema: str, table: str) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("""
+        SELECT 1 FROM pg_partitioned_table p
+        JOIN pg_class c ON c.oid = p.partrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s
+        """, (schema, table))
+        return cur.fetchone() is not None
+
+
+def index_concurrently(conn, schema: str, table: str) -> str:
+    """"CONCURRENTLY" for plain tables; partitioned tables don't support it (and index each partition instead)"""
+    return "" if is_partitioned(conn, schema, table) else "CONCURRENTLY"
+
+
+def list_partitions(conn, schema: str, table: str) -> List[Dict[str, Any]]:
+    """Attached partitions of table with their [lower, upper) dates, oldest first (default partition last)"""
+    with conn.cursor() as cur:
+        cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = %s AND p.relname = %s
+        """, (schema, table))
+        rows = cur.fetchall()
+    partitions = []
+    for name, bound, estimated_rows in rows:
+        match = _BOUNDS.search(bound or "")
+        partitions.append({
+            "name": name,
+            "default": match is None,
+            "lower": datetime.fromisoformat(match.group(1)).date() if match else None,
+            "upper": datetime.fromisoformat(match.group(2)).date() if match else None,
+            "estimated_rows": max(int(estimated_rows), 0),
+        })
+    return sorted(partitions, key=lambda p: (p["default"], p["lower"] or date.max))
+
+
+def create_partition(cur, schema: str, table: str, column: str, lower: date, upper: date) -> str:
+    """Create and attach the [lower, upper) partition, moving any matching rows out of the default partition"""
+    name = partition_name(table, lower)
+    cur.execute(f"CREATE TABLE {schema}.{name} (LIKE {schema}.{table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cur.execute(f"""
+    WITH moved AS (
+        DELETE FROM {schema}.{table}_default WHERE {column} >= %s AND {column} < %s RETURNING *
+    )
+    INSERT INTO {schema}.{name} SELECT * FROM moved
+    """, (lower, upper))
+    if cur.rowcount:
+        logger.info(f"🗂️ Moved {cur.rowcount} rows from {table}_default into {name}")
+    cur.execute(f"ALTER TABLE {schema}.{table} ATTACH PARTITION {schema}.{name} FOR VALUES FROM (%s) TO (%s)",
+                (lower, upper))
+    return name
+
+
+def ensure_partitions(conn, schema: str, today: date = None) -> List[str]:
+    """Create missing partitions for the current period and `premake` periods ahead"""
+    today = today or datetime.now(timezone.utc).date()
+    created = []
+    with conn.cursor() as cur:
+        for table, column in PARTITIONED_TABLES.items():
+            if not is_partitioned(conn, schema, table):
+                continue
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {schema}.{table}_default PARTITION OF {schema}.{table} DEFAULT")
+            existing = {p["lower"] for p in list_partitions(conn, schema, table) if not p["default"]}
+            lower = period_start(today)
+            last = period_start(today)
+            for _ in range(PARTITION_CONFIG["premake"]):
+                last = next_period(last)
+            while lower <= last:
+                upper = next_period(lower)
+                if lower not in existing:
+                    created.append(create_partition(cur, schema, table, column, lower, upper))
+                lower = upper
+    conn.commit()
+    return created
+
+
+def _arrow_schema(description):
+    import pyarrow as pa
+
+    types = {"string[]": pa.list_(pa.string()), "timestamp": pa.timestamp("us"),
+             "timestamptz": pa.timestamp("us", tz="UTC")}
+    fields = []
+    for column in description:
+        kind = _ARROW_TYPES.get(column.type_code, "string")
+        fields.append(pa.field(column.name, types[kind] if kind in types else getattr(pa, kind)()))
+    return pa.schema(fields)
+
+
+def _archive_partition(conn, schema: str, name: str, batch_size: int = 10000) -> str:
+    """Stream a detached partition to <archive_dir>/<name>.parquet in batches; returns the path"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(PARTITION_CONFIG["archive_dir"], exist_ok=True)
+    path = os.path.join(PARTITION_CONFIG["archive_dir"], f"{name}.parquet")
+    writer = None
+    # Server-side cursor: only one batch of the partition is in memory at a time
+    with conn.cursor(name=f"archive_{name}") as cur:
+        cur.itersize = batch_size
+        cur.execute(f"SELECT * FROM {schema}.{name}")
+        try:
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if writer is None:
+                    arrow_schema = _arrow_schema(cur.description)
+                    text = [i for i, field in enumerate(arrow_schema) if field.type == pa.string()]
+                    writer = pq.ParquetWriter(path + ".tmp", arrow_schema, compression="zstd")
+                if not rows:
+                    break
+                columns = list(zip(*rows))
+                for i in text:
+                    columns[i] = [None if value is None else str(value) for value in columns[i]]
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, arrow_schema)],
+                    schema=arrow_schema))
+        finally:
+            if writer is not None:
+                writer.close()
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def apply_retention(conn, schema: str, today: date = None) -> List[Dict[str, Any]]:
+    """Detach partitions whose whole range is older than retention_days, then archive or drop them per mode"""
+    days = PARTITION_CONFIG["retention_days"]
+    if days <= 0:
+        return []
+    mode = PARTITION_CONFIG["retention_mode"]
+    cutoff = (today or datetime.now(timezone.utc).date()) - timedelta(days=days)
+    retired = []
+    with conn.cursor() as cur:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(conn, schema, table):
+                continue
+            for partition in list_partitions(conn, schema, table):
+                if partition["default"] or partition["upper"] > cutoff:
+                    continue
+                name = partition["name"]
+                cur.execute(f"ALTER TABLE {schema}.{table} DETACH PARTITION {schema}.{name}")
+                result = {"table": table, "partition": name, "lower": partition["lower"].isoformat(),
+                          "upper": partition["upper"].isoformat(), "mode": mode}
+                if mode == "archive":
+                    result["path"] = _archive_partition(conn, schema, name)
+                if mode in ("archive", "drop"):
+                    cur.execute(f"DROP TABLE {schema}.{name}")
+                # Commit per partition so a failure later on keeps what was already retired
+                conn.commit()
+                logger.info(f"🧹 Retired partition {name} ({mode})")
+                retired.append(result)
+    return retired
+
+
+def maintain_partitions(conn, schema: str, today: date = None) -> Optional[Dict[str, Any]]:
+    """Create upcoming partitions and apply retention; None when another worker holds the maintenance lock"""
+    with conn.cursor() as cur:
+        # Partition bounds are UTC dates whatever the server's time zone
+        cur.execute("SET TIME ZONE 'UTC'")
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            conn.commit()
+            return None
+    try:
+        created = ensure_partitions(conn, schema, today)
+        retired = apply_retention(conn, schema, today)
+        return {"created": created, "retired": retired}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+        conn.commit()
+
+
+def migrate_table(conn, schema: str, table: str, column: str) -> int:
+    """Swap table for a range-partitioned copy in one transaction; returns the number of rows copied
+
+    The id sequence is kept; unique keys gain the partition key (UNIQUE_COLUMNS) or become plain indexes (LOOKUP_INDEXES).
+    Indexes created by the backend at startup are recreated on the new table the next time it starts.
+    """
+    old = f"{table}_unpartitioned"
+    with conn.cursor() as cur:
+        cur.execute("SET TIME ZONE 'UTC'")
+        cur.execute(f"LOCK TABLE {schema}.{table} IN ACCESS EXCLUSIVE MODE")
+        cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (f"{schema}.{table}",))
+        sequence = cur.fetchone()[0]
+        cur.execute(f"SELECT min({column})::date, max({column})::date FROM {schema}.{table}")
+        first, last = cur.fetchone()
+
+        cur.execute(f"ALTER TABLE {schema}.{table} RENAME TO {old}")
+        cur.execute(f"""
+        CREATE TABLE {schema}.{table} (LIKE {schema}.{old} INCLUDING DEFAULTS INCLUDING IDENTITY)
+        PARTITION BY RANGE ({column})
+        """)
+        for columns in UNIQUE_COLUMNS[table]:
+            cur.execute(f"ALTER TABLE {schema}.{table} ADD UNIQUE ({', '.join(columns)})")
+        for columns in LOOKUP_INDEXES.get(table, []):
+            cur.execute(f"CREATE INDEX ON {schema}.{table} ({', '.join(columns)})")
+        cur.execute(f"CREATE TABLE {schema}.{table}_default PARTITION OF {schema}.{table} DEFAULT")
+        lower = period_start(first or datetime.now(timezone.utc).date())
+        while first is not None and lower <= last:
+            upper = next_period(lower)
+            cur.execute(f"CREATE TABLE {schema}.{partition_name(table, lower)} PARTITION OF {schema}.{table} "
+                        f"FOR VALUES FROM (%s) TO (%s)", (lower, upper))
+            lower = upper
+
+        cur.execute(f"INSERT INTO {schema}.{table} SELECT * FROM {schema}.{old}")
+        copied = cur.rowcount
+        if sequence:
+            cur.execute("SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+                        (f"{schema}.{table}",))
+            if not cur.fetchone()[0]:
+                # serial: keep the old sequence alive by handing it to the new table
+                cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY {schema}.{table}.id")
+            cur.execute(f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 0) + 1, false) "
+                        f"FROM {schema}.{table}", (f"{schema}.{table}",))
+        cur.execute(f"DROP TABLE {schema}.{old}")
+    conn.commit()
+    return copied
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Manage time-partitioned google_trends storage")
+    parser.add_argument("command", choices=["migrate", "maintain", "list"])
+    args = parser.parse_args()
+
+    from backend_api import DB_CONFIG, get_db_connection
+
+    schema = DB_CONFIG["schema"]
+    conn = get_db_connection()
+    if not conn:
+        return 1
+    try:
+        if args.command == "migrate":
+            for table, column in PARTITIONED_TABLES.items():
+                if is_partitioned(conn, schema, table):
+                    print(f"⏭️ {schema}.{table} is already partitioned")
+                    continue
+                copied = migrate_table(conn, schema, table, column)
+                print(f"✅ Partitioned {schema}.{table} by {column} ({copied} rows)")
+            PARTITION_CONFIG["partitioned"] = True
+            args.command = "maintain"
+        if args.command == "maintain":
+            print(json.dumps(maintain_partitions(conn, schema), indent=2))
+        else:
+            print(json.dumps({table: list_partitions(conn, schema, table) for table in PARTITIONED_TABLES},
+                             indent=2, default=str))
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
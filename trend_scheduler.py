@@ -0,0 +1,359 @@
+"""
+Priority scheduling of pending trend analysis
+Pending trends are scored by search volume, recency and whether they are still
+active, then fed through a weighted-fair queue with one lane per category, so
+agent capacity goes to the biggest live trends first while every category still
+gets its quota share. A background refill loop tops the queue up from the
+database and a fixed pool of workers drains it. With several backend workers
+only the one holding the scheduler's advisory lock refills, so each pending
+trend is queued by one process.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app_logging import get_logger
+from trend_partitions import pending_window_sql
+
+logger = get_logger("scheduler")
+
+
+def parse_quotas(value: str) -> Dict[str, float]:
+    """"Entertainment:3,Sports:1" -> {"Entertainment": 3.0, "Sports": 1.0}"""
+    quotas = {}
+    for part in value.split(","):
+        name, _, weight = part.partition(":")
+        if name.strip():
+            quotas[name.strip()] = float(weight) if weight.strip() else 1.0
+    return quotas
+
+
+# Scheduler configuration
+SCHEDULER_CONFIG = {
+    "enabled": os.getenv("TREND_SCHEDULER", "0") in ("1", "true", "True"),
+    "workers": int(os.getenv("TREND_SCHEDULER_WORKERS", "2")),
+    "poll_interval": float(os.getenv("TREND_SCHEDULER_POLL_INTERVAL", "30")),
+    # Candidates fetched per category on each refill
+    "batch_size": int(os.getenv("TREND_SCHEDULER_BATCH_SIZE", "50")),
+    # Relative share of agent runs per category when several have work queued
+    "quotas": parse_quotas(os.getenv("TREND_SCHEDULER_QUOTAS", "Entertainment:1")),
+    "default_quota": 1.0,
+    # Priority = volume_weight * ln(1 + search_volume) + recency_weight * 2^(-age / half_life) + active_weight * active
+    "volume_weight": float(os.getenv("TREND_PRIORITY_VOLUME_WEIGHT", "1")),
+    "recency_weight": float(os.getenv("TREND_PRIORITY_RECENCY_WEIGHT", "2")),
+    "recency_half_life_hours": float(os.getenv("TREND_PRIORITY_HALF_LIFE_HOURS", "6")),
+    "active_weight": float(os.getenv("TREND_PRIORITY_ACTIVE_WEIGHT", "1.5")),
+    # A trend still pending after its analysis waits retry_delay * 2^(failures - 1) seconds, up to retry_max_delay
+    "retry_delay": float(os.getenv("TREND_SCHEDULER_RETRY_DELAY", "60")),
+    "retry_max_delay": float(os.getenv("TREND_SCHEDULER_RETRY_MAX_DELAY", "3600")),
+}
+
+# Session advisory lock held by the one backend worker allowed to schedule
+_LEADER_LOCK_KEY = 0x7363686564
+
+
+def priority_sql(alias: str = "gt") -> str:
+    """SQL expression for a trend's priority score (see SCHEDULER_CONFIG)"""
+    half_life_seconds = float(SCHEDULER_CONFIG["recency_half_life_hours"]) * 3600
+    return (
+        f"({float(SCHEDULER_CONFIG['volume_weight'])} * ln(1 + greatest(coalesce({alias}.search_volume, 0), 0))"
+        f" + {float(SCHEDULER_CONFIG['recency_weight'])}"
+        # Capped at 60 half-lives (~1e-18): power() raises on underflow for months-old trends
+        f" * power(2, -least(greatest(extract(epoch FROM now() - coalesce({alias}.trend_started, now())), 0)"
+        f" / {half_life_seconds}, 60))"
+        f" + {float(SCHEDULER_CONFIG['active_weight'])}"
+        f" * (coalesce({alias}.trend_ended > now(), true))::int)"
+    )
+
+
+def pending_candidates(conn, schema: str, categories: Sequence[str], per_category: int,
+                       exclude: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+    """The highest-priority pending trends of each category (minus `exclude` ids), each with a `priority` value, best first"""
+    from psycopg2.extras import RealDictCursor
+
+    score = priority_sql("gt")
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""
+        SELECT * FROM (
+            SELECT gt.*, {score} AS priority,
+                   row_number() OVER (PARTITION BY gt.category ORDER BY {score} DESC, gt.id DESC) AS category_rank
+            FROM {schema}.google_trends gt
+            WHERE gt.category = ANY(%s)
+              AND NOT gt.id = ANY(%s)
+              AND {pending_window_sql('gt.trend_started')}
+              AND NOT EXISTS (SELECT 1 FROM {schema}.trends_to_topics tt
+                              WHERE tt.google_trend_id = gt.id AND {pending_window_sql('tt.date', slack_days=1)})
+        ) ranked
+        WHERE category_rank <= %s
+        ORDER BY priority DESC, id DESC
+        """, (list(categories), list(exclude), per_category))
+        rows = cur.fetchall()
+    for row in rows:
+        row.pop("category_rank", None)
+    return rows
+
+
+class WeightedFairQueue:
+    """Per-category priority queues served in proportion to their quotas
+
+    Start-time fair queueing: each category carries a virtual time that advances
+    by 1 / quota per item served, and the non-empty category with the lowest
+    virtual time goes next. A category that was idle resumes at the current
+    virtual time, so it can't bank credit while it had nothing queued.
+    """
+
+    def __init__(self, quotas: Dict[str, float] = None, default_quota: float = None):
+        self.quotas = dict(SCHEDULER_CONFIG["quotas"] if quotas is None else quotas)
+        self.default_quota = default_quota or SCHEDULER_CONFIG["default_quota"]
+        self._lanes: Dict[str, List[Tuple[float, int, Any]]] = {}
+        self._vtime: Dict[str, float] = {}
+        self._now = 0.0
+        self._seq = itertools.count()
+
+    def quota(self, category: str) -> float:
+        return max(self.quotas.get(category, self.default_quota), 1e-6)
+
+    def push(self, category: str, priority: float, item: Any):
+        lane = self._lanes.setdefault(category, [])
+        if not lane:
+            self._vtime[category] = max(self._vtime.get(category, 0.0), self._now)
+        heapq.heappush(lane, (-priority, next(self._seq), item))
+
+    def pop(self) -> Optional[Tuple[str, Any]]:
+        """(category, item) of the next item to serve, or None when empty"""
+        ready = [category for category, lane in self._lanes.items() if lane]
+        if not ready:
+            return None
+        category = min(ready, key=lambda c: (self._vtime[c], -self.quota(c)))
+        _, _, item = heapq.heappop(self._lanes[category])
+        self._now = self._vtime[category]
+        self._vtime[category] += 1.0 / self.quota(category)
+        return category, item
+
+    def __len__(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def depth(self) -> Dict[str, int]:
+        return {category: len(lane) for category, lane in self._lanes.items() if lane}
+
+    def drain(self) -> List[Any]:
+        """Remove and return every queued item"""
+        items = [item for lane in self._lanes.values() for _, _, item in lane]
+        self._lanes.clear()
+        return items
+
+
+class AnalysisScheduler:
+    """Background refill loop plus a worker pool that analyzes pending trends in priority order"""
+
+    def __init__(self, connect: Callable[[], Any], analyze: Callable[[List[Dict[str, Any]]], Awaitable[Any]],
+                 schema: str, group: Callable[[List[Dict[str, Any]]], List[List[Dict[str, Any]]]] = None,
+                 categories: Sequence[str] = None, workers: int = None, poll_interval: float = None,
+                 batch_size: int = None):
+        """
+        Args:
+            connect: Returns a new DB connection (or None when the DB is unavailable)
+            analyze: Async callable that analyzes one work item (a list of trends sharing one agent run)
+            schema: Schema holding google_trends and trends_to_topics
+            group: Splits a category's candidates into work items; one item per trend by default
+            categories: Categories to schedule; defaults to the quota categories
+        """
+        self.connect = connect
+        self.analyze = analyze
+        self.schema = schema
+        self.group = group or (lambda trends: [[trend] for trend in trends])
+        self.categories = list(categories or SCHEDULER_CONFIG["quotas"])
+        self.workers = workers or SCHEDULER_CONFIG["workers"]
+        self.poll_interval = poll_interval if poll_interval is not None else SCHEDULER_CONFIG["poll_interval"]
+        self.batch_size = batch_size or SCHEDULER_CONFIG["batch_size"]
+
+        self.queue = WeightedFairQueue()
+        self.counters = {"analyzed": 0, "failed": 0, "refills": 0, "served": {}}
+        self._scheduled: set = set()  # trend ids queued or being analyzed
+        self._finished: Dict[Any, float] = {}  # trend id -> when its analysis ended
+        self._failures: Dict[Any, Tuple[int, float]] = {}  # trend id -> (failed analyses, retry not before)
+        self._in_flight = 0
+        self._leader_conn = None  # holds the advisory lock while this process schedules
+        self._lost_leadership = False
+        self._tasks: List[asyncio.Task] = []
+        self._wake = asyncio.Event()
+        self._work = asyncio.Event()
+        self._stopping = False
+
+    def start(self):
+        if self._tasks and not all(task.done() for task in self._tasks):
+            return
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self.run())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop refilling and wait for in-flight analyses; queued work is picked up again on the next start"""
+        self._stopping = True
+        self._wake.set()
+        self._work.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self._release_leadership)
+
+    def notify(self):
+        """Refill early, e.g. right after new trends were imported"""
+        self._wake.set()
+
+    async def run(self):
+        while not self._stopping:
+            try:
+                leader = await asyncio.to_thread(self._hold_leadership)
+                if self._lost_leadership:
+                    # Another worker may queue these trends now
+                    self._lost_leadership = False
+                    dropped = self.queue.drain()
+                    self._scheduled.difference_update(trend["id"] for item in dropped for trend in item)
+                if leader:
+                    await self.refill()
+            except Exception as e:
+                logger.error(f"❌ Trend scheduler refill error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def refill(self) -> int:
+        """Queue pending trends not already scheduled; returns the number of work items added"""
+        fetch_started = time.monotonic()
+        # Trends backing off stay out of the query so they don't hold the top slots of their category
+        backing_off = [tid for tid, (_, retry_at) in self._failures.items() if retry_at > fetch_started]
+        candidates = await asyncio.to_thread(self._fetch_candidates, backing_off)
+        fresh: Dict[str, List[Dict[str, Any]]] = {}
+        seen = set()
+        for trend in candidates:
+            seen.add(trend["id"])
+            if trend["id"] in self._scheduled:
+                continue
+            finished_at = self._finished.get(trend["id"])
+            if finished_at is not None:
+                # A trend finished while the query ran may still look pending in its snapshot
+                if finished_at >= fetch_started:
+                    continue
+                # Analyzed before the query started and still pending: its result wasn't recorded
+                self._record_failure(trend["id"], fetch_started)
+                continue
+            fresh.setdefault(trend["category"], []).append(trend)
+        self._finished = {tid: at for tid, at in self._finished.items() if at >= fetch_started}
+        # Forget trends that got recorded (or fell out of the top candidates) after their backoff ran out
+        self._failures = {tid: failure for tid, failure in self._failures.items()
+                          if failure[1] > fetch_started or tid in seen}
+
+        added = 0
+        for category, trends in fresh.items():
+            items = await asyncio.to_thread(self.group, trends)
+            for item in items:
+                priority = max(trend.pop("priority") or 0.0 for trend in item)
+                self._scheduled.update(trend["id"] for trend in item)
+                self.queue.push(category, priority, item)
+                added += 1
+        self.counters["refills"] += 1
+        if added:
+            logger.info(f"🗂️ Scheduled {added} trend analyses: {self.queue.depth()}")
+            self._work.set()
+        return added
+
+    def _record_failure(self, trend_id: Any, now: float):
+        failures = self._failures.get(trend_id, (0, 0.0))[0] + 1
+        delay = min(SCHEDULER_CONFIG["retry_delay"] * 2 ** (failures - 1), SCHEDULER_CONFIG["retry_max_delay"])
+        self._failures[trend_id] = (failures, now + delay)
+        logger.warning(f"⚠️ Trend {trend_id} is still pending after {failures} analyses, retrying in {delay:.0f}s")
+
+    def _hold_leadership(self) -> bool:
+        """Whether this process is the scheduling one, taking the advisory lock if no other process holds it
+
+        The lock lives as long as its connection, so a worker that dies hands scheduling to the next one
+        to poll. Losing the connection also drops whatever was queued (see run).
+        """
+        if self._leader_conn is not None:
+            try:
+                with self._leader_conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                return True
+            except Exception as e:
+                logger.warning(f"⚠️ Trend scheduler lost its lock connection: {e}")
+                self._release_leadership()
+                self._lost_leadership = True
+
+        conn = self.connect()
+        if not conn:
+            return False
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (_LEADER_LOCK_KEY,))
+                row = cur.fetchone()
+            acquired = bool(row and (row["pg_try_advisory_lock"] if isinstance(row, dict) else row[0]))
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        self._leader_conn = conn
+        logger.info("🗂️ Trend scheduler is scheduling for this worker")
+        return True
+
+    def _release_leadership(self):
+        conn, self._leader_conn = self._leader_conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _fetch_candidates(self, exclude: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        conn = self.connect()
+        if not conn:
+            return []
+        try:
+            return pending_candidates(conn, self.schema, self.categories, self.batch_size, exclude)
+        finally:
+            conn.close()
+
+    async def _worker(self):
+        while not self._stopping:
+            next_item = self.queue.pop()
+            if next_item is None:
+                self._work.clear()
+                await self._work.wait()
+                continue
+
+            category, item = next_item
+            self._in_flight += 1
+            try:
+                await self.analyze(item)
+                self.counters["analyzed"] += 1
+                served = self.counters["served"]
+                served[category] = served.get(category, 0) + 1
+            except Exception as e:
+                self.counters["failed"] += 1
+                logger.error(f"❌ Scheduled analysis failed for trends {[t.get('id') for t in item]}: {e}")
+            finally:
+                self._in_flight -= 1
+                # Analyzed trends leave the pending set; ones still pending at the next refill back off
+                finished_at = time.monotonic()
+                for trend in item:
+                    self._scheduled.discard(trend["id"])
+                    self._finished[trend["id"]] = finished_at
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self.queue),
+            "queued_by_category": self.queue.depth(),
+            "in_flight": self._in_flight,
+            "leader": self._leader_conn is not None,
+            "backing_off": sum(1 for _, retry_at in self._failures.values() if retry_at > time.monotonic()),
+            **self.counters,
+            "running": bool(self._tasks) and not all(task.done() for task in self._tasks),
+        }
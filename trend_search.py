@@ -0,0 +1,118 @@
+"""
+Indexed search over google_trends titles and trend_breakdown terms
+A GIN index on a weighted tsvector of `trends` (weight A) and the
+`trend_breakdown` array (weight B) answers term and prefix lookups without a
+table scan. When the pg_trgm extension is available, a trigram index on
+`trends` adds typo-tolerant title matches, and their similarity counts toward
+the rank.
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from trend_partitions import index_concurrently
+
+# Trend search configuration
+TREND_SEARCH_CONFIG = {
+    "default_limit": int(os.getenv("TREND_SEARCH_LIMIT", "20")),
+    "max_limit": int(os.getenv("TREND_SEARCH_MAX_LIMIT", "100")),
+    "max_terms": 8,
+    # Shorter terms match whole words only; a one-letter prefix would match most of the table
+    "min_prefix": int(os.getenv("TREND_SEARCH_MIN_PREFIX", "3")),
+    # Try CREATE EXTENSION pg_trgm at startup (needs the privilege; skipped when it fails)
+    "trigram": os.getenv("TREND_SEARCH_TRIGRAM", "1") not in ("0", "false", "False"),
+}
+
+DOCUMENT_FUNCTION = "trend_search_document"
+_TERM = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def search_terms(q: str) -> List[str]:
+    """Lowercased word terms of a query; anything else (operators, quotes) is dropped"""
+    return _TERM.findall(q.lower())[:TREND_SEARCH_CONFIG["max_terms"]]
+
+
+def prefix_tsquery(terms: List[str]) -> str:
+    """to_tsquery text matching every term, as a word prefix when long enough, e.g. "chalam:* & 2" """
+    min_prefix = TREND_SEARCH_CONFIG["min_prefix"]
+    return " & ".join(f"{term}:*" if len(term) >= min_prefix else term for term in terms)
+
+
+def ensure_search_indexes(conn, schema: str) -> bool:
+    """Create the document function and search indexes; returns whether trigram search is available"""
+    conn.autocommit = True
+    concurrently = index_concurrently(conn, schema, "google_trends")
+    with conn.cursor() as cur:
+        # array_to_string is only STABLE, so wrap the document in an IMMUTABLE function to index it
+        cur.execute(f"""
+        CREATE OR REPLACE FUNCTION {schema}.{DOCUMENT_FUNCTION}(title text, breakdown text[])
+        RETURNS tsvector LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT setweight(to_tsvector('simple', coalesce(title, '')), 'A')
+                || setweight(to_tsvector('simple', coalesce(array_to_string(breakdown, ' '), '')), 'B')
+        $$
+        """)
+        cur.execute(f"""
+        CREATE INDEX {concurrently} IF NOT EXISTS google_trends_search_idx
+        ON {schema}.google_trends USING gin ({schema}.{DOCUMENT_FUNCTION}(trends, trend_breakdown))
+        """)
+        if not TREND_SEARCH_CONFIG["trigram"]:
+            return False
+        try:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception:
+            return trigram_available(conn)
+        cur.execute(f"""
+        CREATE INDEX {concurrently} IF NOT EXISTS google_trends_trends_trgm_idx
+        ON {schema}.google_trends USING gin (trends gin_trgm_ops)
+        """)
+    return True
+
+
+def trigram_available(conn) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cur.fetchone() is not None
+
+
+def search_query(schema: str, terms: List[str], q: str, limit: int, category: Optional[str] = None,
+                 trigram: bool = False):
+    """SQL and parameters for trends matching every term (or, with trigram, a similar title), best first"""
+    document = f"{schema}.{DOCUMENT_FUNCTION}(gt.trends, gt.trend_breakdown)"
+    rank = "ts_rank_cd(d.document, d.query)"
+    match = "d.document @@ d.query"
+    params: List[Any] = [prefix_tsquery(terms)]
+    if trigram:
+        # `%` uses the trigram index; similarity lifts typo-tolerant title matches into the ranking
+        rank += " + similarity(gt.trends, %s)"
+        match = f"({match} OR gt.trends %% %s)"
+        # Placeholder order: similarity in SELECT, tsquery in the LATERAL, then the `%` match
+        params = [q, params[0], q]
+    where = [match]
+    if category:
+        where.append("gt.category = %s")
+        params.append(category)
+    params.append(limit)
+    query = f"""
+    SELECT gt.*, {rank} AS rank
+    FROM {schema}.google_trends gt
+    CROSS JOIN LATERAL (SELECT {document} AS document, to_tsquery('simple', %s) AS query) d
+    WHERE {' AND '.join(where)}
+    ORDER BY rank DESC, gt.search_volume DESC NULLS LAST, gt.id DESC
+    LIMIT %s
+    """
+    return query, params
+
+
+def search_trends(conn, schema: str, q: str, limit: int, category: Optional[str] = None,
+                  trigram: bool = False) -> List[Dict[str, Any]]:
+    """Ranked trends whose title or breakdown terms match q"""
+    from psycopg2.extras import RealDictCursor
+
+    terms = search_terms(q)
+    if not terms:
+        return []
+    query, params = search_query(schema, terms, q, limit, category, trigram)
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(query, params)
+        return cur.fetchall()
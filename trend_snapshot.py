@@ -0,0 +1,95 @@
+"""
+Snapshot version for trend data, used as the ETag of trend read endpoints
+Writers bump a Postgres sequence after committing changes to google_trends or
+trends_to_topics; readers compare its value with If-None-Match and answer 304
+without running the listing query. Each worker caches the version for a short
+TTL so a crowd of polling dashboards costs at most one tiny read per interval.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Callable, Optional
+
+# Snapshot version configuration
+SNAPSHOT_CONFIG = {
+    "sequence": "trends_snapshot_seq",
+    "ttl_seconds": float(os.getenv("SNAPSHOT_VERSION_TTL", "1")),
+}
+
+
+def ensure_snapshot_sequence(conn, schema: str, sequence: str = SNAPSHOT_CONFIG["sequence"]):
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SEQUENCE IF NOT EXISTS {schema}.{sequence}")
+    conn.commit()
+
+
+def etag_for(version: int, variant: Optional[str] = None) -> str:
+    """Weak ETag for a snapshot version; variant tells representations of one URL apart (e.g. ndjson)"""
+    return f'W/"trends-{version}-{variant}"' if variant else f'W/"trends-{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True when an If-None-Match header value lists etag (or is *)"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    # Weak comparison: W/"x" and "x" name the same representation
+    strip = lambda value: value[2:] if value.startswith("W/") else value
+    return "*" in candidates or strip(etag) in {strip(c) for c in candidates}
+
+
+class SnapshotVersion:
+    """Cached view of the trends snapshot sequence"""
+
+    def __init__(self, connect: Callable[[], Any], schema: str, sequence: str = None, ttl_seconds: float = None):
+        self.connect = connect
+        self.schema = schema
+        self.sequence = sequence or SNAPSHOT_CONFIG["sequence"]
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else SNAPSHOT_CONFIG["ttl_seconds"]
+        self._version: Optional[int] = None
+        self._read_at = 0.0
+
+    async def current(self) -> Optional[int]:
+        """Latest version, from cache when fresh; None when the sequence can't be read"""
+        if self._version is not None and time.monotonic() - self._read_at < self.ttl_seconds:
+            return self._version
+        return await asyncio.to_thread(self.refresh)
+
+    def refresh(self) -> Optional[int]:
+        conn = self.connect()
+        if not conn:
+            return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT last_value, is_called FROM {self.schema}.{self.sequence}")
+                last_value, is_called = cur.fetchone()
+            self._remember(last_value if is_called else 0)
+            return self._version
+        except Exception:
+            return None
+        finally:
+            conn.close()
+
+    def bump(self, conn) -> Optional[int]:
+        """Advance the version; call only after the data change has been committed
+
+        Bumping before the commit would let a reader tag the old data with the new
+        version and then keep answering 304 for it.
+        """
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT nextval('{self.schema}.{self.sequence}')")
+                version = cur.fetchone()[0]
+            conn.commit()
+            self._remember(version)
+            return version
+        except Exception:
+            conn.rollback()
+            return None
+
+    def _remember(self, version: int):
+        # Never step backwards if a concurrent refresh read an older value
+        if self._version is None or version > self._version:
+            self._version = version
+        self._read_at = time.monotonic()